@@ -0,0 +1,415 @@
+import math
+import random
+import time
+from formulation import ML, fv, fd, cv, formulation_name
+from SPoptimize import solve_subproblem
+from route_oracle import relaxed_route_feasible, screen_route, INFEASIBLE
+from parameter_profiles import get_profile, DEFAULT_PROFILE
+from logging_config import get_logger
+
+# =====================================================
+# Title: Adaptive Large Neighbourhood Search for VRPTWMD2R
+# Description: This script implements an adaptive large neighbourhood search
+#              (ALNS) for the instances out of reach of the exact algorithms.
+#              A solution is a set of first-level routes, each with its
+#              number of deliverymen l. Destroy operators remove clusters
+#              from the routes (random, worst, related, whole route, fewer
+#              deliverymen) and repair operators reinsert them (greedy,
+#              regret-2), raising l when a cluster needs it. Candidates are
+#              scored with the eta_il lower bounds of the second-level cost and
+#              a relaxed time check based on eil; only the candidates that
+#              can pass the simulated annealing test are evaluated exactly
+#              with the SP of every new route, whose cost is cached. The
+#              operator weights adapt to their success, the search stops at
+#              an iteration or time budget and the best solution is logged
+#              over time. The result has the format of run_CFoptimize.
+# =====================================================
+
+logger = get_logger(__name__)
+
+L = range(1, ML + 1)
+
+ALNS_ITERATIONS = 10000      # Iteration budget; the time budget is the TimeLimit of the profile
+SEGMENT_LENGTH = 100         # Iterations between two updates of the operator weights
+REACTION_FACTOR = 0.2        # Weight of the last segment in the operator weights
+SCORE_BEST = 33              # Operator score for a new best solution
+SCORE_IMPROVED = 9           # Operator score for a solution improving the current one
+SCORE_ACCEPTED = 13          # Operator score for an accepted worse solution
+START_WORSENING = 0.05       # A solution this much worse than the start is accepted with probability 1/2 at the start
+COOLING_RATE = 0.9995        # Temperature decrease per iteration
+MIN_REMOVAL = 2              # Minimum number of clusters removed by a destroy operator
+MAX_REMOVAL_FRACTION = 0.4   # Maximum fraction of the clusters removed by a destroy operator
+MAX_REMOVAL = 30             # Maximum number of clusters removed by a destroy operator
+NOISE = 0.1                  # Noise of the noisy greedy insertion, relative to the largest first-level distance
+SP_TIME_LIMIT = 5            # Time limit of the SP of a route (s); a route not solved within it is discarded as infeasible
+EPSILON = 1e-6
+
+# A solution is a list of routes [l, [clusters in visiting order]]
+def copy_solution(solution):
+    return [[l, list(clusters)] for l, clusters in solution]
+
+def route_distance(clusters, data):
+    dij = data['dij (Distance between first-level nodes i and j)']
+    end = len(data['N (set of cluster indices)']) + 1
+    nodes = [0] + clusters + [end]
+    return sum(dij[(nodes[n], nodes[n + 1])] for n in range(len(nodes) - 1))
+
+def route_arcs(clusters, data):
+    end = len(data['N (set of cluster indices)']) + 1
+    nodes = [0] + clusters + [end]
+    return [(nodes[n], nodes[n + 1]) for n in range(len(nodes) - 1)]
+
+# Smallest number of deliverymen with which a route is feasible in the relaxation, None if there is none
+def minimal_deliverymen(clusters, data, l_min=1):
+    for l in range(l_min, ML + 1):
+        if relaxed_route_feasible(clusters, l, data):
+            return l
+    return None
+
+# Cost of a route with the second-level cost estimated by the eta_il lower bounds (cluster i with l deliverymen)
+def estimated_route_cost(clusters, l, data):
+    return fv + l * fd + cv * route_distance(clusters, data) + sum(data['eta_il'][i][l] for i in clusters)
+
+def estimated_cost(solution, data):
+    return sum(estimated_route_cost(clusters, l, data) for l, clusters in solution)
+
+# Second-level cost of a route from its SP, cached by (clusters, l). None when the route is infeasible
+# or its SP is not solved within SP_TIME_LIMIT. The routes screened out by the oracle are not solved.
+def exact_second_level(clusters, l, data, cache):
+    key = (tuple(clusters), l)
+    if key not in cache:
+        verdict, _, start = screen_route(clusters, l, data)
+        if verdict == INFEASIBLE:
+            cache[key] = (None, None)
+        else:
+            Ar = route_arcs(clusters, data)
+            Nr = {node for arc in Ar for node in arc}
+            _, _, crl, sp_routes = solve_subproblem(data, 0, l, Nr, Ar, time_limit=SP_TIME_LIMIT, start=start)
+            cache[key] = (crl, sp_routes)
+    return cache[key][0]
+
+# Exact cost of a solution, None if one of its routes is infeasible. The relaxation can underestimate
+# the number of deliverymen a route needs: the l of a route whose SP is infeasible is raised until it is feasible.
+def exact_cost(solution, data, cache):
+    total = 0
+    for route in solution:
+        l, clusters = route
+        crl = exact_second_level(clusters, l, data, cache)
+        while crl is None and l < ML:
+            l += 1
+            crl = exact_second_level(clusters, l, data, cache)
+        if crl is None:
+            return None
+        route[0] = l
+        total += fv + l * fd + cv * route_distance(clusters, data) + crl
+    return total
+
+# Number of clusters removed by a destroy operator
+def removal_size(solution, rng):
+    num_clusters = sum(len(clusters) for _, clusters in solution)
+    upper = min(num_clusters, MAX_REMOVAL, max(2 * MIN_REMOVAL, int(MAX_REMOVAL_FRACTION * num_clusters)))
+    return rng.randint(min(MIN_REMOVAL, upper), upper)
+
+def remove_clusters(solution, removed):
+    removed = set(removed)
+    return [[l, [i for i in clusters if i not in removed]] for l, clusters in solution if any(i not in removed for i in clusters)]
+
+# Destroy operators: return the partial solution and the removed clusters
+def random_removal(solution, data, rng):
+    clusters = [i for _, route in solution for i in route]
+    removed = rng.sample(clusters, min(len(clusters), removal_size(solution, rng)))
+    return remove_clusters(solution, removed), removed
+
+# Remove the clusters whose removal saves the most first-level distance
+def worst_removal(solution, data, rng):
+    dij = data['dij (Distance between first-level nodes i and j)']
+    end = len(data['N (set of cluster indices)']) + 1
+    savings = []
+    for _, clusters in solution:
+        nodes = [0] + clusters + [end]
+        for n in range(1, len(nodes) - 1):
+            saving = dij[(nodes[n - 1], nodes[n])] + dij[(nodes[n], nodes[n + 1])] - dij[(nodes[n - 1], nodes[n + 1])]
+            savings.append((saving * (1 + 0.2 * rng.random()), nodes[n]))
+    savings.sort(reverse=True)
+    removed = [i for _, i in savings[:removal_size(solution, rng)]]
+    return remove_clusters(solution, removed), removed
+
+# Remove a random cluster and the clusters closest to it
+def related_removal(solution, data, rng):
+    dij = data['dij (Distance between first-level nodes i and j)']
+    clusters = [i for _, route in solution for i in route]
+    seed = rng.choice(clusters)
+    related = sorted(clusters, key=lambda i: 0 if i == seed else dij[(min(i, seed), max(i, seed))])
+    removed = related[:removal_size(solution, rng)]
+    return remove_clusters(solution, removed), removed
+
+# Remove all the clusters of a random route, to save a vehicle
+def route_removal(solution, data, rng):
+    removed = list(rng.choice(solution)[1])
+    return remove_clusters(solution, removed), removed
+
+# Remove one deliveryman from a random route with more than one, and the clusters it can no longer serve
+def deliveryman_removal(solution, data, rng):
+    candidates = [n for n, (l, _) in enumerate(solution) if l > 1]
+    if not candidates:
+        return random_removal(solution, data, rng)
+    partial = copy_solution(solution)
+    route = partial[rng.choice(candidates)]
+    route[0] -= 1
+    removed = []
+    while route[1] and not relaxed_route_feasible(route[1], route[0], data):
+        removed.append(route[1].pop(max(range(len(route[1])), key=lambda n: data['mi'][route[1][n]])))
+    return [route for route in partial if route[1]], removed
+
+# Cheapest insertions of cluster i: list of (estimated cost increase, route index, position, l);
+# route index None opens a new route. With noise, a random term up to noise is added to every cost.
+def insertion_options(solution, i, data, rng=None, noise=0):
+    options = []
+    for n, (l, clusters) in enumerate(solution):
+        current = estimated_route_cost(clusters, l, data)
+        l_min = max(l, data['mi'][i])
+        for position in range(len(clusters) + 1):
+            candidate = clusters[:position] + [i] + clusters[position:]
+            new_l = minimal_deliverymen(candidate, data, l_min)
+            if new_l is not None:
+                options.append((estimated_route_cost(candidate, new_l, data) - current, n, position, new_l))
+    l = minimal_deliverymen([i], data, data['mi'][i])
+    if l is not None:
+        options.append((estimated_route_cost([i], l, data), None, 0, l))
+    if noise:
+        options = [(cost + noise * rng.uniform(-1, 1), n, position, l) for cost, n, position, l in options]
+    options.sort(key=lambda option: option[0])
+    return options
+
+def insert(solution, i, option):
+    _, n, position, l = option
+    if n is None:
+        solution.append([l, [i]])
+    else:
+        solution[n][0] = l
+        solution[n][1].insert(position, i)
+
+# Repair operators: insert the removed clusters into the partial solution, None if a cluster cannot be inserted
+def greedy_insertion(solution, removed, data, rng, noise=0):
+    solution = copy_solution(solution)
+    removed = list(removed)
+    rng.shuffle(removed)
+    for i in removed:
+        options = insertion_options(solution, i, data, rng, noise)
+        if not options:
+            return None
+        insert(solution, i, options[0])
+    return solution
+
+def noisy_greedy_insertion(solution, removed, data, rng):
+    return greedy_insertion(solution, removed, data, rng, NOISE * max(data['dij (Distance between first-level nodes i and j)'].values()) * cv)
+
+# Insert first the cluster with the largest difference between its best and second-best insertion
+def regret_insertion(solution, removed, data, rng):
+    solution = copy_solution(solution)
+    removed = list(removed)
+    while removed:
+        best = None
+        for i in removed:
+            options = insertion_options(solution, i, data)
+            if not options:
+                return None
+            regret = options[1][0] - options[0][0] if len(options) > 1 else math.inf
+            if best is None or regret > best[0]:
+                best = (regret, i, options[0])
+        _, i, option = best
+        insert(solution, i, option)
+        removed.remove(i)
+    return solution
+
+DESTROY_OPERATORS = {
+    "random": random_removal,
+    "worst": worst_removal,
+    "related": related_removal,
+    "route": route_removal,
+    "deliveryman": deliveryman_removal,
+}
+REPAIR_OPERATORS = {
+    "greedy": greedy_insertion,
+    "noisy_greedy": noisy_greedy_insertion,
+    "regret": regret_insertion,
+}
+
+def select_operator(weights, rng):
+    names = list(weights)
+    return rng.choices(names, weights=[weights[name] for name in names])[0]
+
+def update_weights(weights, scores, uses):
+    for name in weights:
+        if uses[name]:
+            weights[name] = (1 - REACTION_FACTOR) * weights[name] + REACTION_FACTOR * scores[name] / uses[name]
+        scores[name] = 0
+        uses[name] = 0
+
+# Lower the number of deliverymen of every route while the SP of the route stays feasible and cheaper
+def reduce_deliverymen(solution, data, cache):
+    for route in solution:
+        l, clusters = route
+        while l > 1 and relaxed_route_feasible(clusters, l - 1, data):
+            current = exact_second_level(clusters, l, data, cache)
+            reduced = exact_second_level(clusters, l - 1, data, cache)
+            if reduced is None or reduced - fd >= current:
+                break
+            l -= 1
+        route[0] = l
+    return solution
+
+# Initial solution: greedy insertion of all the clusters, with every route whose SP stays infeasible with
+# ML deliverymen split into single-cluster routes with the smallest feasible number of deliverymen
+def initial_solution(data, cache, rng):
+    N = data['N (set of cluster indices)']
+    solution = greedy_insertion([], N, data, rng)
+    if solution is None:
+        return None
+
+    repaired = []
+    for route in solution:
+        if exact_cost([route], data, cache) is not None:
+            repaired.append(route)
+            continue
+        for i in route[1]:
+            feasible = [l_ for l_ in L if l_ >= data['mi'][i] and exact_second_level([i], l_, data, cache) is not None]
+            if not feasible:
+                return None
+            repaired.append([feasible[0], [i]])
+    return repaired
+
+# Simple lower bound: the vehicles needed by the total demand, each with at least one deliveryman, the
+# cheapest arc entering every cluster and the end depot on every vehicle, and the eta_ bounds on the
+# second-level costs
+def lower_bound(data):
+    N = data['N (set of cluster indices)']
+    qi = data['qi (Demand of cluster i)']
+    dij = data['dij (Distance between first-level nodes i and j)']
+    end = len(N) + 1
+    vehicles = math.ceil(sum(qi[i] for i in N) / data['vehicle_capacity'])
+
+    # The arc (0, end) of an unused vehicle is left out of the arcs into the end depot
+    entering = {}
+    for (i, j) in data['A (Set of arcs for first-level routes)']:
+        if i != 0 or j != end:
+            entering[j] = min(entering.get(j, math.inf), dij[(i, j)])
+    first_level_distance = sum(entering[i] for i in N) + vehicles * entering[end]
+    return vehicles * (fv + fd) + cv * first_level_distance + sum(data['eta_'][i] for i in N)
+
+# callbacks and aggregated are accepted for the interface of the other algorithms; the ALNS solves
+# no master model, so Gurobi callbacks and first-level formulations do not apply to it.
+# With start, the search starts from the given routes [l, [clusters]] instead of the greedy initial solution.
+def run_ALNSoptimize(instance_name, data, iterations=ALNS_ITERATIONS, time_limit=None, seed=0, profile=DEFAULT_PROFILE, aggregated=False, callbacks=(), start=None):
+    rng = random.Random(seed)
+    if time_limit is None:
+        time_limit = (profile if isinstance(profile, dict) else get_profile("ALNS", profile)).get('TimeLimit', math.inf)
+    profile_name = "custom" if isinstance(profile, dict) else profile
+    cache = {}
+
+    start_time = time.time()
+    current = None
+    if start is not None:
+        covered = sorted(i for _, clusters in start for i in clusters)
+        if covered == sorted(data['N (set of cluster indices)']) and exact_cost(start, data, cache) is not None:
+            current = copy_solution(start)
+        else:
+            logger.warning(f"The start solution of {instance_name} is not feasible, starting from the greedy initial solution")
+    if current is None:
+        current = initial_solution(data, cache, rng)
+    build_time = time.time() - start_time
+    if current is None:
+        logger.warning(f"No feasible initial solution found for {instance_name}")
+        return {"instance_name": instance_name, "algorithm": "ALNS", "formulation": formulation_name(False), "profile": profile_name,
+                "status": "Infeasible", "vehicles_used": None, "delivery_men_used": None, "first_level_distance": None,
+                "second_level_distance": None, "objective_value": None, "best_bound": None, "gap": None, "routes": None}
+
+    current = reduce_deliverymen(current, data, cache)
+    current_cost = exact_cost(current, data, cache)
+    best, best_cost = copy_solution(current), current_cost
+    history = [(round(time.time() - start_time, 2), 0, best_cost)]
+    logger.info(f"{instance_name} ALNS: initial solution {best_cost} with {len(best)} vehicles")
+
+    temperature = -START_WORSENING * current_cost / math.log(0.5)
+    destroy_weights = {name: 1.0 for name in DESTROY_OPERATORS}
+    repair_weights = {name: 1.0 for name in REPAIR_OPERATORS}
+    scores = {name: 0 for name in list(DESTROY_OPERATORS) + list(REPAIR_OPERATORS)}
+    uses = dict(scores)
+
+    iteration = 0
+    exact_evaluations = 0
+    while iteration < iterations and time.time() - start_time < time_limit:
+        iteration += 1
+        destroy = select_operator(destroy_weights, rng)
+        repair = select_operator(repair_weights, rng)
+        uses[destroy] += 1
+        uses[repair] += 1
+
+        partial, removed = DESTROY_OPERATORS[destroy](current, data, rng)
+        candidate = REPAIR_OPERATORS[repair](partial, removed, data, rng)
+
+        # The estimate is a lower bound of the exact cost: a candidate rejected on its estimate is rejected
+        threshold = current_cost - temperature * math.log(max(rng.random(), 1e-12))
+        score = 0
+        if candidate is not None and estimated_cost(candidate, data) < threshold - EPSILON:
+            exact_evaluations += 1
+            candidate_cost = exact_cost(candidate, data, cache)
+            if candidate_cost is not None and candidate_cost < threshold - EPSILON:
+                if candidate_cost < best_cost - EPSILON:
+                    candidate = reduce_deliverymen(candidate, data, cache)
+                    candidate_cost = exact_cost(candidate, data, cache)
+                    best, best_cost = copy_solution(candidate), candidate_cost
+                    history.append((round(time.time() - start_time, 2), iteration, best_cost))
+                    logger.info(f"{instance_name} ALNS: new best {best_cost} at iteration {iteration} "
+                                f"({round(time.time() - start_time, 2)} s, {destroy}/{repair})")
+                    score = SCORE_BEST
+                elif candidate_cost < current_cost - EPSILON:
+                    score = SCORE_IMPROVED
+                else:
+                    score = SCORE_ACCEPTED
+                current, current_cost = candidate, candidate_cost
+
+        scores[destroy] += score
+        scores[repair] += score
+        temperature *= COOLING_RATE
+        if iteration % SEGMENT_LENGTH == 0:
+            update_weights(destroy_weights, scores, uses)
+            update_weights(repair_weights, scores, uses)
+
+    runtime = time.time() - start_time
+    logger.info(f"{instance_name} ALNS: best {best_cost} after {iteration} iterations, {exact_evaluations} exact evaluations, "
+                f"{len(cache)} SPs solved, {round(runtime, 2)} s")
+
+    # Output the results
+    first_level_distance = sum(route_distance(clusters, data) for _, clusters in best)
+    second_level_distance = sum(exact_second_level(clusters, l, data, cache) for l, clusters in best)
+    routes = {
+        "first_level": [{"l": l, "clusters": list(clusters)} for l, clusters in best],
+        "second_level": {i: sp_route for l, clusters in best for i, sp_route in (cache[(tuple(clusters), l)][1] or {}).items()},
+    }
+    bound = lower_bound(data)
+
+    return {
+        "instance_name": instance_name,
+        "algorithm": "ALNS",
+        "formulation": formulation_name(False),
+        "profile": profile_name,
+        "status": "Feasible",
+        "vehicles_used": len(best),
+        "delivery_men_used": sum(l for l, _ in best),
+        "first_level_distance": first_level_distance,
+        "second_level_distance": second_level_distance,
+        "objective_value": best_cost,
+        "best_bound": bound,
+        "gap": 100 * max(best_cost - bound, 0) / abs(best_cost) if best_cost else 0.0,
+        "routes": routes,
+        "build_time": round(build_time, 2),
+        "runtime": round(runtime, 2),
+        "work": None,
+        "node_count": None,
+        "iter_count": iteration,
+        "root_bound": bound,
+        "first_incumbent_time": round(build_time, 2),
+        "callback_time": None,
+        "best_history": history,
+    }
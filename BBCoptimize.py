@@ -1,9 +1,18 @@
-import gurobipy as gp
 from gurobipy import GRB
-from MPoptimize import define_rmp
+from MPoptimize import define_rmp, define_master_cut
+import SPoptimize
 from SPoptimize import solve_subproblem
+from route_oracle import route_clusters, screen_route, INFEASIBLE, FEASIBLE
+from formulation import separate_lazy_subtours, separate_small_subtours, formulation_name
+from cut_pool import load_cut_pool, save_cut_pool
+from parameter_profiles import apply_profile, DEFAULT_PROFILE
+from solver_stats import init_stats, stats_callback, solver_statistics, no_solution_result
+from solution import reconstruct_routes, first_level_routes, second_level_routes
+from primal_heuristic import primal_heuristic, solution_values
+from logging_config import get_logger
 import itertools
 import math
+import time
 
 # =====================================================
 # Title: Branch-and-Benders-Cut Algorithm for VRP
@@ -13,23 +22,43 @@ import math
 #              second-level delivery routes to minimize overall distance.
 # =====================================================
 
+logger = get_logger(__name__)
+
 # Define global parameters for the problem
 ML = 3       # Maximum number of delivery men
 
+# Parameters of the LP phase (root cut loop on the relaxed master)
+LP_PHASE_MAX_ROUNDS = 50     # Maximum number of separation rounds
+LP_PHASE_STALL_ROUNDS = 3    # Stop after this many rounds without bound improvement
+LP_PHASE_TOLERANCE = 1e-4    # Relative bound improvement considered as progress
+LP_PHASE_EPSILON = 1e-6      # Tolerance on violations and slacks
+
 # Initialize counters for cuts and callbacks
 num_optimality_cuts = 0
 num_feasibility_cuts = 0
 counter = 0
 RCIsCounter = 0
+num_screened_routes = 0  # Routes decided by the route oracle without solving their SP
 
 # Custom callback function to be called during the optimization process
 def custom_callback(model, where):
     global num_optimality_cuts, num_feasibility_cuts, counter, RCIsCounter
 
+    stats_callback(model, where)
+
+    # Lazy constraints added at the current MIPSOL, for the callbacks given to run_BBCoptimize
+    if where == GRB.Callback.MIPSOL:
+        model._lazy_count = 0
+
+    # Separate the constraints (21) left out of the RMP
+    if model._lazy_subtours:
+        separate_lazy_subtours(model, where)
+
     # Callback triggered when an integer solution is found
     if where == GRB.Callback.MIPSOL:
+        callback_start = time.time()
         counter = counter + 1
-        print(f"MIPSOL callback triggered: {counter} time(s)")
+        logger.debug(f"MIPSOL callback triggered: {counter} time(s)")
         sol = model.cbGetSolution(model.getVars())
         sol_dict = {var.VarName: sol[i] for i, var in enumerate(model.getVars())}
 
@@ -37,91 +66,220 @@ def custom_callback(model, where):
         rci_satisfied, violating_subset = check_rci(model, model._data, sol_dict)
 
         if not rci_satisfied:
-            expr = gp.quicksum(model._x[(i, j), l] for (i, j) in model._A if i not in violating_subset and j in violating_subset for l in model._L)
-            model.cbLazy(expr >= math.ceil(sum(model._qi[i] for i in violating_subset) / model._Q))
-            print(f"Added RCI cut for subset {violating_subset}")
+            model.cbLazy(define_master_cut(model._data, model._x, model._eta, ("rci", violating_subset)))
+            model._lazy_count += 1
+            model._cuts.append(("rci", violating_subset))
+            logger.debug(f"Added RCI cut for subset {violating_subset}")
             RCIsCounter += 1
 
-        # Separate the solution by vehicle routes
-        routes = {}
-        for (i, j), l in model._x.keys():
-            if sol_dict[model._x[(i, j), l].VarName] > 0.5:
-                if l not in routes:
-                    routes[l] = []
-                routes[l].append((i, j))
-
-        print(f"Routes: {routes}")
-
-        # Reconstruct the complete route for each vehicle
-        complete_routes = {}
-        for l, arcs in routes.items():
-            complete_routes[l] = []
-            for arc in arcs:
-                if arc[0] == 0:  # Start from depot
-                    current_route = [arc]
-                    next_node = arc[1]
-                    while next_node != len(model._N) + 1:  # Until reaching the end depot
-                        found_next_arc = False
-                        for next_arc in arcs:
-                            if next_arc[0] == next_node:
-                                current_route.append(next_arc)
-                                next_node = next_arc[1]
-                                found_next_arc = True
-                                break
-                                
-                        if not found_next_arc:
-                            break
-                    complete_routes[l].append(current_route)
-
-        print(f"Complete Routes: {complete_routes}")
+        # Separate the solution by vehicle routes and reconstruct the complete route for each vehicle
+        x_values = {key: sol_dict[var.VarName] for key, var in model._x.items()}
+        complete_routes = reconstruct_routes(x_values, model._N)
+
+        logger.debug(f"Complete Routes: {complete_routes}")
 
         # Solve SPs and add cuts
-        for l, route_list in complete_routes.items():
-            for r, route in enumerate(route_list):
-                Nr = {node for arc in route for node in arc}
-                Ar = route
-                Ar_hat = [(i, j) for (i, j) in Ar if i != 0 and j != len(model._N) + 1]
-                print(f"Number Route: {r}, number l: {l}: Nr = {Nr}, Ar = {Ar}, Ar_hat = {Ar_hat}")
-                optimality_cut, feasibility_cut, crl = solve_subproblem(model._data, r, l, Nr, Ar,)
-
-                if crl != None:
-                    # Store the second-level distance for this route
-                    key = (tuple(Ar), l)
-                    if key in model._route_distance_dict:
-                        if model._route_distance_dict[key]['distance'] > crl:
-                            model._route_distance_dict[key] = {'distance': crl, 'route': Ar, 'l': l}
-                    else:
-                        model._route_distance_dict[key] = {'distance': crl, 'route': Ar, 'l': l}
-
-                if optimality_cut:  # Add optimality cut (31)
-                    expr = gp.quicksum(model._eta[i] for i in Nr if i != 0 and i != (len(model._N) + 1)) >= crl * (gp.quicksum(model._x[(i, j), l] for (i, j) in Ar_hat) - len(Ar_hat) + 1)
-                    model.cbLazy(expr)
-                    print(f"Added optimality cut: {expr}")
-                    num_optimality_cuts += 1 
-
-                # Check on len(Ar_hat) - 1
-                #lhs_value = len(Ar_hat) - 1
-                #if lhs_value < 0:
-                #    lhs_value = 0
-
-                #if feasibility_cut: #  Add feasibility cut (33)
-                #    expr = gp.quicksum(model._x[(i, j), l_] for (i, j) in Ar_hat for l_ in model._L if l_ <= l) <= lhs_value
-                #    model.cbLazy(expr)
-                #    print(f"Added feasibility cut: {expr}")
-                #    num_feasibility_cuts += 1
-
-                if feasibility_cut: #  Add feasibility cut (28)/(33)
-                    lhs_value = len(Ar_hat) - 1
-                    if lhs_value < 0:
-                        expr = gp.quicksum(model._x[(i, j), l] for (i, j) in Ar) <= (len(Ar) - 1)
-                        model.cbLazy(expr)
-                        print(f"Added feasibility cut: {expr}")
-                        num_feasibility_cuts += 1
-                    else:
-                        expr = gp.quicksum(model._x[(i, j), l_] for (i, j) in Ar_hat for l_ in model._L if l_ <= l) <= lhs_value
-                        model.cbLazy(expr)
-                        print(f"Added feasibility cut: {expr}")
-                        num_feasibility_cuts += 1
+        for cut in separate_route_cuts(model._data, complete_routes, model._route_distance_dict, bool(model._lazy_subtours)):
+            # An optimality cut met by the eta of the solution is only recorded: Gurobi discards a solution
+            # given by cbSetSolution (primal heuristic) when lazy constraints are added at its MIPSOL
+            if cut[0] != "optimality" or optimality_cut_violated(model, sol_dict, cut):
+                model.cbLazy(define_master_cut(model._data, model._x, model._eta, cut))
+                model._lazy_count += 1
+            model._cuts.append(cut)
+            if cut[0] == "optimality":  # Add optimality cut (31)
+                logger.debug(f"Added optimality cut: {cut}")
+                num_optimality_cuts += 1
+            else:  # Add feasibility cut (28)/(33)
+                logger.debug(f"Added feasibility cut: {cut}")
+                num_feasibility_cuts += 1
+
+        model._callback_time += time.time() - callback_start
+
+    # Callbacks given to run_BBCoptimize, after the cuts of this solution have been added
+    for callback in model._callbacks:
+        callback(model, where)
+
+# Whether the optimality cut (31) of a route is violated by the solution of the RMP
+def optimality_cut_violated(model, sol_dict, cut):
+    _, Ar, l, crl = cut
+    end = len(model._N) + 1
+    clusters = {node for arc in Ar for node in arc if node != 0 and node != end}
+    return sum(sol_dict[model._eta[i].VarName] for i in clusters) < crl - LP_PHASE_EPSILON
+
+# Solve the SP of every route and return the optimality and feasibility cuts to add to the master.
+# The routes are screened first by the route oracle: a surely infeasible route gets its feasibility
+# cut without an SP, a surely feasible route whose greedy cost meets the eta_il bounds gets its optimality
+# cut without an SP, and the SP of the other feasible routes starts from the greedy solution.
+def separate_route_cuts(data, complete_routes, route_distance_dict, lazy_subtours=False):
+    global num_screened_routes
+
+    N = data['N (set of cluster indices)']
+    cuts = []
+
+    for l, route_list in complete_routes.items():
+        for r, route in enumerate(route_list):
+            Nr = {node for arc in route for node in arc}
+            Ar = route
+            Ar_hat = [(i, j) for (i, j) in Ar if i != 0 and j != len(N) + 1]
+            logger.debug(f"Number Route: {r}, number l: {l}: Nr = {Nr}, Ar = {Ar}, Ar_hat = {Ar_hat}")
+
+            clusters = route_clusters(Ar, data)
+            verdict, cost_bound, start = screen_route(clusters, l, data)
+            if verdict == INFEASIBLE:
+                num_screened_routes += 1
+                cuts.append(("feasibility", tuple(Ar), l))
+                continue
+            if verdict == FEASIBLE and cost_bound <= sum(data['eta_il'][i][l] for i in clusters) + LP_PHASE_EPSILON:
+                num_screened_routes += 1
+                optimality_cut, feasibility_cut = (r, l, cost_bound), None
+                crl, sp_routes = cost_bound, second_level_routes({arc: 1 for arc in start}, data)
+            else:
+                optimality_cut, feasibility_cut, crl, sp_routes = solve_subproblem(data, r, l, Nr, Ar, lazy_subtours, start=start)
+
+            if crl != None:
+                # Store the second-level distance for this route
+                key = (tuple(Ar), l)
+                if key in route_distance_dict:
+                    if route_distance_dict[key]['distance'] > crl:
+                        route_distance_dict[key] = {'distance': crl, 'route': Ar, 'l': l, 'second_level': sp_routes}
+                else:
+                    route_distance_dict[key] = {'distance': crl, 'route': Ar, 'l': l, 'second_level': sp_routes}
+
+            if optimality_cut:
+                cuts.append(("optimality", tuple(Ar), l, crl))
+
+            if feasibility_cut:
+                cuts.append(("feasibility", tuple(Ar), l))
+
+    return cuts
+
+# Reconstruct first-level routes from a fractional solution by greedily following, for each l,
+# the outgoing arc with the largest value from every depot arc in the support
+def reconstruct_fractional_routes(x_values, N):
+    complete_routes = {}
+    for ((i, j), l), value in x_values.items():
+        if i != 0 or value <= LP_PHASE_EPSILON:
+            continue
+        current_route = [(i, j)]
+        next_node = j
+        while next_node != len(N) + 1:
+            visited = {node for arc in current_route for node in arc}
+            candidates = [(value_, arc) for (arc, l_), value_ in x_values.items() if l_ == l and arc[0] == next_node and arc[1] not in visited and value_ > LP_PHASE_EPSILON]
+            if not candidates:
+                break
+            _, next_arc = max(candidates)
+            current_route.append(next_arc)
+            next_node = next_arc[1]
+        if next_node == len(N) + 1:
+            complete_routes.setdefault(l, []).append(current_route)
+
+    return complete_routes
+
+# Separate RCIs on a fractional solution: the connected components of the support graph,
+# both aggregated over l and for each l separately, are the candidate subsets
+def separate_fractional_rci(x_values, data):
+    N = data['N (set of cluster indices)']
+    qi = data['qi (Demand of cluster i)']
+    Q = data['vehicle_capacity']
+    L = range(1, ML + 1)
+
+    flow = {}
+    for ((i, j), l), value in x_values.items():
+        flow[(i, j)] = flow.get((i, j), 0) + value
+
+    def components(arcs):
+        component = {i: i for i in N}
+
+        def find(i):
+            while component[i] != i:
+                component[i] = component[component[i]]
+                i = component[i]
+            return i
+
+        for (i, j) in arcs:
+            if i in component and j in component:
+                component[find(i)] = find(j)
+
+        subsets = {}
+        for i in N:
+            subsets.setdefault(find(i), []).append(i)
+        return [tuple(sorted(subset)) for subset in subsets.values()]
+
+    candidates = set(components([arc for arc, value in flow.items() if value > LP_PHASE_EPSILON]))
+    for l in L:
+        candidates.update(components([arc for (arc, l_), value in x_values.items() if l_ == l and value > LP_PHASE_EPSILON]))
+
+    cuts = []
+    for S in sorted(candidates):
+        lhs = sum(value for (i, j), value in flow.items() if i not in S and j in S)
+        rhs = math.ceil(sum(qi[i] for i in S) / Q)
+        if lhs < rhs - LP_PHASE_EPSILON:
+            cuts.append(("rci", S))
+
+    return cuts
+
+# LP phase: solve the LP relaxation of the RMP and add Benders and RCI cuts until the bound stalls.
+# The binding cuts are kept in the model as regular constraints for the following branch-and-cut.
+def run_lp_phase(model, x, eta, data):
+    binaries = [var for var in model.getVars() if var.VType == GRB.BINARY]
+    for var in binaries:
+        var.VType = GRB.CONTINUOUS
+
+    lp_cuts = {}
+    rounds = 0
+    stalled_rounds = 0
+    previous_bound = -math.inf
+    lp_bound = None
+
+    while True:
+        model.optimize()
+        if model.status != GRB.Status.OPTIMAL:
+            logger.warning(f"LP phase stopped with status {model.status}")
+            break
+
+        lp_bound = model.ObjVal
+        if lp_bound - previous_bound <= LP_PHASE_TOLERANCE * max(1, abs(lp_bound)):
+            stalled_rounds += 1
+        else:
+            stalled_rounds = 0
+        previous_bound = lp_bound
+        logger.debug(f"LP phase round {rounds}: bound = {lp_bound}, cuts = {len(lp_cuts)}")
+
+        if stalled_rounds >= LP_PHASE_STALL_ROUNDS or rounds >= LP_PHASE_MAX_ROUNDS:
+            break
+
+        x_values = model.getAttr('X', x)
+        cuts = separate_fractional_rci(x_values, data)
+        cuts += separate_route_cuts(data, reconstruct_fractional_routes(x_values, data['N (set of cluster indices)']), model._route_distance_dict, bool(model._lazy_subtours))
+        if model._lazy_subtours:
+            flow = {}
+            for ((i, j), l), value in x_values.items():
+                flow[(i, j)] = flow.get((i, j), 0) + value
+            cuts += [("subtour", S) for S in separate_small_subtours(flow, data['N (set of cluster indices)'])]
+        new_cuts = [cut for cut in cuts if cut not in lp_cuts]
+        if not new_cuts:
+            break
+
+        for cut in new_cuts:
+            lp_cuts[cut] = model.addConstr(define_master_cut(data, x, eta, cut), name=f"lp_cut_{len(lp_cuts)}")
+            model._cuts.append(cut)
+            if cut[0] == "subtour":
+                model._lp_subtour_cuts += 1
+        rounds += 1
+
+    # Carry only the binding cuts into the MIP
+    if model.status == GRB.Status.OPTIMAL:
+        for cut, constr in list(lp_cuts.items()):
+            if abs(constr.Slack) > LP_PHASE_EPSILON:
+                model.remove(constr)
+                del lp_cuts[cut]
+
+    for var in binaries:
+        var.VType = GRB.BINARY
+    model.update()
+
+    logger.info(f"LP phase: {rounds} round(s), bound = {lp_bound}, binding cuts kept = {len(lp_cuts)}")
+    return lp_bound, list(lp_cuts)
 
 # Function to check rounded capacity inequalities (RCIs)
 def check_rci(model, data, sol_dict):
@@ -141,15 +299,36 @@ def check_rci(model, data, sol_dict):
     return True, None
 
 # Main BBC algorithm function
-def run_BBCoptimize(instance_name, data):
-    model, x, eta, w = define_rmp(data)
+# With heuristic, the LP solutions of the nodes are repaired into incumbents (primal_heuristic.py)
+# With start, the first-level routes [l, [clusters]] are given to Gurobi as a MIP start
+def run_BBCoptimize(instance_name, data, lp_phase=False, cut_pool_dir=None, lazy_subtours=False, aggregated=False, profile=DEFAULT_PROFILE, callbacks=(), heuristic=False, start=None):
+    build_start = time.time()
+
+    # Preload the cuts generated by previous runs on the same instance
+    cut_pool = load_cut_pool(instance_name, data, cut_pool_dir) if cut_pool_dir else []
+
+    model, x, eta, w = define_rmp(data, cut_pool, lazy_subtours, aggregated)
 
     # Initialize the dictionary to store second-level distances for each route
     model._route_distance_dict = {}
 
+    # Cuts generated during this run, saved to the cut pool at the end
+    model._cuts = []
+
+    # Constraints (21) of the RMP and (18) of the SPs separated lazily
+    model._lazy_subtours = ("c21",) if lazy_subtours else ()
+    model._subtour_cuts = set()
+    model._lp_subtour_cuts = 0  # Constraints (21) separated by the LP phase
+    model._lazy_count = 0
+    sp_subtour_cuts = SPoptimize.num_lazy_subtour_cuts
+
     # Set attributes to the model
     model._data = data
     model._x = x
+    heuristic_state = {}
+    if heuristic:
+        callbacks = tuple(callbacks) + (primal_heuristic(data, {'x': x, 'eta': eta}, heuristic_state),)
+    model._callbacks = callbacks
     model._eta = eta
     model._w = w 
     model._vars = model.getVars()
@@ -160,73 +339,100 @@ def run_BBCoptimize(instance_name, data):
     model._L = range(1, ML + 1)
     model._dihk = data['dihk (Distance between second-level nodes h and k of cluster i)']
     model._Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
-    
-    # Solve the Master Problem (MP) with the callback
-    model.setParam(GRB.Param.TimeLimit, 7200)
+
+    model.update()
+    build_time = time.time() - build_start
+
+    # MIP start from the given routes, with the eta of their SP costs
+    if start is not None:
+        start_values = solution_values(start, data, {'x': x, 'eta': eta}, {})
+        if start_values is None:
+            logger.warning("MIP start uses arcs that are not in the model, ignoring it")
+        else:
+            for var, value in start_values.items():
+                var.Start = value
+
+    # Optional LP phase on the relaxed master before branch-and-cut
+    lp_phase_time = 0
+    if lp_phase:
+        lp_phase_start = time.time()
+        run_lp_phase(model, x, eta, data)
+        lp_phase_time = round(time.time() - lp_phase_start, 2)
+
+    # Solve the Master Problem (MP) with the callback and the Gurobi parameters of the profile
+    profile_name = apply_profile(model, "BBC", profile)
     model.setParam(GRB.Param.LazyConstraints, 1)
+    init_stats(model)
     model.optimize(custom_callback)
+    if heuristic:
+        logger.info(f"Primal heuristic: {heuristic_state['runs']} runs, {heuristic_state['submitted']} incumbents")
     
     # Check the result and output
     if model.status == GRB.INFEASIBLE:
-        print(f"Model {instance_name} is infeasible")
+        logger.warning(f"Model {instance_name} is infeasible")
         model.computeIIS()
         model.write(f"{instance_name}_iis.ilp")
         status = "Infeasible"
+    elif model.SolCount == 0:
+        logger.warning(f"Optimization was stopped with status {model.status} before finding a solution")
     else:
         if model.status == GRB.Status.OPTIMAL:
-            print(f"Objective Value: {model.ObjVal}")
+            logger.info(f"Objective Value: {model.ObjVal}")
             status = "Optimal"
-            print("Solution:")
-            for var in model.getVars():
-                if var.X > 0:
-                    print(f"{var.VarName}: {var.X}")            
         elif model.status == GRB.Status.TIME_LIMIT:
-            print("Time limit reached, best solution found:")
+            logger.info("Time limit reached, best solution found")
             status = "Feasible"
+        elif model.status == GRB.Status.INTERRUPTED:
+            logger.info("Optimization interrupted, best solution found")
+            status = "Interrupted"
         else:
-            print("Optimization was stopped with status ", model.status)
+            logger.warning(f"Optimization was stopped with status {model.status}")
 
-    # Extract and print key metrics
-    vehicles_used = sum(x[(0, j), l].x for j in model._N for l in model._L)
-    delivery_men_used = sum(x[(0, j), l].x * l for j in model._N for l in model._L)
-    first_level_distance = sum(data['dij (Distance between first-level nodes i and j)'][(i, j)] * x[(i, j), l].x for (i, j) in model._A for l in model._L)
+    if model.SolCount == 0:
+        if cut_pool_dir:
+            save_cut_pool(instance_name, data, model._cuts, cut_pool_dir)
+        return no_solution_result(instance_name, "BBC", formulation_name(aggregated), profile_name, model, build_time)
 
-    print(f"==> Model Objective Value: {model.ObjVal}")
-    print(f"==> Vehicles used: {vehicles_used}")
-    print(f"==> Delivery men used: {delivery_men_used}")
-    print(f"==> First level distance: {first_level_distance}")
-    
-    total_second_level_distance = 0
-    for (i, j), l in model._x.keys():
-        if model._x[(0, j), l].x > 0.5:
-            current_route = [(i, j)]
-            next_node = j
-            while next_node != len(model._N) + 1:
-                found_next_arc = False
-                for (k, m), l_ in model._x.keys():
-                    if model._x[(k, m), l_].x > 0.5 and k == next_node:
-                        current_route.append((k, m))
-                        next_node = m
-                        found_next_arc = True
-                        break
-                if not found_next_arc:
-                    break
+    # Extract key metrics
+    x_values = model.getAttr('X', x)
+    vehicles_used = sum(x_values[(0, j), l] for j in model._N for l in model._L)
+    delivery_men_used = sum(x_values[(0, j), l] * l for j in model._N for l in model._L)
+    first_level_distance = sum(data['dij (Distance between first-level nodes i and j)'][(i, j)] * x_values[(i, j), l] for (i, j) in model._A for l in model._L)
 
+    # Second-level distance and routes of the final first-level routes, from the solved SPs
+    total_second_level_distance = 0
+    second_level = {}
+    for l, route_list in reconstruct_routes(x_values, model._N).items():
+        for current_route in route_list:
             key = (tuple(current_route), l)
             if key in model._route_distance_dict:
                 distance = model._route_distance_dict[key]['distance']
                 if distance is not None:
                     total_second_level_distance += distance
+                second_level.update(model._route_distance_dict[key].get('second_level') or {})
+
+    routes = {
+        "first_level": first_level_routes(x_values, model._N),
+        "second_level": second_level,
+    }
+    lazy_subtour_cuts = len(model._subtour_cuts) + model._lp_subtour_cuts + SPoptimize.num_lazy_subtour_cuts - sp_subtour_cuts
+
+    logger.info(f"{instance_name} BBC: objective {model.ObjVal}, vehicles used {vehicles_used}, delivery men used {delivery_men_used}, "
+                f"first level distance {first_level_distance}, second level distance {total_second_level_distance}")
+    logger.info(f"Optimality cuts: {num_optimality_cuts}, feasibility cuts: {num_feasibility_cuts}, "
+                f"callbacks: {counter}, RCIs: {RCIsCounter}, lazy subtour cuts (18)/(21): {lazy_subtour_cuts}, "
+                f"routes screened without SP: {num_screened_routes}")
+    logger.debug(f"First-level routes: {routes['first_level']}")
+    logger.debug(f"Second-level routes: {routes['second_level']}")
 
-    print(f"==> Total second level distance: {total_second_level_distance}")
-    print(f"Number of optimality cuts: {num_optimality_cuts}")
-    print(f"Number of feasibility cuts: {num_feasibility_cuts}") 
-    print(f"Callback counter: {counter}")
-    print(f"RCIs counter: {RCIsCounter}")
+    if cut_pool_dir:
+        save_cut_pool(instance_name, data, model._cuts, cut_pool_dir)
 
     return {
         "instance_name": instance_name,
         "algorithm": "BBC",
+        "formulation": formulation_name(aggregated),
+        "profile": profile_name,
         "status": status,
         "vehicles_used": vehicles_used,
         "delivery_men_used": delivery_men_used,
@@ -234,7 +440,11 @@ def run_BBCoptimize(instance_name, data):
         "second_level_distance": total_second_level_distance,
         "objective_value": model.ObjVal,
         "best_bound": model.ObjBound,
-        "gap":  model.MIPGap * 100
+        "gap":  model.MIPGap * 100,
+        "lazy_subtour_cuts": lazy_subtour_cuts,
+        "lp_phase_time": lp_phase_time,
+        "routes": routes,
+        **solver_statistics(model, build_time)
     }   
         
 
@@ -0,0 +1,296 @@
+import heapq
+import math
+import random
+import time
+import gurobipy as gp
+from gurobipy import GRB
+from formulation import ML, fv, fd, cv, formulation_name
+from parameter_profiles import apply_profile, get_profile, DEFAULT_PROFILE
+from solver_stats import init_stats, stats_callback, solver_statistics
+from ALNSoptimize import route_distance, route_arcs, exact_second_level, exact_cost, initial_solution, lower_bound
+from logging_config import get_logger, apply_gurobi_output
+
+# =====================================================
+# Title: Column Generation over First-Level Routes for VRPTWMD2R
+# Description: This script implements a route-based (set-partitioning)
+#              formulation solved by price-and-branch. A column is a
+#              first-level route (a sequence of clusters and its number of
+#              deliverymen l) whose cost includes the second-level cost given
+#              by the SP of the route. The restricted master LP is solved by
+#              column generation: the pricing is a resource-constrained
+#              shortest path over A (capacity Q, time windows of the parking
+#              locations with the eil bounds on the time spent in a cluster)
+#              solved by labeling, with the second-level cost estimated by
+#              the eta_il lower bounds. The routes with a negative estimated
+#              reduced cost are then evaluated exactly with their SP and
+#              added when their exact reduced cost is negative. Since the
+#              estimate is a lower bound, a complete pricing gives a valid
+#              Lagrangian bound. The integer master is finally solved over
+#              the generated columns (price-and-branch).
+# =====================================================
+
+logger = get_logger(__name__)
+
+L = range(1, ML + 1)
+
+COLUMNS_PER_ITERATION = 20     # Maximum number of columns added to the RMP per pricing iteration
+EVALUATIONS_PER_ITERATION = 60 # Maximum number of routes evaluated exactly with their SP per pricing iteration
+LABEL_LIMIT = 200000           # Labels created per pricing; beyond it the pricing is heuristic and proves no bound
+MIN_MIP_TIME = 10              # Time left to the integer master when the column generation used the whole time limit (s)
+EPSILON = 1e-6
+
+# Bitmask of a set of clusters, for the elementarity resource of the labels
+def cluster_bit(i):
+    return 1 << i
+
+# Elementary labeling for the routes with l deliverymen. A label is (reduced cost, finish time, load,
+# visited clusters, path). Returns the completed routes with a negative estimated reduced cost, the
+# smallest estimated reduced cost of all completed routes, and whether the labeling was complete.
+def price_routes(data, duals, l, label_limit=LABEL_LIMIT):
+    N = data['N (set of cluster indices)']
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    qi = data['qi (Demand of cluster i)']
+    dij = data['dij (Distance between first-level nodes i and j)']
+    tij = data['tij (Travel time between first-level nodes i and j)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    Q = data['vehicle_capacity']
+    A_set = set(data['A (Set of arcs for first-level routes)'])
+    end = len(N) + 1
+    candidates = [i for i in N if l >= data['mi'][i]]
+
+    labels = {i: [] for i in candidates}
+    heap = []
+    created = 0
+    for i in candidates:
+        start = ah[i][0]
+        finish = max(start + data['eil'][i][l], ah[i][len(Ni[i]) + 1])
+        if qi[i] > Q or finish > bh[i][len(Ni[i]) + 1] + EPSILON:
+            continue
+        label = (cv * dij[(0, i)] + data['eta_il'][i][l] - duals[i], finish, qi[i], cluster_bit(i), (i,))
+        labels[i].append(label)
+        heapq.heappush(heap, (finish, created, label))
+        created += 1
+
+    routes, best_reduced_cost = [], math.inf
+    complete = True
+    while heap:
+        _, _, label = heapq.heappop(heap)
+        cost, finish, load, visited, path = label
+        i = path[-1]
+        if not any(other is label for other in labels[i]):
+            continue  # Dominated after it was created
+
+        reduced_cost = cost + cv * dij[(i, end)] + fv + l * fd
+        best_reduced_cost = min(best_reduced_cost, reduced_cost)
+        if reduced_cost < -EPSILON:
+            routes.append((reduced_cost, list(path), l))
+
+        if created >= label_limit:
+            complete = False
+            continue
+        for j in candidates:
+            if visited & cluster_bit(j) or load + qi[j] > Q or (i, j) not in A_set:
+                continue
+            last = len(Ni[j]) + 1
+            start = max(ah[j][0], finish + tij[(i, j)])
+            if start > bh[j][0] + EPSILON:
+                continue
+            new_finish = max(start + data['eil'][j][l], ah[j][last])
+            if new_finish > bh[j][last] + EPSILON:
+                continue
+            new_label = (cost + cv * dij[(i, j)] + data['eta_il'][j][l] - duals[j], new_finish, load + qi[j], visited | cluster_bit(j), path + (j,))
+            if dominated(new_label, labels[j]):
+                continue
+            labels[j] = [other for other in labels[j] if not dominates(new_label, other)]
+            labels[j].append(new_label)
+            heapq.heappush(heap, (new_finish, created, new_label))
+            created += 1
+
+    return routes, best_reduced_cost, complete
+
+# A label dominates another at the same cluster when it is not worse in any resource and visited a subset of its clusters
+def dominates(label, other):
+    return label[0] <= other[0] + EPSILON and label[1] <= other[1] + EPSILON and label[2] <= other[2] and label[3] & other[3] == label[3]
+
+def dominated(label, labels):
+    return any(dominates(other, label) for other in labels)
+
+# Exact cost of the route with l deliverymen, None if its SP is infeasible
+def column_cost(clusters, l, data, cache):
+    crl = exact_second_level(clusters, l, data, cache)
+    if crl is None:
+        return None
+    return fv + l * fd + cv * route_distance(clusters, data) + crl
+
+def add_column(m, cover, columns, clusters, l, cost):
+    var = m.addVar(obj=cost, lb=0, name=f"route_{len(columns)}", column=gp.Column([1.0] * len(clusters), [cover[i] for i in clusters]))
+    columns.append((var, list(clusters), l, cost))
+    return var
+
+# Restricted master problem: set partitioning of the clusters by the columns, seeded with the routes of a
+# greedy solution and the single-cluster routes with every feasible number of deliverymen
+def build_master(instance_name, data, cache, rng):
+    N = data['N (set of cluster indices)']
+    A_set = set(data['A (Set of arcs for first-level routes)'])
+    m = gp.Model(f"{instance_name}_CG")
+    apply_gurobi_output(m)
+    cover = m.addConstrs((gp.LinExpr() == 1 for i in N), name="cover")
+
+    columns, start = [], []
+    seen = set()
+    solution = initial_solution(data, cache, rng)
+    if solution is not None and exact_cost(solution, data, cache) is not None:
+        for l, clusters in solution:
+            # On a granular instance (granular.py), the ALNS routes can use arcs left out of A
+            if not A_set.issuperset(route_arcs(clusters, data)):
+                continue
+            start.append(add_column(m, cover, columns, clusters, l, column_cost(clusters, l, data, cache)))
+            seen.add((tuple(clusters), l))
+    for i in N:
+        for l in L:
+            if l < data['mi'][i] or ((i,), l) in seen:
+                continue
+            cost = column_cost([i], l, data, cache)
+            if cost is not None:
+                add_column(m, cover, columns, [i], l, cost)
+                seen.add(((i,), l))
+    m.update()
+    return m, cover, columns, seen, start
+
+# Column generation on the LP relaxation of the master, seen being the routes already columns. Returns the
+# Lagrangian bound of the last complete pricing (None when no pricing was complete) and the number of
+# pricing iterations.
+def column_generation(m, cover, columns, seen, data, cache, deadline):
+    N = data['N (set of cluster indices)']
+    max_vehicles = len(N)
+    bound, iterations = None, 0
+    priced = {}  # Exact cost of the routes evaluated so far, None when infeasible
+    while time.time() < deadline:
+        iterations += 1
+        m.optimize()
+        if m.status != GRB.OPTIMAL:
+            logger.warning(f"Master LP stopped with status {m.status}")
+            break
+        duals = {i: cover[i].Pi for i in N}
+
+        candidates, min_reduced_cost, complete = [], 0.0, True
+        for l in L:
+            routes, best, complete_l = price_routes(data, duals, l)
+            candidates.extend(routes)
+            min_reduced_cost = min(min_reduced_cost, best)
+            complete = complete and complete_l
+        # With x_r <= 1 per route and at most one route per cluster, z* >= z_LP + |N| * (smallest reduced cost)
+        if complete:
+            bound = max(bound if bound is not None else -math.inf, m.ObjVal + max_vehicles * min(0.0, min_reduced_cost))
+
+        # Routes evaluated in earlier iterations, whose exact reduced cost changes with the duals
+        added, evaluated = 0, 0
+        for (clusters, l), cost in list(priced.items()):
+            if added >= COLUMNS_PER_ITERATION:
+                break
+            if cost is not None and (clusters, l) not in seen and cost - sum(duals[i] for i in clusters) < -EPSILON:
+                add_column(m, cover, columns, list(clusters), l, cost)
+                seen.add((clusters, l))
+                added += 1
+
+        pending = sorted((route for route in candidates if (tuple(route[1]), route[2]) not in seen and (tuple(route[1]), route[2]) not in priced),
+                         key=lambda route: route[0])
+        for reduced_cost, clusters, l in pending:
+            if added >= COLUMNS_PER_ITERATION or evaluated >= EVALUATIONS_PER_ITERATION or time.time() >= deadline:
+                break
+            evaluated += 1
+            cost = priced[(tuple(clusters), l)] = column_cost(clusters, l, data, cache)
+            if cost is not None and cost - sum(duals[i] for i in clusters) < -EPSILON:
+                add_column(m, cover, columns, clusters, l, cost)
+                seen.add((tuple(clusters), l))
+                added += 1
+        logger.debug(f"CG iteration {iterations}: LP {m.ObjVal}, {len(pending)} new candidates, {evaluated} evaluated, "
+                     f"{added} columns added, smallest estimated reduced cost {min_reduced_cost}")
+        if added == 0 and evaluated == len(pending):
+            # No route priced so far has a negative exact reduced cost: the LP is optimal over the priced routes
+            break
+        m.update()
+    return bound, iterations
+
+# Callback collecting the solver statistics and running the callbacks given to run_CGoptimize
+def cg_callback(model, where):
+    stats_callback(model, where)
+    for callback in model._callbacks:
+        callback(model, where)
+
+# aggregated is accepted for the interface of the other algorithms; the columns are whole routes
+def run_CGoptimize(instance_name, data, profile=DEFAULT_PROFILE, aggregated=False, callbacks=(), seed=0):
+    rng = random.Random(seed)
+    time_limit = (profile if isinstance(profile, dict) else get_profile("CG", profile)).get('TimeLimit', math.inf)
+    cache = {}
+
+    # Column generation on the LP relaxation of the master
+    start_time = time.time()
+    m, cover, columns, seen, start = build_master(instance_name, data, cache, rng)
+    bound, cg_iterations = column_generation(m, cover, columns, seen, data, cache, start_time + time_limit)
+    if m.status != GRB.OPTIMAL:
+        m.optimize()  # Columns added after the last LP solve
+    lp_value = m.ObjVal if m.status == GRB.OPTIMAL else None
+    build_time = time.time() - start_time
+    logger.info(f"{instance_name} CG: LP {lp_value}, Lagrangian bound {bound}, {len(columns)} columns, "
+                f"{cg_iterations} iterations, {len(cache)} SPs solved, {round(build_time, 2)} s")
+
+    # Integer master over the generated columns (price-and-branch)
+    for var, _, _, _ in columns:
+        var.VType = GRB.BINARY
+    for var in start:
+        var.Start = 1
+    profile_name = apply_profile(m, "CG", profile)  # Set the time limit and the Gurobi parameters of the profile
+    m.setParam('TimeLimit', max(time_limit - build_time, MIN_MIP_TIME))
+    m._callbacks = callbacks
+    init_stats(m)
+    m.optimize(cg_callback)
+
+    if m.SolCount == 0:
+        logger.warning(f"No integer solution found over the columns of {instance_name}")
+        return {"instance_name": instance_name, "algorithm": "CG", "formulation": formulation_name(False), "profile": profile_name,
+                "status": "Infeasible" if m.status == GRB.INFEASIBLE else "NoSolution", "vehicles_used": None,
+                "delivery_men_used": None, "first_level_distance": None, "second_level_distance": None,
+                "objective_value": None, "best_bound": bound, "gap": None, "routes": None}
+
+    # The integer master only proves optimality over the generated columns: the bound of the
+    # whole problem is the Lagrangian bound of the column generation
+    best_bound = max(bound if bound is not None else -math.inf, lower_bound(data))
+    objective = m.ObjVal
+    if objective <= best_bound + EPSILON * max(1.0, abs(objective)):
+        status = "Optimal"
+    elif m.status == GRB.Status.INTERRUPTED:
+        status = "Interrupted"
+    else:
+        status = "Feasible"
+
+    best = [(clusters, l) for var, clusters, l, _ in columns if var.X > 0.5]
+    first_level_distance = sum(route_distance(clusters, data) for clusters, _ in best)
+    second_level_distance = sum(exact_second_level(clusters, l, data, cache) for clusters, l in best)
+    routes = {
+        "first_level": [{"l": l, "clusters": list(clusters)} for clusters, l in best],
+        "second_level": {i: sp_route for clusters, l in best for i, sp_route in (cache[(tuple(clusters), l)][1] or {}).items()},
+    }
+    logger.info(f"{instance_name} CG: objective {objective}, bound {best_bound}, vehicles used {len(best)}, "
+                f"delivery men used {sum(l for _, l in best)}")
+
+    return {
+        "instance_name": instance_name,
+        "algorithm": "CG",
+        "formulation": formulation_name(False),
+        "profile": profile_name,
+        "status": status,
+        "vehicles_used": len(best),
+        "delivery_men_used": sum(l for _, l in best),
+        "first_level_distance": first_level_distance,
+        "second_level_distance": second_level_distance,
+        "objective_value": objective,
+        "best_bound": best_bound,
+        "gap": 100 * max(objective - best_bound, 0) / abs(objective) if objective else 0.0,
+        "routes": routes,
+        **solver_statistics(m, build_time),
+        "root_bound": lp_value,
+        "columns": len(columns),
+        "cg_iterations": cg_iterations,
+    }
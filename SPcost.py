@@ -1,5 +1,6 @@
 import gurobipy as gp
 from gurobipy import GRB
+from logging_config import get_logger, apply_gurobi_output
 
 # =====================================================
 # Title: Cost Optimization for Second-Level Delivery Routes in VRP
@@ -11,13 +12,17 @@ from gurobipy import GRB
 #              within a cluster, considering the cost minimization perspective.
 # =====================================================
 
+logger = get_logger(__name__)
+
 # Define global parameters
 ML = 3  # Maximum number of deliverymen per vehicle  
 cd = 1     # Cost coefficient for deliveryman routing distance     
 
-def solve_sp_cost(i, data):
+# Minimum second-level cost of cluster i with at most l deliverymen, inf when it cannot be served
+def solve_sp_cost(i, data, l=ML):
     # Create the model
     sp_model = gp.Model(f"SP_cost_{i}")
+    apply_gurobi_output(sp_model)
 
     Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
     tij = data['tij (Travel time between first-level nodes i and j)']
@@ -55,7 +60,7 @@ def solve_sp_cost(i, data):
             sp_model.addConstr(w[i, k] >= w[i, h] + sh[i][h] + tihk[i][(h, k)] - Mihk[i][(h, k)] * (1 - x[i, (h, k)]), name=f"c4_{i}_{h}_{k}")
 
     for i in Nr:
-        sp_model.addConstr((gp.quicksum(x[i, (0, h)] for h in Ni[i]) <= ML), "c5")
+        sp_model.addConstr((gp.quicksum(x[i, (0, h)] for h in Ni[i]) <= l), "c5")
 
     for (i,j) in Ar:
         if i in N and j in N:
@@ -69,10 +74,10 @@ def solve_sp_cost(i, data):
     # Optimize model
     sp_model.optimize()
 
-    # Print model status and optimization output
-    print(f"Optimization status for cluster {i}: {sp_model.status}")
+    # Log model status
+    logger.debug(f"Optimization status for cluster {i}: {sp_model.status}")
     if sp_model.status == GRB.OPTIMAL:
         return sp_model.ObjVal
     else:
-        print(f"Model for cluster {i} is infeasible or unbounded.")
+        logger.warning(f"Model for cluster {i} is infeasible or unbounded.")
         return float('inf')
@@ -1,6 +1,9 @@
 import gurobipy as gp
 from gurobipy import GRB
 import itertools
+from formulation import separate_lazy_subtours
+from solution import second_level_routes
+from logging_config import get_logger, apply_gurobi_output
 
 # =====================================================
 # Title: Subproblem Solver for VRP with Multiple Deliverymen
@@ -10,11 +13,21 @@ import itertools
 #              and capacity constraints.
 # =====================================================
 
+logger = get_logger(__name__)
+
 # Define global parameters
 ML = 3  # Maximum number of deliverymen per vehicle  
 cd = 1  # Cost coefficient for deliveryman routing distance  
 
-def solve_subproblem(data, r, l, Nr, Ar,):
+# Number of constraints (18) separated lazily over all the subproblems
+num_lazy_subtour_cuts = 0
+
+# With time_limit (s), a subproblem not solved to optimality within the limit is reported as infeasible,
+# for the heuristics evaluating many routes (ALNS, CG) where proving infeasibility can take very long.
+# start is a set of arcs (i, (h, k)) of a feasible solution (route_oracle.py), given to Gurobi as MIP start.
+def solve_subproblem(data, r, l, Nr, Ar, lazy_subtours=False, time_limit=None, start=None):
+    global num_lazy_subtour_cuts
+
     Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']   
     tij = data['tij (Travel time between first-level nodes i and j)']
     dihk = data['dihk (Distance between second-level nodes h and k of cluster i)']
@@ -30,6 +43,7 @@ def solve_subproblem(data, r, l, Nr, Ar,):
 
     # Create the model for the subproblem
     sp_model = gp.Model("SP")
+    apply_gurobi_output(sp_model)
 
     # Filter Nr to remove depot nodes from the primary route
     NrFiltered = [i for i in Nr if i in N]
@@ -72,12 +86,14 @@ def solve_subproblem(data, r, l, Nr, Ar,):
         sp_model.addConstr((gp.quicksum(x[i, (0, h)] for h in Ni[i]) >= 1), name=f"c17_{i}")
 
     # Constraint (18): Eliminate small subtours of two and three customers in second-level routes.
-    for i in NrFiltered:
-        for subset_size in [2, 3]:
-            for subset in itertools.combinations(Ni[i], subset_size):
-                subset_arcs = [(h, k) for h in subset for k in subset if h != k and (h, k) in Ai[i]]
-                if subset_arcs:
-                    sp_model.addConstr((gp.quicksum(x[i, arc] for arc in subset_arcs) <= subset_size - 1), name=f"c18_{i}_{subset}")
+    # With lazy_subtours, they are separated in a callback instead
+    if not lazy_subtours:
+        for i in NrFiltered:
+            for subset_size in [2, 3]:
+                for subset in itertools.combinations(Ni[i], subset_size):
+                    subset_arcs = [(h, k) for h in subset for k in subset if h != k and (h, k) in Ai[i]]
+                    if subset_arcs:
+                        sp_model.addConstr((gp.quicksum(x[i, arc] for arc in subset_arcs) <= subset_size - 1), name=f"c18_{i}_{subset}")
 
     # Constraint (19): Remove infeasible second-level arcs due to time window incompatibility.
     for i in NrFiltered:
@@ -90,16 +106,35 @@ def solve_subproblem(data, r, l, Nr, Ar,):
         sp_model.addConstr((w[i, len(Ni[i]) + 1] >= w[i, 0] + eil[i][l]), name=f"c44{i}")
 
     # Optimize subproblem
-    sp_model.optimize()
+    if time_limit is not None:
+        sp_model.setParam(GRB.Param.TimeLimit, time_limit)
+    if start is not None:
+        start = set(start)
+        for key, var in x.items():
+            var.Start = 1 if key in start else 0
+    if lazy_subtours:
+        sp_model._data = data
+        sp_model._y = x
+        sp_model._subtour_clusters = NrFiltered
+        sp_model._lazy_subtours = ("c18",)
+        sp_model._subtour_cuts = set()
+        sp_model._lazy_count = 0
+        sp_model.setParam(GRB.Param.LazyConstraints, 1)
+        sp_model.optimize(separate_lazy_subtours)
+        num_lazy_subtour_cuts += len(sp_model._subtour_cuts)
+    else:
+        sp_model.optimize()
 
     if sp_model.status == GRB.Status.OPTIMAL:
         optimality_cut = (r, l, sp_model.ObjVal)
         feasibility_cut = None
         crl = sp_model.ObjVal
+        sp_routes = second_level_routes(sp_model.getAttr('X', x), data)
     else:
         optimality_cut = None
         feasibility_cut = (r, l)
         crl = None
+        sp_routes = None
 
-    print(f"Subproblem status: {sp_model.status}, optimality cut: {optimality_cut}, feasibility cut: {feasibility_cut}")
-    return optimality_cut, feasibility_cut, crl,
+    logger.debug(f"Subproblem status: {sp_model.status}, optimality cut: {optimality_cut}, feasibility cut: {feasibility_cut}")
+    return optimality_cut, feasibility_cut, crl, sp_routes
@@ -1,5 +1,6 @@
 import gurobipy as gp
 from gurobipy import GRB
+from logging_config import get_logger, apply_gurobi_output
 
 # =====================================================
 # Title: Time-Minimization Subproblem for VRP with Deliverymen
@@ -11,6 +12,8 @@ from gurobipy import GRB
 #              in a cluster considering the deliveryman routes.
 # =====================================================
 
+logger = get_logger(__name__)
+
 # Define global parameters
 ML = 3  # Maximum number of deliverymen per vehicle  
 cd = 1     # Cost coefficient for deliveryman routing distance 
@@ -18,6 +21,7 @@ cd = 1     # Cost coefficient for deliveryman routing distance
 def solve_sp_time(i, l, data):
     # Create the model
     sp_model = gp.Model(f"SP_time_{i}_{l}")
+    apply_gurobi_output(sp_model)
 
     Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
     tij = data['tij (Travel time between first-level nodes i and j)']
@@ -0,0 +1,146 @@
+import csv
+import statistics
+import sys
+from formulation import formulation_name
+from parameter_profiles import DEFAULT_PROFILE
+from scalability import run_key
+
+# =====================================================
+# Title: Performance Regression Gate for the Scalability Results
+# Description: This script compares a new results file of scalability.py
+#              (or scheduler.py) with a stored baseline file. The runs are
+#              matched by instance, size, algorithm, formulation and profile
+#              (the median is taken over repeated runs) and compared on
+#              status, objective, gap, solver effort and node count. The
+#              effort is measured in Gurobi work units when both files have
+#              them, which are deterministic and unaffected by the load of a
+#              shared machine, and in wall time otherwise. Differences below
+#              the noise thresholds are ignored. The script exits with code 1
+#              when a run regressed or a run of the baseline is missing from
+#              the results (unless --allow-missing is given), to be used as a
+#              gate after a Gurobi upgrade or a formulation change.
+#              Usage: python compare_results.py [--allow-missing] [results file] [baseline file]
+# =====================================================
+
+results_file = "scalability_results.csv"
+baseline_file = "baseline_results.csv"
+
+# Pass the gate when runs of the baseline are missing from the results file (e.g. a partial sweep)
+allow_missing = False
+
+# A run regressed when it got worse by more than both the relative and the absolute threshold
+WORK_TOLERANCE = 0.10     # Relative increase of the Gurobi work units
+WORK_MIN_DELTA = 1.0      # Absolute increase of the Gurobi work units
+TIME_TOLERANCE = 0.25     # Relative increase of the runtime, noisier than the work units
+TIME_MIN_DELTA = 2.0      # Absolute increase of the runtime (s)
+NODE_TOLERANCE = 0.50     # Relative increase of the node count
+NODE_MIN_DELTA = 100      # Absolute increase of the node count
+GAP_TOLERANCE = 0.5       # Absolute increase of the gap (percentage points)
+OBJECTIVE_TOLERANCE = 1e-6  # Relative difference of the objectives of two optimal runs
+NO_SOLUTION_GAP = 100.0   # Gap of a run without a solution (Timeout, OOM, Error)
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+# Runs of a results file grouped by run key. Rows written before the Formulation and Profile
+# columns existed used the disaggregated formulation and the default profile, and have no Work and Nodes.
+def read_runs(filename):
+    with open(filename, mode='r', newline='') as file:
+        rows = list(csv.DictReader(file, delimiter=';'))
+
+    runs = {}
+    for row in rows:
+        key = run_key(row['Instance'], row['Size'], row['Algorithm'], row.get('Formulation') or formulation_name(False), row.get('Profile') or DEFAULT_PROFILE)
+        runs.setdefault(key, []).append(row)
+    return runs
+
+# Median metrics of the repeated runs of a key. A run is optimal when most of its repetitions are.
+def summarize(rows):
+    gaps = [to_float(row['Gap (%)']) for row in rows]
+    return {
+        "optimal": sum(row['Status'] == "Optimal" for row in rows) > len(rows) / 2,
+        "status": "/".join(sorted({row['Status'] for row in rows})),
+        "objective": median(to_float(row['Objective Value']) for row in rows),
+        "gap": median(NO_SOLUTION_GAP if gap is None else gap for gap in gaps),
+        "work": median(to_float(row.get('Work')) for row in rows) if all(to_float(row.get('Work')) is not None for row in rows) else None,
+        "time": median(to_float(row.get('Runtime(s)')) or to_float(row['Time(s)']) for row in rows),
+        "nodes": median(to_float(row.get('Nodes')) for row in rows),
+    }
+
+def increased(new, old, tolerance, min_delta):
+    return new is not None and old is not None and new - old > max(tolerance * abs(old), min_delta)
+
+def relative_change(new, old):
+    if new is None or old is None:
+        return None
+    return 100 * (new - old) / old if old else 0.0
+
+# Compare the summaries of a run and return its effort metric and the list of regressions
+def compare_run(new, old):
+    regressions = []
+    if old['optimal'] and not new['optimal']:
+        regressions.append(f"status {old['status']} -> {new['status']}")
+    if old['optimal'] and new['optimal'] and new['objective'] is not None and old['objective'] is not None \
+            and abs(new['objective'] - old['objective']) > OBJECTIVE_TOLERANCE * max(1.0, abs(old['objective'])):
+        regressions.append(f"optimal objective {old['objective']} -> {new['objective']}")
+    if increased(new['gap'], old['gap'], 0.0, GAP_TOLERANCE):
+        regressions.append(f"gap {old['gap']:.2f}% -> {new['gap']:.2f}%")
+
+    # The effort and the node count are only comparable between runs that both reached optimality
+    metric = "work" if new['work'] is not None and old['work'] is not None else "time"
+    if old['optimal'] and new['optimal']:
+        tolerance, min_delta = (WORK_TOLERANCE, WORK_MIN_DELTA) if metric == "work" else (TIME_TOLERANCE, TIME_MIN_DELTA)
+        if increased(new[metric], old[metric], tolerance, min_delta):
+            regressions.append(f"{metric} {old[metric]} -> {new[metric]} ({relative_change(new[metric], old[metric]):+.1f}%)")
+        if increased(new['nodes'], old['nodes'], NODE_TOLERANCE, NODE_MIN_DELTA):
+            regressions.append(f"nodes {old['nodes']:.0f} -> {new['nodes']:.0f}")
+    return metric, regressions
+
+def format_change(new, old):
+    change = relative_change(new, old)
+    return f"{old} -> {new}" + (f" ({change:+.1f}%)" if change is not None else "")
+
+# Compare a results file with the baseline and return the regressed runs and the runs of the baseline
+# missing from the results file
+def compare_results(results_file, baseline_file):
+    new_runs = read_runs(results_file)
+    baseline_runs = read_runs(baseline_file)
+
+    regressed, missing = [], []
+    for key in sorted(baseline_runs):
+        if key not in new_runs:
+            missing.append(key)
+            continue
+
+        new, old = summarize(new_runs[key]), summarize(baseline_runs[key])
+        metric, regressions = compare_run(new, old)
+        verdict = "REGRESSION: " + ", ".join(regressions) if regressions else "OK"
+        print(f"{' '.join(key)}: status {old['status']} -> {new['status']}, {metric} {format_change(new[metric], old[metric])}, "
+              f"gap {old['gap']:.2f}% -> {new['gap']:.2f}%, nodes {format_change(new['nodes'], old['nodes'])}: {verdict}")
+        if regressions:
+            regressed.append((key, regressions))
+
+    for key in missing:
+        print(f"{' '.join(key)}: missing from {results_file}")
+    return regressed, missing
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    if "--allow-missing" in arguments:
+        arguments.remove("--allow-missing")
+        allow_missing = True
+    if len(arguments) > 0:
+        results_file = arguments[0]
+    if len(arguments) > 1:
+        baseline_file = arguments[1]
+
+    regressed, missing = compare_results(results_file, baseline_file)
+    print(f"\n{len(regressed)} regression(s), {len(missing)} baseline run(s) missing from {results_file}")
+    sys.exit(1 if regressed or (missing and not allow_missing) else 0)
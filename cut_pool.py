@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+from formulation import ML, fv, fd, cv, cd
+from logging_config import get_logger
+
+# =====================================================
+# Title: Persistent Cut Pool for the Branch-and-Benders-Cut Algorithm
+# Description: This script stores the optimality, feasibility and RCI cuts
+#              generated by the BBC algorithm on disk, keyed by a hash of the
+#              instance data and of the model parameters, so that later runs
+#              on the same instance can start from a tighter master problem.
+# =====================================================
+
+CUT_POOL_DIR = "./cut_pools"
+
+logger = get_logger(__name__)
+
+# Convert the instance data (nested dicts with tuple keys) to a JSON-serializable canonical form
+def canonical_form(value):
+    if isinstance(value, dict):
+        return [[canonical_form(k), canonical_form(v)] for k, v in sorted(value.items(), key=lambda item: repr(item[0]))]
+    if isinstance(value, (list, tuple, range)):
+        return [canonical_form(v) for v in value]
+    return value
+
+def instance_hash(data):
+    parameters = {"ML": ML, "fv": fv, "fd": fd, "cv": cv, "cd": cd}
+    payload = json.dumps([canonical_form(data), parameters], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cut_pool_path(instance_name, data, cut_pool_dir=CUT_POOL_DIR):
+    return os.path.join(cut_pool_dir, f"{instance_name}_{instance_hash(data)[:16]}.json")
+
+# Cuts are stored as JSON lists, convert them back to the hashable tuples used by define_master_cut
+def cut_from_json(cut):
+    if cut[0] == "optimality":
+        return ("optimality", tuple(tuple(arc) for arc in cut[1]), cut[2], cut[3])
+    if cut[0] == "feasibility":
+        return ("feasibility", tuple(tuple(arc) for arc in cut[1]), cut[2])
+    if cut[0] in ("rci", "subtour"):
+        return (cut[0], tuple(cut[1]))
+    raise ValueError(f"Unknown cut type: {cut[0]}")
+
+def read_cut_pool(path, data):
+    if not os.path.isfile(path):
+        return []
+
+    with open(path, 'r') as f:
+        pool = json.load(f)
+
+    if pool['hash'] != instance_hash(data):
+        logger.warning(f"Cut pool {path} does not match the instance data, ignoring it")
+        return []
+
+    return [cut_from_json(cut) for cut in pool['cuts']]
+
+def load_cut_pool(instance_name, data, cut_pool_dir=CUT_POOL_DIR):
+    path = cut_pool_path(instance_name, data, cut_pool_dir)
+    cuts = read_cut_pool(path, data)
+    if cuts:
+        logger.info(f"Loaded {len(cuts)} cuts from {path}")
+    return cuts
+
+def save_cut_pool(instance_name, data, cuts, cut_pool_dir=CUT_POOL_DIR):
+    os.makedirs(cut_pool_dir, exist_ok=True)
+    path = cut_pool_path(instance_name, data, cut_pool_dir)
+
+    # Merge with the cuts already stored for this instance
+    pool_cuts = list(dict.fromkeys(read_cut_pool(path, data) + list(cuts)))
+
+    with open(path, 'w') as f:
+        json.dump({"instance_name": instance_name, "hash": instance_hash(data), "cuts": pool_cuts}, f)
+
+    logger.info(f"Saved {len(pool_cuts)} cuts to {path}")
+    return path
@@ -1,6 +1,9 @@
 import os
 from SPcost import solve_sp_cost
 from SPtime import solve_sp_time
+from logging_config import get_logger
+
+logger = get_logger(__name__)
 
 def read_instance(file_path):
     with open(file_path, 'r') as f:
@@ -105,161 +108,195 @@ def read_instance(file_path):
 def euclidean_distance(x1, y1, x2, y2):
     return int(((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5)
 
-def read_and_process_instances(instances_dir):
-    instance_files = [f for f in os.listdir(instances_dir) if f.endswith('.txt')]
+# First-level sets: cluster indices N, nodes N0 (with the depot start and end) and arcs A
+def first_level_sets(clusters):
+    N = list(range(1, len(clusters) - 1))
+    N0 = [cluster['id'] for cluster in clusters]
+    A = [(i, j) for i in range(len(clusters) - 1 ) for j in range(len(clusters)) if i != j and i != len(clusters) and j != 0]
+    return N, N0, A
+
+# Calculate distances between clusters
+def first_level_distances(clusters):
+    dij = {}
+    tij = {}
+    for i, cluster_i in enumerate(clusters):
+        for j, cluster_j in enumerate(clusters):
+            if i != j and i != len(clusters) - 1 and j != 0:
+                distance = euclidean_distance(cluster_i['x'], cluster_i['y'], cluster_j['x'], cluster_j['y'])
+                dij[(i, j)] = distance
+                tij[(i, j)] = distance
+    return dij, tij
+
+# Calculate distances and travel times between customers within cluster i, with its customer set,
+# demand, service times and time windows
+def cluster_second_level_data(cluster, customers):
+    i = cluster['id']
+    Ai = []
+    dihk = {}
+    tihk = {}
+    qi = cluster['demand']
+    sh = {}
+    ah = {}
+    bh = {}
+
+    cluster_customers = [cust for cust in customers if cust['cluster'] == i]
+
+    # Define Ni and N0i
+    max_ord_cust_no = max([cust['ord_cust_no'] for cust in cluster_customers])
+    Ni = [cust['ord_cust_no'] for cust in cluster_customers if cust['ord_cust_no'] != 0 and cust['ord_cust_no'] != max_ord_cust_no]
+    N0i = [0] + Ni + [max_ord_cust_no]
+
+    for cust_i in cluster_customers:
+        h = cust_i['ord_cust_no']
+        sh[h] = cust_i['service_time']
+        ah[h] = cust_i['ready_time']
+        bh[h] = cust_i['due_date']
+        for cust_j in cluster_customers:
+            if cust_i['ord_cust_no'] != cust_j['ord_cust_no']:
+                k = cust_j['ord_cust_no']
+                distance = euclidean_distance(cust_i['x'], cust_i['y'], cust_j['x'], cust_j['y'])
+                if h != max_ord_cust_no and k != 0:
+                    Ai.append((h, k))
+                    dihk[(h, k)] = distance
+                    tihk[(h, k)] = distance * 3
+
+    # The parking location closes after the latest customer, plus the travel time back from it
+    max_bh = max(bh.values())
+    max_bh_customer = max(bh, key=bh.get)
+    travel_time_to_parking = tihk[(max_bh_customer, len(Ni) + 1)]
+    bh[len(Ni) + 1] = max_bh + travel_time_to_parking
+
+    return dihk, tihk, Ai, Ni, N0i, qi, sh, ah, bh
+
+# Calculate distances and travel times between customers within clusters, with the customer sets,
+# demands, service times and time windows of every cluster
+def second_level_data(clusters, customers):
+    dihk = {}
+    tihk = {}
+    Ai = {}
+    Ni = {}
+    N0i = {}
+    qi = {}
+    sh = {}
+    ah = {}
+    bh = {}
+
+    for cluster in clusters:
+        i = cluster['id']
+        if i != 0 and i != len(clusters) - 1:
+            dihk[i], tihk[i], Ai[i], Ni[i], N0i[i], qi[i], sh[i], ah[i], bh[i] = cluster_second_level_data(cluster, customers)
+
+    # Add qi for the initial and final nodes
+    qi[0] = 0  
+    qi[len(clusters) - 1] = 0  
+
+    return dihk, tihk, Ai, Ni, N0i, qi, sh, ah, bh
+
+# Big-M constants of the second-level time constraints of cluster i
+def second_level_big_m(i, Ai, tihk, sh, ah, bh):
+    return {(h, k): max(0, bh[i][h] + sh[i][h] + tihk[i][(h, k)] - ah[i][k]) for (h, k) in Ai[i]}
+
+# Big-M constants of the first-level time constraints of the given arcs
+def first_level_big_m(instance_name, clusters, customers, arcs, tij, ah, bh):
+    Mij = {}
+    for (i, j) in arcs:
+        try:
+            if i == 0:
+                Mij[(i, j)] = max(0, clusters[0]['due_date'] + tij[(i, j)] - ah[j][0])
+            else:
+                max_ord_cust_no = max([cust['ord_cust_no'] for cust in customers if cust['cluster'] == i])
+                Mij[(i, j)] = max(0, bh[i][max_ord_cust_no] + tij[(i, j)] - ah[j][0])
+        except KeyError as e:
+            logger.warning(f"Missing key {e} in calculation of Mij for arc ({i}, {j}) in instance {instance_name}")
+    return Mij
+
+# Big-M constants of the second-level (Mihk) and first-level (Mij) time constraints
+def big_m_constants(instance_name, clusters, customers, N, A, Ai, tij, tihk, sh, ah, bh):
+    Mihk = {i: second_level_big_m(i, Ai, tihk, sh, ah, bh) for i in N}
+    Mij = first_level_big_m(instance_name, clusters, customers, A, tij, ah, bh)
+    return Mihk, Mij
+
+# Calculate the lower bounds of cluster i: minimum number of deliverymen mi, duration eil of the
+# second-level routes with l deliverymen and lower bounds on the cost of its deliveryman routes,
+# eta_il with l deliverymen (inf below mi) and eta_ with any number of deliverymen
+def cluster_lower_bounds(i, instance_data):
+    Ni = instance_data['Ni (set of customer nodes in cluster i)']
+    sh = instance_data['sh (Service time of customer h in cluster i)']
+    tihk = instance_data['tihk (Travel time between second-level nodes h and k of cluster i)']
+
+    ML = 3
+    L = range(1, (ML + 1))
+    # mi is the smallest feasible number of deliverymen, ML + 1 when the cluster cannot be served
+    instance_data['mi'][i] = ML + 1
+    for l in L:
+        _, feasible = solve_sp_time(i, l, instance_data)
+        if feasible:
+            instance_data['mi'][i] = l
+            break
+
+    instance_data['eil'][i] = {}
+    for l in L:
+        sum_service_times = sum(sh[i][h] for h in Ni[i])
+        max_time = max(tihk[i][(0, h)] + sh[i][h] + tihk[i][(h, len(Ni[i]) + 1)] for h in Ni[i])
+        instance_data['eil'][i][l] = max(sum_service_times / l, max_time)
+
+    # Calculate eta (lower bound cost of deliveryman routes), the smallest with ML deliverymen
+    instance_data['eta_il'][i] = {l: solve_sp_cost(i, instance_data, l) if l >= instance_data['mi'][i] else float('inf') for l in L}
+    instance_data['eta_'][i] = instance_data['eta_il'][i][ML]
+
+# Calculate lower bounds: minimum number of deliverymen mi, duration eil of the second-level routes
+# with l deliverymen and lower bounds eta_il and eta_ on the cost of the deliveryman routes of every cluster
+def lower_bounds(instance_data):
+    instance_data['eil'] = {}
+    instance_data['mi'] = {}
+    instance_data['eta_il'] = {}
+    for i in instance_data['N (set of cluster indices)']:
+        cluster_lower_bounds(i, instance_data)
+
+# Preprocess an instance read by read_instance, stage by stage
+def process_instance(instance_name, vehicle_number, vehicle_capacity, clusters, customers, num_clusters, num_customers):
+    N, N0, A = first_level_sets(clusters)
+    dij, tij = first_level_distances(clusters)
+    dihk, tihk, Ai, Ni, N0i, qi, sh, ah, bh = second_level_data(clusters, customers)
+    Mihk, Mij = big_m_constants(instance_name, clusters, customers, N, A, Ai, tij, tihk, sh, ah, bh)
+
+    instance_data = {
+        'vehicle_number': vehicle_number,
+        'vehicle_capacity': vehicle_capacity,
+        'clusters (parking locations)': num_clusters,
+        'customers (total clients)': num_customers,
+        'dij (Distance between first-level nodes i and j)': dij,
+        'tij (Travel time between first-level nodes i and j)': tij,
+        'dihk (Distance between second-level nodes h and k of cluster i)': dihk,
+        'tihk (Travel time between second-level nodes h and k of cluster i)': tihk,
+        'Ai (set of arcs related to the second-level routes inside cluster i)': Ai,
+        'N0i (set of nodes including depot start and end)': N0i,
+        'qi (Demand of cluster i)': qi,
+        'sh (Service time of customer h in cluster i)': sh,
+        'ah (Start of time window of customer h in cluster i)': ah,
+        'bh (End of time window of customer h in cluster i)': bh,
+        'N0 (Set of nodes including depot start and end)': N0,
+        'A (Set of arcs for first-level routes)': A,
+        'N (set of cluster indices)': N,
+        'Ni (set of customer nodes in cluster i)': Ni,
+        'Mihk': Mihk,
+        'Mij': Mij,
+        'eta_': {},
+    }
+
+    lower_bounds(instance_data)
+    return instance_data
+
+# With instance_files, only the given files of the directory are processed
+def read_and_process_instances(instances_dir, instance_files=None):
+    if instance_files is None:
+        instance_files = [f for f in os.listdir(instances_dir) if f.endswith('.txt')]
 
     instances = []
 
     for instance_file in instance_files:
         file_path = os.path.join(instances_dir, instance_file)
-        instance_name, vehicle_number, vehicle_capacity, clusters, customers, num_clusters, num_customers, = read_instance(file_path)
-
-        # Define sets N, N0, and A
-        N = list(range(1, len(clusters) - 1))
-        N0 = [cluster['id'] for cluster in clusters]
-        A = [(i, j) for i in range(len(clusters) - 1 ) for j in range(len(clusters)) if i != j and i != len(clusters) and j != 0]
-
-        # Calculate distances between clusters
-        dij = {}
-        tij = {}
-        for i, cluster_i in enumerate(clusters):
-            for j, cluster_j in enumerate(clusters):
-                if i != j and i != len(clusters) - 1 and j != 0:
-                    distance = euclidean_distance(cluster_i['x'], cluster_i['y'], cluster_j['x'], cluster_j['y'])
-                    dij[(i, j)] = distance
-                    tij[(i, j)] = distance
-
-        # Calculate distances and travel times between customers within clusters
-        dihk = {}
-        tihk = {}
-        Ai = {}
-        Ni = {}
-        N0i = {}
-        qi = {}
-        sh = {}
-        ah = {}
-        bh = {}
-        eta_ = {}
-
-
-        for cluster in clusters:
-            i = cluster['id']
-            if i != 0 and i != len(clusters) - 1:
-                Ai[i] = []
-                dihk[i] = {}
-                tihk[i] = {}
-                qi[i] = cluster['demand']
-                sh[i] = {}
-                ah[i] = {}
-                bh[i] = {}
-                
-                cluster_customers = [cust for cust in customers if cust['cluster'] == i]
-                
-                # Define Ni and N0i
-                if i != 0 and i != len(clusters) - 1:
-                    max_ord_cust_no = max([cust['ord_cust_no'] for cust in cluster_customers])
-                    Ni[i] = [cust['ord_cust_no'] for cust in cluster_customers if cust['ord_cust_no'] != 0 and cust['ord_cust_no'] != max_ord_cust_no]
-                    N0i[i] = [0] + Ni[i] + [max_ord_cust_no]
-
-                total_service_time = 0  # For calculating eil
-                total_demand = 0  # For calculating mi
-
-                for cust_i in cluster_customers:
-                    h = cust_i['ord_cust_no']
-                    sh[i][h] = cust_i['service_time']  
-                    ah[i][h] = cust_i['ready_time'] 
-                    bh[i][h] = cust_i['due_date'] 
-                    total_service_time += cust_i['service_time'] 
-                    total_demand += cust_i['demand'] 
-                    for cust_j in cluster_customers:
-                        if cust_i['ord_cust_no'] != cust_j['ord_cust_no']:
-                            k = cust_j['ord_cust_no']
-                            distance = euclidean_distance(cust_i['x'], cust_i['y'], cust_j['x'], cust_j['y'])
-                            if h != max_ord_cust_no and k != 0: 
-                                Ai[i].append((h, k))
-                                dihk[i][(h, k)] = distance
-                                tihk[i][(h, k)] = distance * 3  
-                            
-                        if cust_i['id'] != cust_j['id']:
-                            k = cust_j['ord_cust_no']
-
-        for i in range(len(clusters)):            
-            if i in Ni:
-                max_bh = max(bh[i].values())
-                max_bh_customer = max(bh[i], key=bh[i].get)
-                travel_time_to_parking = tihk[i][(max_bh_customer, len(Ni[i]) + 1)]
-                max_ord_cust_no = len(Ni[i]) + 1
-                bh[i][max_ord_cust_no] = max_bh + travel_time_to_parking
-
-        Mihk = {}
-        for i in N:
-            Mihk[i] = {}
-            for (h, k) in Ai[i]:
-                Mihk[i][(h, k)] = max(0, bh[i][h] + sh[i][h] + tihk[i][(h, k)] - ah[i][k])
-
-        Mij = {}
-        for (i, j) in A:
-            try:
-                if i == 0:
-                    Mij[(i, j)] = max(0, clusters[0]['due_date'] + tij[(i, j)] - ah[j][0])
-                else:
-                    max_ord_cust_no = max([cust['ord_cust_no'] for cust in customers if cust['cluster'] == i])
-                    Mij[(i, j)] = max(0, bh[i][max_ord_cust_no] + tij[(i, j)] - ah[j][0])
-            except KeyError as e:
-                print(f"Warning: Missing key {e} in calculation of Mij for arc ({i}, {j}) in instance {instance_name}")
-
-        # Add qi for the initial and final nodes
-        qi[0] = 0  
-        qi[len(clusters) - 1] = 0  
-
-        instance_data = {
-            'vehicle_number': vehicle_number,
-            'vehicle_capacity': vehicle_capacity,
-            'clusters (parking locations)': num_clusters,
-            'customers (total clients)': num_customers,
-            'dij (Distance between first-level nodes i and j)': dij,
-            'tij (Travel time between first-level nodes i and j)': tij,
-            'dihk (Distance between second-level nodes h and k of cluster i)': dihk,
-            'tihk (Travel time between second-level nodes h and k of cluster i)': tihk,
-            'Ai (set of arcs related to the second-level routes inside cluster i)': Ai,
-            'N0i (set of nodes including depot start and end)': N0i,
-            'qi (Demand of cluster i)': qi,
-            'sh (Service time of customer h in cluster i)': sh,
-            'ah (Start of time window of customer h in cluster i)': ah,
-            'bh (End of time window of customer h in cluster i)': bh,
-            'N0 (Set of nodes including depot start and end)': N0,
-            'A (Set of arcs for first-level routes)': A,
-            'N (set of cluster indices)': N,
-            'Ni (set of customer nodes in cluster i)': Ni,
-            'Mihk': Mihk,
-            'Mij': Mij,
-            'eta_': eta_,
-        }
-
-        # Calculate lower bounds 
-        instance_data['eil'] = {}
-        instance_data['mi'] = {}
-
-        ML = 3
-        L = range(1, (ML + 1))
-        for i in N:
-            instance_data['mi'][i] = 1
-            for l in L:
-                _, feasible = solve_sp_time(i, l, instance_data)
-                if not feasible:
-                    instance_data['mi'][i] = l + 1
-                    break
-            
-            instance_data['eil'][i] = {}
-            for l in L:
-                sum_service_times = sum(sh[i][h] for h in Ni[i])
-                max_time = max(tihk[i][(0, h)] + sh[i][h] + tihk[i][(h, len(Ni[i]) + 1)] for h in Ni[i])
-                instance_data['eil'][i][l] = max(sum_service_times / l, max_time)
-                                 
-            # Calculate eta (lower bound cost of deliveryman routes)
-            instance_data['eta_'][i] = solve_sp_cost(i, instance_data)
-
-        instances.append((instance_name, instance_data))
+        instance = read_instance(file_path)
+        instances.append((instance[0], process_instance(*instance)))
 
     return instances
-
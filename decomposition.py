@@ -0,0 +1,192 @@
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+from portfolio import ALGORITHMS
+from ALNSoptimize import run_ALNSoptimize, greedy_insertion, exact_cost
+from parameter_profiles import get_profile, DEFAULT_PROFILE
+from logging_config import get_logger, set_gurobi_threads
+
+# =====================================================
+# Title: Geographic Decomposition of Large VRPTWMD2R Instances
+# Description: This script splits the clusters of an instance into regions
+#              by k-medoids on a dissimilarity mixing the distance between
+#              the parking locations and the distance between the centres of
+#              their time windows (the processed data has distances, not
+#              coordinates). Each region is a smaller instance with the same
+#              depot, solved independently with CF+VI's or BBC in parallel
+#              processes. The regional routes are merged into a solution of
+#              the whole instance, the clusters of the regions left without a
+#              solution inserted greedily, and the merged solution is the
+#              start of a short ALNS that can move clusters across regions.
+#              The total time limit is split between the region solves and
+#              the ALNS repair, and the time of the region solves between
+#              the batches of regions run one after the other when there
+#              are more regions than processes.
+# =====================================================
+
+logger = get_logger(__name__)
+
+REGION_SIZE = 8              # Target number of clusters per region
+TIME_WINDOW_WEIGHT = 1.0     # Weight of the time window centres in the dissimilarity (travel times equal distances)
+KMEDOIDS_ITERATIONS = 50     # Maximum number of assignment and update rounds of the k-medoids
+REPAIR_SHARE = 0.2           # Share of the time limit left to the ALNS repair of the merged solution
+
+# Data keyed by cluster, and data keyed by first-level arc
+CLUSTER_KEYS = (
+    'dihk (Distance between second-level nodes h and k of cluster i)',
+    'tihk (Travel time between second-level nodes h and k of cluster i)',
+    'Ai (set of arcs related to the second-level routes inside cluster i)',
+    'N0i (set of nodes including depot start and end)',
+    'qi (Demand of cluster i)',
+    'sh (Service time of customer h in cluster i)',
+    'ah (Start of time window of customer h in cluster i)',
+    'bh (End of time window of customer h in cluster i)',
+    'Ni (set of customer nodes in cluster i)',
+    'Mihk',
+    'eta_',
+    'eta_il',
+    'eil',
+    'mi',
+)
+ARC_KEYS = (
+    'dij (Distance between first-level nodes i and j)',
+    'tij (Travel time between first-level nodes i and j)',
+    'Mij',
+)
+
+# Dissimilarity of two clusters: distance between their parking locations and between the centres of
+# their time windows
+def dissimilarity(i, j, data):
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    dij = data['dij (Distance between first-level nodes i and j)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    if i == j:
+        return 0
+    centre_i = (ah[i][0] + bh[i][len(Ni[i]) + 1]) / 2
+    centre_j = (ah[j][0] + bh[j][len(Ni[j]) + 1]) / 2
+    return (dij[(i, j)] + dij[(j, i)]) / 2 + TIME_WINDOW_WEIGHT * abs(centre_i - centre_j)
+
+# Partition the clusters into regions by k-medoids, seeded as k-means++
+def partition_clusters(data, regions, seed=0):
+    N = data['N (set of cluster indices)']
+    rng = random.Random(seed)
+    regions = max(1, min(regions, len(N)))
+    distance = {(i, j): dissimilarity(i, j, data) for i in N for j in N}
+
+    medoids = [rng.choice(N)]
+    while len(medoids) < regions:
+        weights = [min(distance[i, medoid] for medoid in medoids) ** 2 for i in N]
+        medoids.append(rng.choices(N, weights)[0] if sum(weights) > 0 else rng.choice([i for i in N if i not in medoids]))
+
+    for _ in range(KMEDOIDS_ITERATIONS):
+        members = {medoid: [] for medoid in medoids}
+        for i in N:
+            members[min(medoids, key=lambda medoid: distance[i, medoid])].append(i)
+        updated = [min(cluster_members, key=lambda i: sum(distance[i, j] for j in cluster_members)) for cluster_members in members.values()]
+        if set(updated) == set(medoids):
+            break
+        medoids = updated
+    return [cluster_members for cluster_members in members.values() if cluster_members]
+
+# Instance restricted to the given clusters, numbered 1..len(clusters) in that order, with the same depot
+def region_instance(data, clusters):
+    N = data['N (set of cluster indices)']
+    end = len(N) + 1
+    mapping = {0: 0, end: len(clusters) + 1, **{i: n + 1 for n, i in enumerate(clusters)}}
+
+    region_data = {
+        'vehicle_number': data['vehicle_number'],
+        'vehicle_capacity': data['vehicle_capacity'],
+        'clusters (parking locations)': len(clusters),
+        'customers (total clients)': sum(len(data['Ni (set of customer nodes in cluster i)'][i]) for i in clusters),
+        'N0 (Set of nodes including depot start and end)': list(range(len(clusters) + 2)),
+        'N (set of cluster indices)': list(range(1, len(clusters) + 1)),
+        'A (Set of arcs for first-level routes)': [(mapping[i], mapping[j]) for (i, j) in data['A (Set of arcs for first-level routes)'] if i in mapping and j in mapping],
+    }
+    for key in CLUSTER_KEYS:
+        region_data[key] = {mapping[i]: value for i, value in data[key].items() if i in mapping}
+    for key in ARC_KEYS:
+        region_data[key] = {(mapping[i], mapping[j]): value for (i, j), value in data[key].items() if i in mapping and j in mapping}
+    return region_data
+
+# Solve one region in a worker process; None when the algorithm stops without a solution
+def solve_region(algorithm, region_name, region_data, profile, aggregated):
+    set_gurobi_threads(profile['Threads'])
+    result = ALGORITHMS[algorithm](region_name, region_data, profile=profile, aggregated=aggregated)
+    if result['objective_value'] is None:
+        logger.warning(f"{algorithm} stopped without a solution on {region_name}: status {result['status']}")
+        return None
+    return result
+
+# Solve the instance by regions of about REGION_SIZE clusters (or the given number of regions) with the
+# algorithm ("CF+VI's" or "BBC"), in at most processes parallel processes, and repair the merged solution
+# with the ALNS. The TimeLimit of the Decomposition profile is the total time limit; the regions are solved
+# with the other parameters of the profile of the algorithm. The total_threads (all the cores by default) are
+# split between the processes. callbacks are accepted for the interface of the other algorithms; they cannot
+# be sent to the worker processes.
+def run_decomposition(instance_name, data, algorithm="BBC", regions=None, processes=None, total_threads=None, profile=DEFAULT_PROFILE, seed=0, aggregated=False, callbacks=()):
+    N = data['N (set of cluster indices)']
+    start_time = time.time()
+    time_limit = (profile if isinstance(profile, dict) else get_profile("Decomposition", profile)).get('TimeLimit', math.inf)
+    profile_name = "custom" if isinstance(profile, dict) else profile
+
+    partition = partition_clusters(data, regions or math.ceil(len(N) / REGION_SIZE), seed)
+    total_threads = total_threads or os.cpu_count()
+    processes = max(1, min(len(partition), processes or total_threads))
+    threads = max(1, total_threads // processes)
+    batches = math.ceil(len(partition) / processes)
+    region_profile = {**(profile if isinstance(profile, dict) else get_profile(algorithm, profile)),
+                      "TimeLimit": time_limit * (1 - REPAIR_SHARE) / batches, "Threads": threads}
+    logger.info(f"{instance_name} decomposition: {len(partition)} regions of sizes {[len(clusters) for clusters in partition]}, "
+                f"{processes} processes with {threads} threads, {batches} batches of {region_profile['TimeLimit']:.1f} s")
+
+    # Gurobi environments cannot be shared with forked processes
+    context = mp.get_context("spawn")
+    tasks = [(algorithm, f"{instance_name}_region{n}", region_instance(data, clusters), region_profile, aggregated)
+             for n, clusters in enumerate(partition)]
+    with context.Pool(processes) as pool:
+        region_results = pool.starmap(solve_region, tasks)
+    regions_time = time.time() - start_time
+
+    # Merge the regional routes, in the numbering of the instance
+    merged, unsolved = [], []
+    for clusters, result in zip(partition, region_results):
+        if result is None:
+            unsolved += clusters
+            continue
+        for route in result['routes']['first_level']:
+            merged.append([route['l'], [clusters[j - 1] for j in route['clusters']]])
+    if unsolved:
+        logger.warning(f"{instance_name} decomposition: {len(unsolved)} clusters of unsolved regions inserted greedily")
+        merged = greedy_insertion(merged, unsolved, data, random.Random(seed))
+
+    # Exact cost of the merged routes, None when the greedy insertion failed or the routes are infeasible
+    merged_objective = exact_cost(merged, data, {}) if merged is not None else None
+    if merged_objective is None:
+        logger.warning(f"{instance_name} decomposition: merged solution rejected, the ALNS starts from its greedy solution")
+        merged = None
+
+    # Repair phase: ALNS from the merged routes, on the whole instance
+    repair_time = max(time_limit - (time.time() - start_time), REPAIR_SHARE * time_limit)
+    result = run_ALNSoptimize(instance_name, data, time_limit=repair_time, seed=seed, start=merged)
+    if result['objective_value'] is None:
+        return {**result, "algorithm": f"Decomposition[{algorithm}]", "profile": profile_name, "merged_objective": merged_objective}
+
+    logger.info(f"{instance_name} decomposition: regions solved in {round(regions_time, 2)} s, merged solution "
+                f"{merged_objective}, repaired solution {result['objective_value']}")
+
+    return {
+        **result,
+        "algorithm": f"Decomposition[{algorithm}]",
+        "profile": profile_name,
+        "runtime": round(time.time() - start_time, 2),
+        "first_incumbent_time": round(regions_time + result['first_incumbent_time'], 2),
+        "best_history": [(round(regions_time + elapsed, 2), iteration, cost) for elapsed, iteration, cost in result['best_history']],
+        "regions": [{"clusters": clusters, "status": region_result and region_result['status'],
+                     "objective_value": region_result and region_result['objective_value']}
+                    for clusters, region_result in zip(partition, region_results)],
+        "merged_objective": merged_objective,
+    }
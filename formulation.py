@@ -0,0 +1,430 @@
+import gurobipy as gp
+from gurobipy import GRB
+import itertools
+import math
+from logging_config import apply_gurobi_output
+
+# =====================================================
+# Title: Shared Formulation Builder for VRPTWMD2R
+# Description: This script builds the compact formulation (CF), the enhanced
+#              compact formulation with valid inequalities (CF+VIs) and the
+#              Restricted Master Problem (RMP) of the BBC algorithm from a
+#              single set of constraint families. The in- and out-arc lists of
+#              the first- and second-level graphs are precomputed once, so that
+#              no constraint has to scan the whole arc set to find its arcs.
+# =====================================================
+
+# Define global parameters
+ML = 3  # Maximum number of deliverymen per vehicle
+fv = 1000  # Fixed cost of using a vehicle
+fd = 100   # Additional cost per deliveryman
+cv = 10    # Cost coefficient for vehicle routing distance
+cd = 1     # Cost coefficient for deliveryman routing distance
+
+# Constraint families
+#   first_level:  (2), (3), (4), (10) on the x and w variables
+#   capacity:     (5), (12), (14) on the load variables u
+#   second_level: (6), (7), (8), (9), (11), (16) on the deliveryman variables y
+#   master:       (29), (30), (30b) on the eta variables of the RMP
+#   aggregated:   binary arc variables xa_ij and deliveryman assignment variables z_il, with the x_ijl
+#                 kept as continuous copies linked to them (l constant along each route)
+CF_FAMILIES = ("first_level", "capacity", "second_level")
+MASTER_FAMILIES = ("first_level", "master")
+AGGREGATED_FAMILY = "aggregated"
+
+# Add the aggregated first-level variables to a set of constraint families
+def formulation_families(families, aggregated):
+    if aggregated:
+        return tuple(families) + (AGGREGATED_FAMILY,)
+    return tuple(families)
+
+def formulation_name(aggregated):
+    return "aggregated" if aggregated else "disaggregated"
+
+# Valid inequalities (17)-(25); (17), (18), (19) and (25) need the second-level variables
+VALID_INEQUALITIES = ("c17", "c18", "c19", "c20", "c21", "c22", "c23", "c24", "c25")
+MASTER_VALID_INEQUALITIES = ("c20", "c21", "c22", "c23", "c24")
+
+# Subtour constraints on subsets of two and three nodes that can be left out of the model and separated lazily
+LAZY_SUBTOUR_INEQUALITIES = ("c18", "c21")
+SUBTOUR_EPSILON = 1e-6
+
+# Remove the constraints (18) and (21) from a set of valid inequalities when they are separated lazily
+def eager_valid_inequalities(valid_inequalities, lazy_subtours):
+    if not lazy_subtours:
+        return tuple(valid_inequalities)
+    return tuple(vi for vi in valid_inequalities if vi not in LAZY_SUBTOUR_INEQUALITIES)
+
+# Precompute the in- and out-arc lists of the first-level graph and of the second-level graph of each cluster
+def arc_adjacency(data):
+    N = data['N (set of cluster indices)']
+    N0 = data['N0 (Set of nodes including depot start and end)']
+    A = data['A (Set of arcs for first-level routes)']
+    Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+    N0i = data['N0i (set of nodes including depot start and end)']
+
+    in_arcs = {i: [] for i in N0}
+    out_arcs = {i: [] for i in N0}
+    for (i, j) in A:
+        out_arcs[i].append((i, j))
+        in_arcs[j].append((i, j))
+
+    in_arcs_i = {}
+    out_arcs_i = {}
+    for i in N:
+        in_arcs_i[i] = {h: [] for h in N0i[i]}
+        out_arcs_i[i] = {h: [] for h in N0i[i]}
+        for (h, k) in Ai[i]:
+            out_arcs_i[i][h].append((h, k))
+            in_arcs_i[i][k].append((h, k))
+
+    return {
+        'in_arcs': in_arcs,
+        'out_arcs': out_arcs,
+        'A_set': set(A),
+        'in_arcs_i': in_arcs_i,
+        'out_arcs_i': out_arcs_i,
+        'Ai_set': {i: set(Ai[i]) for i in N},
+    }
+
+def build_model(name, data, families=CF_FAMILIES, valid_inequalities=()):
+    N = data['N (set of cluster indices)']
+    N0 = data['N0 (Set of nodes including depot start and end)']
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    N0i = data['N0i (set of nodes including depot start and end)']
+    Q = data['vehicle_capacity']
+    qi = data['qi (Demand of cluster i)']
+    L = range(1, ML + 1)
+    A = data['A (Set of arcs for first-level routes)']
+    Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+    dij = data['dij (Distance between first-level nodes i and j)']
+    dihk = data['dihk (Distance between second-level nodes h and k of cluster i)']
+    tij = data['tij (Travel time between first-level nodes i and j)']
+    tihk = data['tihk (Travel time between second-level nodes h and k of cluster i)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    sh = data['sh (Service time of customer h in cluster i)']
+    Mihk = data['Mihk']
+    Mij = data['Mij']
+
+    adjacency = arc_adjacency(data)
+    in_arcs = adjacency['in_arcs']
+    out_arcs = adjacency['out_arcs']
+    in_arcs_i = adjacency['in_arcs_i']
+    out_arcs_i = adjacency['out_arcs_i']
+    A_set = adjacency['A_set']
+    Ai_set = adjacency['Ai_set']
+    end = len(N) + 1
+
+    # Create the model
+    m = gp.Model(name)
+    apply_gurobi_output(m)
+
+    # Decision variables
+    variables = {}
+    aggregated = AGGREGATED_FAMILY in families
+    if aggregated:
+        # The x copies only record the l of the route; the branching is done on xa and z
+        x = m.addVars([((i, j), l) for (i, j) in A for l in L], lb=0, ub=1, vtype=GRB.CONTINUOUS, name="x")
+        for (i, j) in A:
+            if i not in N and j not in N:
+                for l in L:
+                    x[(i, j), l].VType = GRB.BINARY
+        xa = m.addVars(A, vtype=GRB.BINARY, name="xa")  # xa_ij whether a vehicle travels from node i to j, (i,j) in A
+        z = m.addVars(N, L, vtype=GRB.BINARY, name="z")  # z_il whether cluster i is served by a vehicle with l delman
+        variables['xa'] = xa
+        variables['z'] = z
+    else:
+        x = m.addVars([((i, j), l) for (i, j) in A for l in L], vtype=GRB.BINARY, name="x")   # xijl  whether a vehicle travels from node i to j with l delman (i,j) in A, l in L
+    variables['x'] = x
+    if "second_level" in families:
+        y = m.addVars([(i, (h, k)) for i in N for (h, k) in Ai[i]], vtype=GRB.BINARY, name="y")  # whether a delman travels from h to k in Ai within cluster i
+        variables['y'] = y
+    if "capacity" in families:
+        u = m.addVars(N0, vtype=GRB.CONTINUOUS, name="u")  # ui vehicle load after leaving node i in N0
+        variables['u'] = u
+    if "master" in families:
+        eta = m.addVars(N, vtype=GRB.CONTINUOUS, name="eta")  # eta_i second-level cost of cluster i
+        variables['eta'] = eta
+    w = m.addVars([(i, h) for i in N for h in N0i[i]], vtype=GRB.CONTINUOUS, name="w")  # wh time when service at node h in cluster i begins
+    variables['w'] = w
+
+    # Objective function
+    objective = gp.quicksum((fv + l * fd) * x[(0, j), l] for j in N for l in L) + cv * gp.quicksum(dij[(i, j)] * x[(i, j), l] for (i, j) in A for l in L)
+    if "second_level" in families:
+        objective += cd * gp.quicksum(dihk[i][(h, k)] * y[i, (h, k)] for i in N for (h, k) in Ai[i])
+    if "master" in families:
+        objective += gp.quicksum(eta[i] for i in N)
+    m.setObjective(objective, GRB.MINIMIZE)
+
+    # Number of vehicles travelling on an arc, over all l
+    def arc_flow(arc):
+        if aggregated:
+            return xa[arc]
+        return gp.quicksum(x[arc, l] for l in L)
+
+    if aggregated:
+        # Link the x copies of an arc to its aggregated variable
+        m.addConstrs((gp.quicksum(x[arc, l] for l in L) == xa[arc] for arc in A), name="agg_arc")
+
+        # Each cluster is served by a vehicle with exactly one number of deliverymen
+        m.addConstrs((z.sum(i, '*') == 1 for i in N), name="agg_assign")
+
+        # Keep l constant along a route: an arc can only use the copy l of both of its clusters
+        m.addConstrs((x[(i, j), l] <= z[i, l] for (i, j) in A if i in N for l in L), name="agg_link_out")
+        m.addConstrs((x[(i, j), l] <= z[j, l] for (i, j) in A if j in N for l in L), name="agg_link_in")
+
+    if "first_level" in families:
+        # Constraint (2): Ensure exactly one delivery man visits each cluster
+        m.addConstrs((gp.quicksum(arc_flow(arc) for arc in in_arcs[j]) == 1 for j in N), name="c2")
+
+        # Constraint (3): Flow balance constraints
+        m.addConstrs((gp.quicksum(x[arc, l] for arc in in_arcs[j]) == gp.quicksum(x[arc, l] for arc in out_arcs[j]) for j in N for l in L), name="c3")
+
+        # Constraint (4): Depot flow constraints
+        m.addConstrs((gp.quicksum(x[(0, i), l] for i in N) == gp.quicksum(x[(i, end), l] for i in N) for l in L), name="c4")
+
+    if "capacity" in families:
+        # Constraint (5): Load constraints at first-level nodes
+        m.addConstrs((u[j] >= u[i] + qi[j] - Q * (1 - arc_flow((i, j))) for (i, j) in A), name="c5")
+
+    if "second_level" in families:
+        # Constraint (6): Ensure exactly one visit at the second-level nodes
+        m.addConstrs((gp.quicksum(y[i, arc] for arc in in_arcs_i[i][k]) == 1 for i in N for k in Ni[i]), name="c6")
+
+        # Constraint (7): Flow balance at second-level nodes
+        m.addConstrs((gp.quicksum(y[i, arc] for arc in in_arcs_i[i][k]) == gp.quicksum(y[i, arc] for arc in out_arcs_i[i][k]) for i in N for k in Ni[i]), name="c7")
+
+        # Constraint (8): Depot flow constraints at second level
+        m.addConstrs((gp.quicksum(y[i, (0, h)] for h in Ni[i]) == gp.quicksum(y[i, (h, len(Ni[i]) + 1)] for h in Ni[i]) for i in N), name="c8")
+
+        # Constraint (9): Second-level time constraints
+        m.addConstrs((w[i, k] >= w[i, h] + sh[i][h] + tihk[i][(h, k)] - Mihk[i][(h, k)] * (1 - y[i, (h, k)]) for i in N for (h, k) in Ai[i]), name="c9")
+
+    if "first_level" in families:
+        # Constraint (10): First-level vehicle time constraints
+        m.addConstrs((w[j, 0] >= w[i, len(Ni[i]) + 1] + tij[i, j] - Mij[(i, j)] * (1 - arc_flow((i, j))) for (i, j) in A if i in N and j in N), name="c10")
+
+    if "second_level" in families:
+        # Constraint (11): Maximum number of delivery men at each cluster
+        if aggregated:
+            m.addConstrs((gp.quicksum(y[j, (0, h)] for h in Ni[j]) <= gp.quicksum(l * z[j, l] for l in L) for j in N), name="c11")
+        else:
+            m.addConstrs((gp.quicksum(y[j, (0, h)] for h in Ni[j]) <= gp.quicksum(l * x[arc, l] for arc in in_arcs[j] for l in L) for j in N), name="c11")
+
+    if "capacity" in families:
+        # Constraint (12): Initial conditions
+        m.addConstr(u[0] == 0, "c12_u0")
+
+        # Constraint (13): Binary constraints for x
+        # These constraints are already implicit in the definition of the x variables as binary
+
+        # Constraint (14): Capacity constraints
+        for i in N0:
+            m.addConstr((qi[i] <= u[i]), name=f"c14_lower_{i}")
+            m.addConstr((u[i] <= Q), name=f"c14_upper_{i}")
+
+    if "second_level" in families:
+        # Constraint (15): Binary constraints for y
+        # These constraints are already implicit in the definition of the y variables as binary
+
+        # Constraint (16): Time window constraints
+        for i in N:
+            for h in N0i[i]:
+                m.addConstr((ah[i][h] <= w[i, h]), name=f"c16_lower_{i}_{h}")
+                m.addConstr((w[i, h] <= bh[i][h]), name=f"c16_upper_{i}_{h}")
+
+    add_valid_inequalities(m, data, variables, adjacency, valid_inequalities)
+
+    if "master" in families:
+        # Constraint (29): Time window constraints at the start and end nodes of each cluster
+        for i in N:
+            m.addConstr(ah[i][0] <= w[i, 0], name=f"c29_{i}_0_lower")
+            m.addConstr(w[i, 0] <= bh[i][0], name=f"c29_{i}_0_upper")
+
+            max_ord_cust_no = len(Ni[i]) + 1
+            m.addConstr(ah[i][max_ord_cust_no] <= w[i, max_ord_cust_no], name=f"c29_{i}_{max_ord_cust_no}_lower")
+            m.addConstr(w[i, max_ord_cust_no] <= bh[i][max_ord_cust_no], name=f"c29_{i}_{max_ord_cust_no}_upper")
+
+        # Constraint (30): Lower bound on eta
+        m.addConstrs((eta[i] >= data['eta_'][i] for i in N), name="c30")
+
+        # Constraint (30b): Lower bound on eta with the number of deliverymen l of the vehicle visiting the cluster.
+        # Below mi the cluster cannot be served and the bound with the fewest deliverymen that can serve it is
+        # used; the term is left out when no number of deliverymen can.
+        def eta_bound(i, l):
+            bounds = [data['eta_il'][i][l_] for l_ in L if l_ >= l and data['eta_il'][i][l_] < math.inf]
+            return bounds[0] if bounds else 0
+        if aggregated:
+            m.addConstrs((eta[i] >= gp.quicksum(eta_bound(i, l) * z[i, l] for l in L) for i in N), name="c30_il")
+        else:
+            m.addConstrs((eta[i] >= gp.quicksum(eta_bound(i, l) * x[arc, l] for arc in in_arcs[i] for l in L) for i in N), name="c30_il")
+
+    return m, variables
+
+def add_valid_inequalities(m, data, variables, adjacency, valid_inequalities):
+    N = data['N (set of cluster indices)']
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    Q = data['vehicle_capacity']
+    qi = data['qi (Demand of cluster i)']
+    L = range(1, ML + 1)
+    A = data['A (Set of arcs for first-level routes)']
+    Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+    tij = data['tij (Travel time between first-level nodes i and j)']
+    tihk = data['tihk (Travel time between second-level nodes h and k of cluster i)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    sh = data['sh (Service time of customer h in cluster i)']
+    eil = data['eil']
+    mi = data['mi']
+
+    x = variables['x']
+    xa = variables.get('xa')
+    z = variables.get('z')
+    y = variables.get('y')
+    w = variables['w']
+    out_arcs = adjacency['out_arcs']
+    A_set = adjacency['A_set']
+    Ai_set = adjacency['Ai_set']
+
+    if "c17" in valid_inequalities:
+        # Constraint (17): Ensure at least one deliveryman leaves each parking location.
+        m.addConstrs((gp.quicksum(y[i, (0, h)] for h in Ni[i]) >= 1 for i in N), name="c17")
+
+    if "c18" in valid_inequalities:
+        # Constraint (18): Eliminate small subtours of two and three customers in second-level routes.
+        for i in N:
+            for subset_size in [2, 3]:
+                for subset in itertools.combinations(Ni[i], subset_size):
+                    subset_arcs = [(h, k) for h in subset for k in subset if h != k and (h, k) in Ai_set[i]]
+                    if subset_arcs:
+                        m.addConstr((gp.quicksum(y[i, arc] for arc in subset_arcs) <= subset_size - 1), name=f"c18_{i}_{subset}")
+
+    if "c19" in valid_inequalities:
+        # Constraint (19): Remove infeasible second-level arcs due to time window incompatibility.
+        m.addConstrs((y[i, (h, k)] == 0 for i in N for (h, k) in Ai[i] if ah[i][h] + sh[i][h] + tihk[i][(h, k)] > bh[i][k]), name="c19")
+
+    if "c20" in valid_inequalities:
+        # Constraint (20): Define a lower bound on the number of vehicles needed to serve all the clusters based on the total cluster demands and vehicle capacity.
+        lower_bound_vehicles = math.ceil(sum(qi[i] for i in N) / Q)
+        if xa is not None:
+            m.addConstr((gp.quicksum(xa[(0, j)] for j in N) >= lower_bound_vehicles), name="c20")
+        else:
+            m.addConstr((gp.quicksum(x[(0, j), l] for j in N for l in L) >= lower_bound_vehicles), name="c20")
+
+    if "c21" in valid_inequalities:
+        # Constraint (21): Eliminate subtours for sets of two and three clusters in first-level routes.
+        for subset_size in [2, 3]:
+            for subset in itertools.combinations(N, subset_size):
+                subset_arcs = [(i, j) for i in subset for j in subset if i != j and (i, j) in A_set]
+                if subset_arcs:
+                    if xa is not None:
+                        m.addConstr((gp.quicksum(xa[arc] for arc in subset_arcs) <= subset_size - 1), name=f"c21_{subset}")
+                    else:
+                        m.addConstr((gp.quicksum(x[arc, l] for arc in subset_arcs for l in L) <= subset_size - 1), name=f"c21_{subset}")
+
+    if "c22" in valid_inequalities:
+        # Constraint (22): Eliminate first-level arcs that are infeasible due to vehicle capacity or time windows incompatibility.
+        if xa is not None:
+            m.addConstrs((xa[(i, j)] == 0 for (i, j) in A if i in Ni and j in Ni and (qi[i] + qi[j] > Q or ah[i][len(Ni[i]) + 1] + tij[i, j] > bh[j][0])), name="c22")
+        else:
+            m.addConstrs((x[(i, j), l] == 0 for (i, j) in A for l in L if i in Ni and j in Ni and (qi[i] + qi[j] > Q or ah[i][len(Ni[i]) + 1] + tij[i, j] > bh[j][0])), name="c22")
+
+    if "c23" in valid_inequalities:
+        # Constraint (23): Provide an estimation on the minimum time spent on the cluster.
+        if z is not None:
+            m.addConstrs((w[i, len(Ni[i]) + 1] >= w[i, 0] + gp.quicksum(eil[i][l] * z[i, l] for l in L) for i in N), name="c23")
+        else:
+            m.addConstrs((w[i, len(Ni[i]) + 1] >= w[i, 0] + gp.quicksum(eil[i][l] * x[arc, l] for arc in out_arcs[i] for l in L) for i in N), name="c23")
+
+    if "c24" in valid_inequalities:
+        # Constraint (24): Forbid the visit of the cluster by a vehicle with fewer deliverymen than needed to serve it.
+        # With the aggregated variables, the number of deliverymen of the cluster is fixed instead (linked to x by agg_link)
+        if z is not None:
+            m.addConstrs((z[i, l] == 0 for i in N for l in L if l < mi[i]), name="c24")
+        else:
+            m.addConstrs((x[(i, j), l] == 0 for (i, j) in A for l in L if i in mi and j in mi and (l < mi[i] or l < mi[j])), name="c24")
+
+    if "c25" in valid_inequalities:
+        # Constraint (25): Ensure that the number of deliverymen leaving a parking location respects its lower bound.
+        m.addConstrs((gp.quicksum(y[i, (0, h)] for h in Ni[i]) >= mi[i] for i in N), name="c25")
+
+# Find the subsets of two and three nodes violating a constraint of type (18)/(21) for the given arc flows.
+# A violated three-node subset always contains an arc of the support and a node adjacent to it,
+# so only those subsets are enumerated instead of all the O(n^3) combinations.
+def separate_small_subtours(flow, nodes):
+    nodes = set(nodes)
+    support = {(i, j): value for (i, j), value in flow.items() if value > SUBTOUR_EPSILON and i in nodes and j in nodes}
+
+    neighbours = {}
+    for (i, j) in support:
+        neighbours.setdefault(i, set()).add(j)
+        neighbours.setdefault(j, set()).add(i)
+
+    def subset_flow(subset):
+        return sum(support.get((i, j), 0) for i in subset for j in subset if i != j)
+
+    violated = []
+    checked = set()
+    for (i, j) in support:
+        pair = tuple(sorted((i, j)))
+        if pair not in checked:
+            checked.add(pair)
+            if subset_flow(pair) > 1 + SUBTOUR_EPSILON:
+                violated.append(pair)
+
+        for k in neighbours[i] | neighbours[j]:
+            if k == i or k == j:
+                continue
+            triple = tuple(sorted((i, j, k)))
+            if triple not in checked:
+                checked.add(triple)
+                if subset_flow(triple) > 2 + SUBTOUR_EPSILON:
+                    violated.append(triple)
+
+    return violated
+
+# Callback separating the constraints (21) and (18) left out of the model, on integer (MIPSOL)
+# and fractional (MIPNODE) solutions. The model needs the attributes _data, _x (for (21)),
+# _y and _subtour_clusters (for (18)), _lazy_subtours, _subtour_cuts, _lazy_count (lazy constraints added
+# since it was last reset) and LazyConstraints=1.
+def separate_lazy_subtours(model, where):
+    if where == GRB.Callback.MIPSOL:
+        get_values = model.cbGetSolution
+    elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+        get_values = model.cbGetNodeRel
+    else:
+        return
+
+    data = model._data
+    L = range(1, ML + 1)
+
+    if "c21" in model._lazy_subtours:
+        N = data['N (set of cluster indices)']
+        A_set = set(data['A (Set of arcs for first-level routes)'])
+        x = model._x
+        flow = {}
+        for ((i, j), l), value in get_values(x).items():
+            flow[(i, j)] = flow.get((i, j), 0) + value
+
+        for subset in separate_small_subtours(flow, N):
+            if ("c21", subset) not in model._subtour_cuts:
+                subset_arcs = [(i, j) for i in subset for j in subset if i != j and (i, j) in A_set]
+                model.cbLazy(gp.quicksum(x[arc, l] for arc in subset_arcs for l in L) <= len(subset) - 1)
+                model._subtour_cuts.add(("c21", subset))
+                model._lazy_count += 1
+
+    if "c18" in model._lazy_subtours:
+        Ni = data['Ni (set of customer nodes in cluster i)']
+        Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+        y = model._y
+        y_values = get_values(y)
+        for i in model._subtour_clusters:
+            flow = {(h, k): y_values[i, (h, k)] for (h, k) in Ai[i]}
+            Ai_set = set(Ai[i])
+            for subset in separate_small_subtours(flow, Ni[i]):
+                if ("c18", i, subset) not in model._subtour_cuts:
+                    subset_arcs = [(h, k) for h in subset for k in subset if h != k and (h, k) in Ai_set]
+                    model.cbLazy(gp.quicksum(y[i, arc] for arc in subset_arcs) <= len(subset) - 1)
+                    model._subtour_cuts.add(("c18", i, subset))
+                    model._lazy_count += 1
@@ -0,0 +1,148 @@
+from formulation import build_model, eager_valid_inequalities, CF_FAMILIES, VALID_INEQUALITIES, ML
+from logging_config import get_logger
+
+# =====================================================
+# Title: Granular Arc Sparsification for VRPTWMD2R
+# Description: This script builds the granular version of an instance: the
+#              complete first-level graph A and second-level graphs Ai are
+#              replaced by sparse graphs keeping, for every node, only the
+#              arcs to its k nearest neighbours among those compatible with
+#              the capacity and the time windows, plus all the arcs from and
+#              to the depot (first level) and the parking location (second
+#              level). Every formulation built on the returned data (CF,
+#              CF+VI's, the RMP and the SPs of BBC, the pricing of CG) uses
+#              the sparse graphs. An optional verification pass solves the LP
+#              relaxation of CF+VI's without the subset inequalities (18)
+#              and (21) on the complete graphs with the pruned arcs fixed to
+#              0, and re-admits the pruned arcs whose reduced cost could lead
+#              to a solution better than an upper bound.
+#              The incompatible arcs are never re-admitted. The lower bounds
+#              (mi, eil, eta_, eta_il) of the complete instance stay valid.
+# =====================================================
+
+logger = get_logger(__name__)
+
+GRANULAR_NEIGHBOURS = 5    # Nearest compatible successors kept for every node
+READMISSION_GAP = 0.05     # Upper bound of the verification, relative to its LP bound, when none is given
+EPSILON = 1e-6
+
+L = range(1, ML + 1)
+
+# Whether cluster j can follow cluster i on a vehicle: capacity and time windows of the parking
+# locations, leaving i at the earliest after the eil bound with the most deliverymen
+def first_level_compatible(i, j, data):
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    qi = data['qi (Demand of cluster i)']
+    tij = data['tij (Travel time between first-level nodes i and j)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    if qi[i] + qi[j] > data['vehicle_capacity']:
+        return False
+    finish = max(ah[i][0] + data['eil'][i][ML], ah[i][len(Ni[i]) + 1])
+    return finish + tij[(i, j)] <= bh[j][0] + EPSILON
+
+# Whether customer k can follow customer h on a deliveryman route of cluster i
+def second_level_compatible(i, h, k, data):
+    tihk = data['tihk (Travel time between second-level nodes h and k of cluster i)']
+    sh = data['sh (Service time of customer h in cluster i)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    return ah[i][h] + sh[i][h] + tihk[i][(h, k)] <= bh[i][k] + EPSILON
+
+# Split the arcs between two inner nodes into the arcs to the nearest compatible successors of their
+# tail and the compatible arcs pruned; the incompatible arcs are dropped
+def nearest_arcs(arcs, distance, compatible, neighbours):
+    successors = {}
+    for (h, k) in arcs:
+        if compatible(h, k):
+            successors.setdefault(h, []).append((distance[(h, k)], k))
+    kept, pruned = set(), []
+    for h, options in successors.items():
+        options.sort()
+        kept.update((h, k) for _, k in options[:neighbours])
+        pruned += [(h, k) for _, k in options[neighbours:]]
+    return kept, pruned
+
+# Granular version of the data of an instance, keeping the neighbours nearest compatible successors of
+# every node. The pruned arcs are recorded in data['pruned_arcs'] ('A', and 'Ai' by cluster) for
+# readmit_arcs.
+def granular_instance(data, neighbours=GRANULAR_NEIGHBOURS):
+    N = data['N (set of cluster indices)']
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    A = data['A (Set of arcs for first-level routes)']
+    Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+    dij = data['dij (Distance between first-level nodes i and j)']
+    dihk = data['dihk (Distance between second-level nodes h and k of cluster i)']
+
+    inner = [(i, j) for (i, j) in A if i in N and j in N]
+    kept, pruned_A = nearest_arcs(inner, dij, lambda i, j: first_level_compatible(i, j, data), neighbours)
+    sparse_A = [(i, j) for (i, j) in A if (i, j) in kept or i not in N or j not in N]
+
+    sparse_Ai, pruned_Ai = {}, {}
+    for i in N:
+        end = len(Ni[i]) + 1
+        inner = [(h, k) for (h, k) in Ai[i] if h != 0 and k != end]
+        kept, pruned_Ai[i] = nearest_arcs(inner, dihk[i], lambda h, k: second_level_compatible(i, h, k, data), neighbours)
+        sparse_Ai[i] = [(h, k) for (h, k) in Ai[i] if (h, k) in kept or h == 0 or k == end]
+
+    granular_data = dict(data)
+    granular_data['A (Set of arcs for first-level routes)'] = sparse_A
+    granular_data['Ai (set of arcs related to the second-level routes inside cluster i)'] = sparse_Ai
+    granular_data['pruned_arcs'] = {'A': pruned_A, 'Ai': pruned_Ai}
+
+    second_level_arcs = sum(len(Ai[i]) for i in N)
+    logger.info(f"Granular graphs with {neighbours} neighbours: {len(sparse_A)}/{len(A)} first-level arcs, "
+                f"{sum(len(sparse_Ai[i]) for i in N)}/{second_level_arcs} second-level arcs")
+    return granular_data
+
+# Verification of a granular instance: solve the LP relaxation of CF+VI's with the pruned arcs fixed to 0
+# and re-admit the pruned arcs whose reduced cost is at most the gap between upper_bound and the LP bound
+# (for any l on the first level). Without upper_bound, it is the LP bound increased by READMISSION_GAP.
+# The LP is built on the complete graphs, without the O(n^3) subset inequalities (18) and (21): its bound
+# is weaker, which only re-admits more arcs. Returns the granular data with the re-admitted arcs.
+def readmit_arcs(data, upper_bound=None):
+    N = data['N (set of cluster indices)']
+    A = data['A (Set of arcs for first-level routes)']
+    Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+    pruned = data['pruned_arcs']
+
+    complete_data = dict(data)
+    complete_data['A (Set of arcs for first-level routes)'] = A + pruned['A']
+    complete_data['Ai (set of arcs related to the second-level routes inside cluster i)'] = {i: Ai[i] + pruned['Ai'][i] for i in N}
+    m, variables = build_model("granular_verification", complete_data, CF_FAMILIES, eager_valid_inequalities(VALID_INEQUALITIES, True))
+    x, y = variables['x'], variables['y']
+    for arc in pruned['A']:
+        for l in L:
+            x[arc, l].UB = 0
+    for i in N:
+        for arc in pruned['Ai'][i]:
+            y[i, arc].UB = 0
+
+    m.update()
+    relaxation = m.relax()
+    relaxation.optimize()
+    if relaxation.SolCount == 0:
+        logger.warning(f"Granular verification LP not solved (status {relaxation.Status}): no arc re-admitted")
+        return data
+
+    relaxed_vars = relaxation.getVars()
+    def reduced_cost(var):
+        return relaxed_vars[var.index].RC
+
+    bound = relaxation.ObjVal
+    threshold = (upper_bound if upper_bound is not None else bound * (1 + READMISSION_GAP)) - bound + EPSILON
+    readmitted_A = {arc for arc in pruned['A'] if min(reduced_cost(x[arc, l]) for l in L) <= threshold}
+    readmitted_Ai = {i: {arc for arc in pruned['Ai'][i] if reduced_cost(y[i, arc]) <= threshold} for i in N}
+
+    readmitted_data = dict(data)
+    readmitted_data['A (Set of arcs for first-level routes)'] = A + [arc for arc in pruned['A'] if arc in readmitted_A]
+    readmitted_data['Ai (set of arcs related to the second-level routes inside cluster i)'] = {i: Ai[i] + [arc for arc in pruned['Ai'][i] if arc in readmitted_Ai[i]] for i in N}
+    readmitted_data['pruned_arcs'] = {
+        'A': [arc for arc in pruned['A'] if arc not in readmitted_A],
+        'Ai': {i: [arc for arc in pruned['Ai'][i] if arc not in readmitted_Ai[i]] for i in N},
+    }
+
+    logger.info(f"Granular verification (LP bound {bound:.1f}, reduced cost threshold {threshold:.1f}): re-admitted "
+                f"{len(readmitted_A)}/{len(pruned['A'])} first-level and "
+                f"{sum(len(readmitted_Ai[i]) for i in N)}/{sum(len(pruned['Ai'][i]) for i in N)} second-level arcs")
+    return readmitted_data
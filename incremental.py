@@ -0,0 +1,180 @@
+import random
+import time
+from data_processing import process_instance, cluster_second_level_data, second_level_big_m, first_level_big_m, cluster_lower_bounds
+from BBCoptimize import run_BBCoptimize
+from ALNSoptimize import remove_clusters, greedy_insertion, exact_cost, reduce_deliverymen
+from cut_pool import load_cut_pool, save_cut_pool
+from parameter_profiles import DEFAULT_PROFILE
+from logging_config import get_logger
+
+# =====================================================
+# Title: Incremental Re-optimization of Edited Instances
+# Description: This script re-solves an instance after small edits (a
+#              customer added to a cluster, a time window moved, a demand
+#              changed) without starting from scratch. A session keeps the
+#              raw instance, its processed data, the BBC cuts and the routes
+#              of the last solve. A delta only recomputes the data of its
+#              cluster: distances, time windows, the Mihk of the cluster and
+#              the Mij of its arcs, and the bounds mi, eil, eta_ and eta_il (the only
+#              SPs solved by the preprocessing, not needed for a demand). The
+#              BBC cuts that stay valid are carried over to the new instance
+#              through the cut pool: the cuts without the edited cluster, and
+#              those with it when the delta cannot invalidate them (a time
+#              window narrowed only removes SP solutions, a demand does not
+#              change the SPs, a larger demand only raises the RCIs and keeps
+#              the routes over capacity infeasible). The
+#              previous routes, with the edited clusters reinserted, are the
+#              MIP start of the next BBC solve.
+# =====================================================
+
+logger = get_logger(__name__)
+
+INCREMENTAL_CUT_POOL_DIR = "./incremental_cut_pools"
+
+# Data of a cluster in the order returned by cluster_second_level_data
+SECOND_LEVEL_KEYS = (
+    'dihk (Distance between second-level nodes h and k of cluster i)',
+    'tihk (Travel time between second-level nodes h and k of cluster i)',
+    'Ai (set of arcs related to the second-level routes inside cluster i)',
+    'Ni (set of customer nodes in cluster i)',
+    'N0i (set of nodes including depot start and end)',
+    'qi (Demand of cluster i)',
+    'sh (Service time of customer h in cluster i)',
+    'ah (Start of time window of customer h in cluster i)',
+    'bh (End of time window of customer h in cluster i)',
+)
+
+# A session on an instance read by read_instance, whose clusters and customers lists are edited in place
+def open_session(instance, cut_pool_dir=INCREMENTAL_CUT_POOL_DIR):
+    instance = list(instance)
+    return {
+        'instance': instance,
+        'data': process_instance(*instance),
+        'cut_pool_dir': cut_pool_dir,
+        'routes': None,
+        'changed': set(),
+    }
+
+# Edit the raw instance. A delta is a dictionary with a 'type' and the 'cluster' it edits:
+#   add_customer: x, y, demand, ready_time, due_date, service_time of the new customer
+#   time_window:  customer (ord_cust_no, 0 for the parking location), ready_time, due_date
+#   demand:       customer (ord_cust_no), demand
+# Returns the types of the cuts with the cluster that the delta can invalidate.
+def edit_instance(instance, delta):
+    clusters, customers = instance[3], instance[4]
+    i = delta['cluster']
+    nodes = {cust['ord_cust_no']: cust for cust in customers if cust['cluster'] == i}
+    end = max(nodes)
+    if delta['type'] != "add_customer" and delta['customer'] not in range(end):
+        raise ValueError(f"Unknown customer {delta['customer']} of cluster {i}")
+
+    if delta['type'] == "add_customer":
+        customers.append({
+            'id': max(cust['id'] for cust in customers) + 1,
+            'x': delta['x'],
+            'y': delta['y'],
+            'demand': delta['demand'],
+            'ready_time': delta['ready_time'],
+            'due_date': delta['due_date'],
+            'service_time': delta['service_time'],
+            'cluster': i,
+            'ord_cust_no': end
+        })
+        nodes[end]['ord_cust_no'] = end + 1
+        clusters[i]['demand'] += delta['demand']
+        instance[6] += 1
+        return {"optimality", "feasibility"}
+    elif delta['type'] == "time_window":
+        # The time window of the parking location is the one of its start and end nodes
+        node = nodes[delta['customer']]
+        narrowed = delta['ready_time'] >= node['ready_time'] and delta['due_date'] <= node['due_date']
+        edited = [node] if delta['customer'] != 0 else [clusters[i], nodes[0], nodes[end]]
+        for node in edited:
+            node['ready_time'] = delta['ready_time']
+            node['due_date'] = delta['due_date']
+        return set() if narrowed else {"optimality", "feasibility"}
+    elif delta['type'] == "demand":
+        # A smaller demand can make feasible the routes cut off for their capacity by the route oracle
+        decreased = delta['demand'] < nodes[delta['customer']]['demand']
+        clusters[i]['demand'] += delta['demand'] - nodes[delta['customer']]['demand']
+        nodes[delta['customer']]['demand'] = delta['demand']
+        return {"rci", "feasibility"} if decreased else set()
+    else:
+        raise ValueError(f"Unknown delta type: {delta['type']}")
+
+# Recompute the data of cluster i from the raw instance: second-level data, big-M constants of the cluster
+# and of the first-level arcs from and to it, and with bounds its lower bounds
+def update_cluster(instance, data, i, bounds=True):
+    instance_name, clusters, customers = instance[0], instance[3], instance[4]
+    for key, value in zip(SECOND_LEVEL_KEYS, cluster_second_level_data(clusters[i], customers)):
+        data[key][i] = value
+    data['customers (total clients)'] = instance[6]
+
+    Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+    tihk = data['tihk (Travel time between second-level nodes h and k of cluster i)']
+    sh = data['sh (Service time of customer h in cluster i)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    tij = data['tij (Travel time between first-level nodes i and j)']
+    arcs = [(j, k) for (j, k) in data['A (Set of arcs for first-level routes)'] if i in (j, k)]
+    data['Mihk'][i] = second_level_big_m(i, Ai, tihk, sh, ah, bh)
+    data['Mij'].update(first_level_big_m(instance_name, clusters, customers, arcs, tij, ah, bh))
+    if bounds:
+        cluster_lower_bounds(i, data)
+
+# Cuts that stay valid when cluster i is edited by a delta invalidating the given cut types
+def valid_cuts(cuts, i, invalidated):
+    kept = []
+    for cut in cuts:
+        if cut[0] in ("optimality", "feasibility"):
+            clusters = {node for arc in cut[1] for node in arc}
+        elif cut[0] == "rci":
+            clusters = set(cut[1])
+        else:
+            clusters = set()
+        if i not in clusters or cut[0] not in invalidated:
+            kept.append(cut)
+    return kept
+
+# Apply a delta (see edit_instance) to the instance of the session, recompute the data of its cluster
+# and move the cuts that stay valid to the cut pool of the edited instance
+def apply_delta(session, delta):
+    delta_start = time.time()
+    instance, data = session['instance'], session['data']
+    if delta['cluster'] not in data['N (set of cluster indices)']:
+        raise ValueError(f"Unknown cluster {delta['cluster']}")
+
+    cuts = load_cut_pool(instance[0], data, session['cut_pool_dir'])
+    invalidated = edit_instance(instance, delta)
+    update_cluster(instance, data, delta['cluster'], bounds=delta['type'] != "demand")
+    session['changed'].add(delta['cluster'])
+
+    kept = valid_cuts(cuts, delta['cluster'], invalidated)
+    if kept:
+        save_cut_pool(instance[0], data, kept, session['cut_pool_dir'])
+    logger.info(f"Delta {delta['type']} on cluster {delta['cluster']} applied in {time.time() - delta_start:.2f}s, "
+                f"{len(kept)}/{len(cuts)} cuts kept")
+
+# Routes of the last solve with the edited clusters removed and reinserted greedily, None when the
+# repair fails
+def warm_start(session, rng):
+    data = session['data']
+    cache = {}
+    solution = remove_clusters(session['routes'], session['changed'])
+    solution = greedy_insertion(solution, session['changed'], data, rng)
+    if solution is None or exact_cost(solution, data, cache) is None:
+        return None
+    return reduce_deliverymen(solution, data, cache)
+
+# Solve the instance of the session with BBC, from the cut pool of the previous solves and with the
+# repaired routes of the last solve as MIP start. The options are given to run_BBCoptimize.
+def resolve(session, profile=DEFAULT_PROFILE, seed=0, **options):
+    instance_name, data = session['instance'][0], session['data']
+    start = warm_start(session, random.Random(seed)) if session['routes'] is not None else None
+    if session['routes'] is not None and start is None:
+        logger.info("The routes of the last solve could not be repaired, solving without MIP start")
+
+    result = run_BBCoptimize(instance_name, data, cut_pool_dir=session['cut_pool_dir'], profile=profile, start=start, **options)
+    session['routes'] = [[route['l'], route['clusters']] for route in result['routes']['first_level']]
+    session['changed'] = set()
+    return result
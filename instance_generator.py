@@ -0,0 +1,131 @@
+import math
+import os
+import random
+
+# =====================================================
+# Title: Synthetic Instance Generator for VRPTWMD2R
+# Description: This script generates seeded instances in the format read by
+#              data_processing.read_instance, for controlled scaling studies.
+#              The parking locations (clusters) are placed on a 100 x 100
+#              grid in the Solomon R (uniform), C (grouped) or RC (mixed)
+#              style, and the customers of each cluster are scattered around
+#              it. The knobs are the number of clusters, the number of
+#              customers per cluster, the spatial distribution, the width of
+#              the time windows of the clusters and the customer demands.
+#              Every cluster can be served by a vehicle leaving the depot
+#              with a single deliveryman, so the instances are feasible.
+# =====================================================
+
+GENERATED_INSTANCES_DIR = "./generated_instances"
+
+GRID_SIZE = 100
+DEPOT = (50, 50)
+SERVICE_TIME = 10
+WALKING_FACTOR = 3  # Travel time of a deliveryman per unit of distance (tihk = 3 * dihk in data_processing)
+CUSTOMER_RADIUS = 5  # Maximum distance of a customer from its parking location
+GROUP_SPREAD = 8     # Standard deviation of the parking locations around a group centre (C style)
+HORIZON_SLACK = 1.2  # Horizon of the depot relative to the longest direct service of a cluster
+
+def euclidean_distance(x1, y1, x2, y2):
+    return int(((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5)
+
+def clamp(value):
+    return min(GRID_SIZE, max(0, value))
+
+def uniform_point(rng):
+    return rng.randint(0, GRID_SIZE), rng.randint(0, GRID_SIZE)
+
+def grouped_point(rng, centres):
+    cx, cy = rng.choice(centres)
+    return clamp(round(rng.gauss(cx, GROUP_SPREAD))), clamp(round(rng.gauss(cy, GROUP_SPREAD)))
+
+def parking_locations(rng, num_clusters, distribution):
+    centres = [uniform_point(rng) for _ in range(max(2, num_clusters // 5))]
+    locations = []
+    for n in range(num_clusters):
+        if distribution == "R" or (distribution == "RC" and n % 2 == 0):
+            locations.append(uniform_point(rng))
+        elif distribution in ("C", "RC"):
+            locations.append(grouped_point(rng, centres))
+        else:
+            raise ValueError(f"Unknown spatial distribution: {distribution}")
+    return locations
+
+def customer_locations(rng, parking, num_customers):
+    locations = []
+    for _ in range(num_customers):
+        angle = rng.uniform(0, 2 * math.pi)
+        radius = rng.uniform(1, CUSTOMER_RADIUS)
+        locations.append((clamp(round(parking[0] + radius * math.cos(angle))), clamp(round(parking[1] + radius * math.sin(angle)))))
+    return locations
+
+# Time needed by a single deliveryman to serve all the customers of a cluster in nearest-neighbour order
+def single_deliveryman_time(parking, customers):
+    time, current, remaining = 0, parking, list(customers)
+    while remaining:
+        nearest = min(remaining, key=lambda c: euclidean_distance(current[0], current[1], c[0], c[1]))
+        time += WALKING_FACTOR * euclidean_distance(current[0], current[1], nearest[0], nearest[1]) + SERVICE_TIME
+        current = nearest
+        remaining.remove(nearest)
+    return time + WALKING_FACTOR * euclidean_distance(current[0], current[1], parking[0], parking[1])
+
+def instance_name(num_clusters, customers_per_cluster, distribution, window_width, demand, seed):
+    width = "wide" if window_width is None else window_width
+    return f"G{distribution}-s{seed}-w{width}-d{demand[0]}x{demand[1]}_{num_clusters}_{num_clusters * customers_per_cluster}"
+
+# Generate an instance and return its name and the lines of its file.
+#   window_width: width of the time window of each cluster, None for windows spanning the whole horizon
+#   demand:       (min, max) demand of a customer
+#   capacity:     vehicle capacity, by default the largest cluster demand times 4
+def generate_instance(num_clusters, customers_per_cluster, distribution="RC", window_width=None, demand=(1, 10), capacity=None, seed=0):
+    rng = random.Random(seed)
+    name = instance_name(num_clusters, customers_per_cluster, distribution, window_width, demand, seed)
+
+    parkings = parking_locations(rng, num_clusters, distribution)
+    customers = [customer_locations(rng, parking, customers_per_cluster) for parking in parkings]
+    demands = [[rng.randint(demand[0], demand[1]) for _ in cluster_customers] for cluster_customers in customers]
+    service = [single_deliveryman_time(parking, cluster_customers) for parking, cluster_customers in zip(parkings, customers)]
+    to_depot = [euclidean_distance(DEPOT[0], DEPOT[1], parking[0], parking[1]) for parking in parkings]
+
+    horizon = math.ceil(HORIZON_SLACK * max(2 * distance + time for distance, time in zip(to_depot, service)))
+    if capacity is None:
+        capacity = 4 * max(sum(cluster_demands) for cluster_demands in demands)
+
+    # Time windows of the clusters (arrival at the parking location), wide enough for a direct service from the depot
+    windows = []
+    for distance, time in zip(to_depot, service):
+        latest = horizon - distance - time
+        if window_width is None:
+            windows.append((0, latest))
+        else:
+            ready = rng.randint(distance, max(distance, latest - window_width))
+            windows.append((ready, min(latest, ready + window_width)))
+
+    lines = [name, f"{num_clusters}\t{num_clusters * customers_per_cluster}", "", "VEHICLE", "NUMBER     CAPACITY",
+             f"  {num_clusters}         {capacity}", "",
+             "CLU NO.   XCOORD.   YCOORD.   DEMAND    READY TIME   DUE DATE   SERVICE TIME",
+             f"{0:5d}{DEPOT[0]:8d}{DEPOT[1]:11d}{0:11d}{0:11d}{horizon:11d}{0:11d}"]
+    for i, (parking, cluster_demands, window) in enumerate(zip(parkings, demands, windows), start=1):
+        lines.append(f"{i:5d}{parking[0]:8d}{parking[1]:11d}{sum(cluster_demands):11d}{window[0]:11d}{window[1]:11d}{SERVICE_TIME:11d}")
+
+    # The customers share the ready time of their cluster and can be served until the cluster is done
+    lines += ["", "CUST NO.  XCOORD.   YCOORD.    DEMAND   READY TIME  DUE DATE   SERVICE TIME  CLUSTER"]
+    customer_id = 0
+    for i, (cluster_customers, cluster_demands, window, time) in enumerate(zip(customers, demands, windows, service), start=1):
+        for location, customer_demand in zip(cluster_customers, cluster_demands):
+            lines.append(f"{customer_id:5d}{location[0]:8d}{location[1]:11d}{customer_demand:11d}{window[0]:11d}{window[1] + time:11d}{SERVICE_TIME:11d}{i:11d}")
+            customer_id += 1
+
+    return name, lines
+
+def write_instance(name, lines, instances_dir=GENERATED_INSTANCES_DIR):
+    os.makedirs(instances_dir, exist_ok=True)
+    path = os.path.join(instances_dir, f"{name}.txt")
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+if __name__ == "__main__":
+    for seed in range(3):
+        name, lines = generate_instance(10, 4, "RC", seed=seed)
+        print(f"Instance {name} written to {write_instance(name, lines)}")
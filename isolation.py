@@ -0,0 +1,121 @@
+import multiprocessing as mp
+import os
+import signal
+import time
+import gurobipy as gp
+from gurobipy import GRB
+from memory_usage import rss_mb
+from logging_config import get_logger
+
+# =====================================================
+# Title: Isolated Worker Subprocesses for the VRPTWMD2R Runs
+# Description: This script runs a function (one algorithm on one instance)
+#              in a disposable worker subprocess under a hard wall-clock
+#              timeout and a hard RSS limit. The parent process polls the
+#              worker, kills it when it goes over one of the limits and
+#              reports the outcome of the run: OK, Timeout, OOM (RSS limit,
+#              out of memory in Python or Gurobi, or killed by the system)
+#              or Error. The limits apply to the worker and the processes it
+#              starts (e.g. the portfolio), which are killed with it. A
+#              crashed or stuck run therefore never stops or hangs the batch
+#              it belongs to.
+# =====================================================
+
+logger = get_logger(__name__)
+
+POLL_INTERVAL = 0.5   # Time between two checks of the worker (s)
+TIMEOUT_GRACE = 600   # Hard timeout of a run beyond the TimeLimit of its profile (s)
+EXIT_TIMEOUT = 10     # Time left to a worker to exit after sending its outcome (s)
+KILLED = -9           # Exit code of a worker killed with SIGKILL (e.g. by the OOM killer)
+
+# The process pid and all its descendants, found from the parent pids in /proc
+def process_tree(pid):
+    children = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else ():
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def tree_rss_mb(pids):
+    sizes = [rss_mb(pid=pid) for pid in pids]
+    sizes = [size for size in sizes if size is not None]
+    return sum(sizes) if sizes else None
+
+def kill_tree(pids):
+    for pid in reversed(pids):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+def worker(connection, function, args, kwargs):
+    try:
+        outcome = ("OK", function(*args, **kwargs))
+    except MemoryError as e:
+        outcome = ("OOM", repr(e))
+    except gp.GurobiError as e:
+        outcome = ("OOM" if e.errno == GRB.Error.OUT_OF_MEMORY else "Error", repr(e))
+    except Exception as e:
+        outcome = ("Error", repr(e))
+    connection.send(outcome)
+    connection.close()
+
+# Run function(*args, **kwargs) in a worker subprocess, killed after timeout seconds or when its
+# RSS exceeds rss_limit MB (None for no limit). Returns (status, value, elapsed time, peak RSS in MB),
+# where status is "OK" (value is the return value of the function), "Timeout", "OOM" or "Error"
+# (value is the error message).
+def run_isolated(function, args=(), kwargs=None, timeout=None, rss_limit=None):
+    # Gurobi environments cannot be shared with forked processes
+    context = mp.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=worker, args=(sender, function, args, kwargs or {}))
+    start_time = time.time()
+    process.start()
+    sender.close()
+
+    status, value, peak_rss = None, None, 0.0
+    while status is None:
+        if receiver.poll(POLL_INTERVAL):
+            try:
+                status, value = receiver.recv()
+            except EOFError:
+                # The worker died without sending its outcome
+                process.join()
+                status = "OOM" if process.exitcode == KILLED else "Error"
+                value = f"worker exited with code {process.exitcode}"
+            continue
+
+        pids = process_tree(process.pid)
+        rss = tree_rss_mb(pids)
+        if rss is not None:
+            peak_rss = max(peak_rss, rss)
+        elapsed = time.time() - start_time
+        if rss_limit and rss is not None and rss > rss_limit:
+            status, value = "OOM", f"RSS {round(rss, 1)} MB > {rss_limit} MB"
+        elif timeout and elapsed > timeout:
+            status, value = "Timeout", f"no result after {round(elapsed, 1)} s"
+
+    if status in ("Timeout", "OOM"):
+        kill_tree(process_tree(process.pid))
+    process.join(EXIT_TIMEOUT)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    receiver.close()
+
+    elapsed = round(time.time() - start_time, 2)
+    if status != "OK":
+        logger.warning(f"Isolated run of {getattr(function, '__name__', function)} stopped ({status}): {value}")
+    return status, value, elapsed, round(peak_rss, 1)
@@ -0,0 +1,48 @@
+import logging
+import sys
+
+# =====================================================
+# Title: Logging Configuration for the VRPTWMD2R Algorithms
+# Description: This script defines the levelled logging used by all the
+#              algorithms. The default is quiet: only warnings are shown and
+#              the Gurobi log is disabled. INFO shows one summary per run,
+#              DEBUG shows every callback, cut and route. The Threads of all
+#              the Gurobi models of a process can also be limited here.
+# =====================================================
+
+LOGGER_NAME = "vrptwmd2r"
+
+# Whether the Gurobi log of the models is shown (set by configure_logging)
+gurobi_output = False
+
+# Gurobi Threads of every model built by the process, None for the Gurobi default (all the cores)
+gurobi_threads = None
+
+def get_logger(name):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+def configure_logging(level=logging.WARNING, show_gurobi_output=False, log_file=None):
+    global gurobi_output
+    gurobi_output = show_gurobi_output
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+# Limit the Threads of every Gurobi model built by the process (SPs, preprocessing); the profile
+# of a main model overrides it
+def set_gurobi_threads(threads):
+    global gurobi_threads
+    gurobi_threads = threads
+
+# Enable or disable the Gurobi log of a model according to the logging configuration, and limit its Threads
+def apply_gurobi_output(model):
+    model.setParam('OutputFlag', 1 if gurobi_output else 0)
+    if gurobi_threads:
+        model.setParam('Threads', gurobi_threads)
@@ -0,0 +1,85 @@
+import resource
+import sys
+import time
+from gurobipy import GRB
+
+# =====================================================
+# Title: Memory Measurement of the VRPTWMD2R Algorithms
+# Description: This script measures the memory used by a run: the peak
+#              resident set size (RSS) of the Python process, which includes
+#              the Gurobi models, and the Python-object footprint of the
+#              preprocessed instance. It also provides a callback enforcing a
+#              soft memory ceiling, which terminates the optimization cleanly
+#              when the RSS of the process goes over the ceiling.
+# =====================================================
+
+MB = 1024 * 1024
+PROC_STATUS = "/proc/{}/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+MEMORY_CHECK_INTERVAL = 1.0  # Seconds between two readings of the RSS by the memory ceiling callback
+
+# Current and peak RSS of a process (by default this one) in MB, read from /proc on Linux. The peak
+# is the high-water mark since the last reset_peak_rss, or since the start of the process.
+def rss_mb(field="VmRSS", pid="self"):
+    try:
+        with open(PROC_STATUS.format(pid), 'r') as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        if pid != "self":
+            return None
+    # Without /proc, the peak RSS of the process (kB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+def peak_rss_mb():
+    return rss_mb("VmHWM")
+
+# Reset the peak RSS of the process, so that the peak of every run is measured on its own.
+# Returns False when the peak cannot be reset (not Linux), the peak then covers all the previous runs.
+def reset_peak_rss():
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+# Python-object footprint of an object and of everything it contains, in MB
+def deep_size_mb(obj):
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+    return size / MB
+
+# Callback terminating the optimization when the RSS of the process exceeds limit_mb, read at most every
+# MEMORY_CHECK_INTERVAL seconds. The state dictionary records whether the ceiling was hit ('exceeded')
+# and the RSS at that point ('rss').
+def memory_ceiling(limit_mb, state):
+    state['exceeded'] = False
+    last_check = [-MEMORY_CHECK_INTERVAL]
+    def memory_callback(model, where):
+        if where not in (GRB.Callback.MIP, GRB.Callback.MIPSOL, GRB.Callback.MIPNODE):
+            return
+        now = time.monotonic()
+        if now - last_check[0] < MEMORY_CHECK_INTERVAL:
+            return
+        last_check[0] = now
+        rss = rss_mb()
+        if rss > limit_mb and not state['exceeded']:
+            state['exceeded'] = True
+            state['rss'] = round(rss, 1)
+            model.terminate()
+    return memory_callback
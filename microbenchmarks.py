@@ -0,0 +1,122 @@
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+import gurobipy as gp
+from data_processing import read_instance, first_level_sets, first_level_distances, second_level_data, big_m_constants, lower_bounds, process_instance
+from instance_generator import generate_instance, write_instance, GENERATED_INSTANCES_DIR
+from CFoptimize import build_CF_model
+from CFVIsoptimize import build_CFVIs_model
+from MPoptimize import define_rmp
+from logging_config import configure_logging
+
+# =====================================================
+# Title: Microbenchmarks of the Preprocessing and the Model Builders
+# Description: This script times every stage of data_processing (reading
+#              the instance file, first- and second-level distances, the
+#              Mihk/Mij big-M loops and the mi/eil/eta_ lower bounds) and
+#              the construction of the CF and CF+VI's models and of the RMP
+#              of BBC, stopped before optimize, on generated instances of
+#              increasing size. Every stage is run a few times for warm-up
+#              and then timed over several repetitions. The statistics of
+#              each stage are appended as JSON lines to the results file, so
+#              that the preprocessing and build times can be tracked across
+#              versions.
+# =====================================================
+
+results_file = "microbenchmark_results.jsonl"
+WARMUP = 1
+REPETITIONS = 5
+
+# Generated instances (number of clusters, customers per cluster) of increasing size
+SIZES = [(5, 4), (10, 4), (20, 4), (40, 4)]
+
+# Time function() over the repetitions after the warm-up runs, with the garbage collector off as in timeit
+def benchmark(function, warmup=WARMUP, repetitions=REPETITIONS):
+    for _ in range(warmup):
+        function()
+
+    times = []
+    for _ in range(repetitions):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    return {
+        "repetitions": repetitions,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "max": max(times),
+    }
+
+# Build a Gurobi model and free it, so that the repetitions do not accumulate models in memory
+def build_and_dispose(build):
+    def run():
+        model = build()[0]
+        model.dispose()
+    return run
+
+# Stages of the preprocessing and of the model construction, each a function without arguments
+def instance_stages(file_path):
+    instance = read_instance(file_path)
+    instance_name, _, _, clusters, customers, _, _ = instance
+    N, _, A = first_level_sets(clusters)
+    _, tij = first_level_distances(clusters)
+    _, tihk, Ai, _, _, _, sh, ah, bh = second_level_data(clusters, customers)
+    data = process_instance(*instance)
+
+    return data, [
+        ("read_instance", lambda: read_instance(file_path)),
+        ("first_level_distances", lambda: first_level_distances(clusters)),
+        ("second_level_data", lambda: second_level_data(clusters, customers)),
+        ("big_m_constants", lambda: big_m_constants(instance_name, clusters, customers, N, A, Ai, tij, tihk, sh, ah, bh)),
+        ("lower_bounds", lambda: lower_bounds(data)),
+        ("define_rmp", build_and_dispose(lambda: define_rmp(data))),
+        ("build_CF_model", build_and_dispose(lambda: build_CF_model(instance_name, data))),
+        ("build_CFVIs_model", build_and_dispose(lambda: build_CFVIs_model(instance_name, data))),
+    ]
+
+def run_microbenchmarks(sizes=SIZES, warmup=WARMUP, repetitions=REPETITIONS, instances_dir=GENERATED_INSTANCES_DIR):
+    environment = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "gurobi": ".".join(str(part) for part in gp.gurobi.version()),
+        "machine": platform.node(),
+    }
+
+    records = []
+    for num_clusters, customers_per_cluster in sizes:
+        name, lines = generate_instance(num_clusters, customers_per_cluster)
+        file_path = os.path.join(instances_dir, f"{name}.txt")
+        if not os.path.isfile(file_path):
+            write_instance(name, lines, instances_dir)
+
+        data, stages = instance_stages(file_path)
+        for stage, function in stages:
+            timings = benchmark(function, warmup, repetitions)
+            records.append({**environment, "instance": name, "clusters": num_clusters, "customers": num_clusters * customers_per_cluster,
+                            "arcs": len(data['A (Set of arcs for first-level routes)']), "stage": stage, "warmup": warmup, **timings})
+            print(f"{name} {stage}: median {timings['median'] * 1000:.2f} ms (min {timings['min'] * 1000:.2f} ms, "
+                  f"stdev {timings['stdev'] * 1000:.2f} ms)")
+    return records
+
+def save_records(records, filename=results_file):
+    with open(filename, mode='a') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    configure_logging()
+    records = run_microbenchmarks()
+    save_records(records)
+    print(f"Microbenchmark results appended to {results_file}")
@@ -0,0 +1,53 @@
+import json
+import os
+
+# =====================================================
+# Title: Gurobi Parameter Profiles for the VRPTWMD2R Algorithms
+# Description: This script loads the named Gurobi parameter profiles of each
+#              algorithm (CF, CF+VI's, BBC) from gurobi_profiles.json and
+#              applies them to a model. The "default" profile only sets the
+#              time limit; the other profiles also change parameters such as
+#              MIPFocus, Cuts, Presolve or Threads. Tuned profiles are written
+#              back to the same file by tune_profiles.py.
+# =====================================================
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gurobi_profiles.json")
+DEFAULT_PROFILE = "default"
+
+# Parameters of the default profile when the profiles file is missing
+DEFAULT_PARAMETERS = {"TimeLimit": 7200}
+
+def load_profiles(path=PROFILES_FILE):
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def get_profile(algorithm, profile=DEFAULT_PROFILE, path=PROFILES_FILE):
+    profiles = load_profiles(path).get(algorithm, {})
+    if profile in profiles:
+        return dict(profiles[profile])
+    if profile == DEFAULT_PROFILE:
+        return dict(DEFAULT_PARAMETERS)
+    raise ValueError(f"Unknown parameter profile {profile} for algorithm {algorithm}")
+
+# Set the parameters of a profile on a model. The profile is either the name of a profile of the
+# algorithm or a dictionary of parameters (used by the tuning harness). Returns the name recorded in the results.
+def apply_profile(model, algorithm, profile=DEFAULT_PROFILE, path=PROFILES_FILE):
+    if isinstance(profile, dict):
+        parameters = profile
+        profile_name = "custom"
+    else:
+        parameters = get_profile(algorithm, profile, path)
+        profile_name = profile
+
+    for name, value in parameters.items():
+        model.setParam(name, value)
+    return profile_name
+
+def save_profile(algorithm, profile, parameters, path=PROFILES_FILE):
+    profiles = load_profiles(path)
+    profiles.setdefault(algorithm, {})[profile] = parameters
+    with open(path, 'w') as f:
+        json.dump(profiles, f, indent=2)
+        f.write("\n")
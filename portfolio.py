@@ -0,0 +1,160 @@
+import math
+import multiprocessing as mp
+import os
+import queue
+from gurobipy import GRB
+from CFoptimize import run_CFoptimize
+from CFVIsoptimize import run_CFVIsoptimize
+from BBCoptimize import run_BBCoptimize
+from parameter_profiles import get_profile, DEFAULT_PROFILE
+from logging_config import get_logger, set_gurobi_threads
+
+# =====================================================
+# Title: Concurrent Portfolio of the VRPTWMD2R Algorithms
+# Description: This script races CF, CF+VI's and BBC on one instance in
+#              parallel processes, each with a share of the thread budget.
+#              The processes share the best incumbent value and the best
+#              bound found so far: improving first-level solutions are sent
+#              to the other processes and injected as heuristic solutions
+#              (cbSetSolution), and the shared bound closes the portfolio gap.
+#              All the processes stop as soon as one of them proves
+#              optimality or the portfolio gap reaches the target gap.
+# =====================================================
+
+logger = get_logger(__name__)
+
+PORTFOLIO_ALGORITHMS = ("CF", "CF+VI's", "BBC")
+TARGET_GAP = 1e-4  # Relative gap between the shared incumbent and bound that stops the portfolio
+EPSILON = 1e-6
+
+ALGORITHMS = {
+    "CF": run_CFoptimize,
+    "CF+VI's": run_CFVIsoptimize,
+    "BBC": run_BBCoptimize,
+}
+
+# Shared state of the portfolio, set in each worker process:
+#   index, inboxes (one queue of incoming solutions per process), best_objective, best_bound, stop, target_gap
+channel = None
+
+# Callback given to every algorithm of the portfolio. The x variables (model._x) have the same
+# keys in CF, CF+VI's and the RMP of BBC, so a solution of one algorithm is a start for the others.
+def portfolio_callback(model, where):
+    # A candidate solution is only published if the algorithm did not add a lazy constraint at its MIPSOL
+    # (model._lazy_count, reset at every MIPSOL by BBC and CF+VI's; CF has no lazy constraints)
+    rejected = getattr(model, '_lazy_count', 0) > 0
+
+    best_objective = channel['best_objective']
+    best_bound = channel['best_bound']
+
+    if where == GRB.Callback.MIPSOL and not rejected:
+        objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+        with best_objective.get_lock():
+            improved = objective < best_objective.value - EPSILON
+            if improved:
+                best_objective.value = objective
+        if improved:
+            x_values = model.cbGetSolution(model._x)
+            arcs = [key for key, value in x_values.items() if value > 0.5]
+            for index, inbox in enumerate(channel['inboxes']):
+                if index != channel['index']:
+                    inbox.put((objective, arcs))
+
+    elif where == GRB.Callback.MIP:
+        bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+        with best_bound.get_lock():
+            if bound > best_bound.value:
+                best_bound.value = bound
+
+        objective = best_objective.value
+        if objective < math.inf and objective - best_bound.value <= channel['target_gap'] * abs(objective):
+            channel['stop'].set()
+        if channel['stop'].is_set():
+            model.terminate()
+
+    elif where == GRB.Callback.MIPNODE:
+        # Inject the best solution received from the other processes if it improves the incumbent
+        received = None
+        try:
+            while True:
+                solution = channel['inboxes'][channel['index']].get_nowait()
+                if received is None or solution[0] < received[0]:
+                    received = solution
+        except queue.Empty:
+            pass
+
+        if received is not None and received[0] < model.cbGet(GRB.Callback.MIPNODE_OBJBST) - EPSILON:
+            arcs = set(received[1])
+            keys = list(model._x.keys())
+            model.cbSetSolution([model._x[key] for key in keys], [1.0 if key in arcs else 0.0 for key in keys])
+            model.cbUseSolution()
+
+def portfolio_worker(algorithm, instance_name, data, options, shared, results):
+    global channel
+    channel = shared
+    for inbox in channel['inboxes']:
+        inbox.cancel_join_thread()
+    set_gurobi_threads(options['profile']['Threads'])
+
+    result = ALGORITHMS[algorithm](instance_name, data, callbacks=(portfolio_callback,), **options)
+    if result['objective_value'] is None:
+        # Stopped by the portfolio before finding any solution
+        logger.warning(f"{algorithm} stopped without a solution on {instance_name}: status {result['status']}")
+
+    if result['status'] == "Optimal":
+        channel['stop'].set()
+    results.put((algorithm, result))
+
+# Run the algorithms of the portfolio in parallel on one instance and return the best result.
+# algorithm_options gives extra keyword arguments per algorithm, e.g. {"BBC": {"lazy_subtours": True}}.
+def run_portfolio(instance_name, data, algorithms=PORTFOLIO_ALGORITHMS, total_threads=None, target_gap=TARGET_GAP, profile=DEFAULT_PROFILE, algorithm_options=None):
+    algorithm_options = algorithm_options or {}
+    threads = max(1, (total_threads or os.cpu_count()) // len(algorithms))
+
+    # Gurobi environments cannot be shared with forked processes
+    context = mp.get_context("spawn")
+    inboxes = [context.Queue() for _ in algorithms]
+    best_objective = context.Value('d', math.inf)
+    best_bound = context.Value('d', -math.inf)
+    stop = context.Event()
+    results = context.Queue()
+
+    processes = []
+    for index, algorithm in enumerate(algorithms):
+        shared = {
+            'index': index,
+            'inboxes': inboxes,
+            'best_objective': best_objective,
+            'best_bound': best_bound,
+            'stop': stop,
+            'target_gap': target_gap,
+        }
+        options = {**algorithm_options.get(algorithm, {}), "profile": {**get_profile(algorithm, profile), "Threads": threads}}
+        process = context.Process(target=portfolio_worker, args=(algorithm, instance_name, data, options, shared, results))
+        process.start()
+        processes.append(process)
+
+    portfolio_results = {}
+    for _ in processes:
+        algorithm, result = results.get()
+        portfolio_results[algorithm] = result
+    for process in processes:
+        process.join()
+
+    solved = [result for result in portfolio_results.values() if result['objective_value'] is not None]
+    if not solved:
+        raise RuntimeError(f"No algorithm of the portfolio found a solution for {instance_name}")
+    winner = min(solved, key=lambda result: (result['status'] != "Optimal", result['objective_value']))
+    bound = max(winner['best_bound'], best_bound.value)
+
+    logger.info(f"Portfolio on {instance_name}: {winner['algorithm']} wins with objective {winner['objective_value']}, "
+                f"shared bound {bound}")
+
+    return {
+        **winner,
+        "algorithm": f"Portfolio[{winner['algorithm']}]",
+        "profile": profile,
+        "best_bound": bound,
+        "gap": 100 * max(winner['objective_value'] - bound, 0) / abs(winner['objective_value']) if winner['objective_value'] else winner['gap'],
+        "portfolio_results": {algorithm: {key: value for key, value in result.items() if key != 'routes'} for algorithm, result in portfolio_results.items()},
+    }
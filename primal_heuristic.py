@@ -0,0 +1,158 @@
+import random
+import time
+from gurobipy import GRB
+from formulation import cd
+from route_oracle import relaxed_route_feasible
+from ALNSoptimize import exact_cost, greedy_insertion, reduce_deliverymen, exact_second_level
+from logging_config import get_logger
+
+# =====================================================
+# Title: Primal Heuristic Callback for CF, CF+VI's and BBC
+# Description: This script provides a MIPNODE callback that turns the LP
+#              solution of a node into an incumbent. The first-level flows
+#              x_ijl are rounded into vehicle routes by following the arcs
+#              with the largest flow from the depot; the routes are cut where
+#              they violate the capacity or the time windows (route_oracle),
+#              the clusters left out are reinserted greedily, and the number
+#              of deliverymen of each route is raised until its SP is
+#              feasible. The second-level routes come from the SPs, cached
+#              over the whole run. The solution is given to Gurobi with
+#              cbSetSolution on the x variables and on the y variables (CF,
+#              CF+VI's) or the eta variables (BBC, the SP cost of each route
+#              split over its clusters); Gurobi completes the continuous
+#              variables.
+# =====================================================
+
+logger = get_logger(__name__)
+
+ROUNDING_THRESHOLD = 0.3   # Smallest flow of an arc followed when rounding the LP solution into routes
+HEURISTIC_FREQUENCY = 50   # Nodes between two runs of the heuristic after the root
+HEURISTIC_TIME_SHARE = 0.1  # Largest share of the run time spent in the heuristic (SPs of the repairs)
+EPSILON = 1e-6
+
+# Round the first-level flows of an LP solution into routes [l, [clusters]]: from the depot arcs by
+# decreasing flow, follow the successor with the largest flow and cut the route where it becomes infeasible
+def round_routes(x_values, data):
+    N = data['N (set of cluster indices)']
+    end = len(N) + 1
+
+    successors = {}
+    for ((i, j), l), value in x_values.items():
+        if value > ROUNDING_THRESHOLD:
+            successors.setdefault((i, l), []).append((value, j))
+
+    routes, routed = [], set()
+    for value, j, l in sorted(((value, j, l) for (i, l), arcs in successors.items() if i == 0 for value, j in arcs), reverse=True):
+        if j == end or j in routed:
+            continue
+        clusters = [j]
+        while True:
+            options = [(value_, k) for value_, k in successors.get((clusters[-1], l), []) if k == end or (k not in routed and k not in clusters)]
+            if not options:
+                break
+            _, k = max(options)
+            if k == end or not relaxed_route_feasible(clusters + [k], l, data):
+                break
+            clusters.append(k)
+        if relaxed_route_feasible(clusters, l, data):
+            routes.append([l, clusters])
+            routed.update(clusters)
+    return routes, [i for i in N if i not in routed]
+
+# Routes of a solution built from the LP flows, with their exact cost, None when the repair fails
+def repair_solution(x_values, data, cache, rng):
+    solution, unrouted = round_routes(x_values, data)
+    solution = greedy_insertion(solution, unrouted, data, rng)
+    if solution is None or exact_cost(solution, data, cache) is None:
+        return None, None
+    solution = reduce_deliverymen(solution, data, cache)
+    return solution, exact_cost(solution, data, cache)
+
+# Values of the variables of the model (x, y or eta, and xa, z with the aggregated first level) for the routes,
+# None when a route uses an arc that is not in the model
+def solution_values(solution, data, variables, cache):
+    N = data['N (set of cluster indices)']
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    dihk = data['dihk (Distance between second-level nodes h and k of cluster i)']
+    end = len(N) + 1
+
+    values = {var: 0.0 for var in variables['x'].values()}
+    for name in ('y', 'xa', 'z'):
+        if name in variables:
+            values.update({var: 0.0 for var in variables[name].values()})
+
+    for l, clusters in solution:
+        nodes = [0] + clusters + [end]
+        for arc in zip(nodes, nodes[1:]):
+            if (arc, l) not in variables['x']:
+                return None  # An arc left out of a granular instance (granular.py)
+            values[variables['x'][arc, l]] = 1.0
+            if 'xa' in variables:
+                values[variables['xa'][arc]] = 1.0
+        exact_second_level(clusters, l, data, cache)
+        sp_routes = cache[(tuple(clusters), l)][1]
+        for i in clusters:
+            if 'z' in variables:
+                values[variables['z'][i, l]] = 1.0
+            cluster_cost = 0
+            for customers in sp_routes.get(i, []):
+                path = [0] + customers + [len(Ni[i]) + 1]
+                for arc in zip(path, path[1:]):
+                    cluster_cost += cd * dihk[i][arc]
+                    if 'y' in variables:
+                        values[variables['y'][i, arc]] = 1.0
+            if 'eta' in variables:
+                # The cost of a cluster within a route is at least its cost on a shorter route with the same
+                # arcs, so that the split satisfies the optimality cuts of the subpaths of the route
+                values[variables['eta'][i]] = cluster_cost
+    return values
+
+# MIPNODE callback running the heuristic at the root and every HEURISTIC_FREQUENCY nodes, within
+# HEURISTIC_TIME_SHARE of the run time. variables are the variables of the model by name ('x' and 'y',
+# 'eta', 'xa', 'z' when the model has them). The state dictionary records the number of runs ('runs'),
+# of incumbents submitted ('submitted') and the time spent ('time').
+def primal_heuristic(data, variables, state=None, seed=0):
+    state = state if state is not None else {}
+    state.update(runs=0, submitted=0, time=0.0)
+    cache = {}
+    tried = set()
+    rng = random.Random(seed)
+    next_node = [0]
+    x = variables['x']
+
+    def heuristic_callback(model, where):
+        if where != GRB.Callback.MIPNODE or model.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL:
+            return
+        # At the root after every cut round, then every HEURISTIC_FREQUENCY nodes
+        node = model.cbGet(GRB.Callback.MIPNODE_NODCNT)
+        if node > 0:
+            if node < next_node[0]:
+                return
+            next_node[0] = node + HEURISTIC_FREQUENCY
+
+        if state['runs'] > 0 and state['time'] > HEURISTIC_TIME_SHARE * model.cbGet(GRB.Callback.RUNTIME):
+            return
+
+        relaxation = model.cbGetNodeRel(list(x.values()))
+        x_values = dict(zip(x.keys(), relaxation))
+        signature = frozenset(key for key, value in x_values.items() if value > ROUNDING_THRESHOLD)
+        if signature in tried:
+            return
+        tried.add(signature)
+
+        state['runs'] += 1
+        start = time.time()
+        solution, cost = repair_solution(x_values, data, cache, rng)
+        state['time'] += time.time() - start
+        if solution is None or cost >= model.cbGet(GRB.Callback.MIPNODE_OBJBST) - EPSILON:
+            return
+        values = solution_values(solution, data, variables, cache)
+        if values is None:
+            return
+        model.cbSetSolution(list(values.keys()), list(values.values()))
+        objective = model.cbUseSolution()
+        if objective < GRB.INFINITY:
+            state['submitted'] += 1
+            logger.debug(f"Primal heuristic at node {node}: incumbent {objective} (routes {solution})")
+
+    return heuristic_callback
@@ -0,0 +1,132 @@
+from formulation import cd
+
+# =====================================================
+# Title: Route Feasibility Oracle for the VRPTWMD2R Subproblems
+# Description: This script screens a first-level route (a sequence of
+#              clusters with l deliverymen) before its subproblem (SP) is
+#              built and solved with Gurobi. A route is surely infeasible
+#              when it overflows the vehicle capacity Q, when a cluster
+#              needs more than l deliverymen (mi) or when the chain of the
+#              parking-location time windows, with the eil bounds on the
+#              time spent in each cluster and the travel times tij, cannot
+#              be met: all of these are implied by the constraints of the
+#              SP and of the master. A route is surely feasible when a greedy
+#              construction of the deliveryman routes of every cluster meets
+#              all the constraints of the SP; its second-level distance is
+#              then an upper bound on the cost of the route, and its arcs a
+#              MIP start for the SP. Otherwise the route is unknown.
+# =====================================================
+
+INFEASIBLE = "infeasible"
+FEASIBLE = "feasible"
+UNKNOWN = "unknown"
+
+EPSILON = 1e-6
+
+# Clusters of a first-level route given by its arcs, in visiting order
+def route_clusters(Ar, data):
+    end = len(data['N (set of cluster indices)']) + 1
+    successors = dict(Ar)
+    clusters = []
+    node = successors.get(0)
+    while node is not None and node != end and node not in clusters:
+        clusters.append(node)
+        node = successors.get(node)
+    return clusters
+
+# Relaxed feasibility of a route with l deliverymen: capacity, minimum number of deliverymen mi and
+# time windows of the parking locations with the lower bound eil on the time spent in each cluster
+def relaxed_route_feasible(clusters, l, data):
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    qi = data['qi (Demand of cluster i)']
+    tij = data['tij (Travel time between first-level nodes i and j)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+
+    if sum(qi[i] for i in clusters) > data['vehicle_capacity']:
+        return False
+
+    finish, previous = None, None
+    for i in clusters:
+        if l < data['mi'][i]:
+            return False
+        end = len(Ni[i]) + 1
+        start = ah[i][0] if previous is None else max(ah[i][0], finish + tij[(previous, i)])
+        finish = max(start + data['eil'][i][l], ah[i][end])
+        if start > bh[i][0] + EPSILON or finish > bh[i][end] + EPSILON:
+            return False
+        previous = i
+    return True
+
+# Greedy deliveryman routes of cluster i with at most l deliverymen leaving the parking location at start:
+# the customers, by increasing end of time window, are appended to the route where they add the least
+# distance. Returns (time of return to the parking location, second-level cost, arcs), None when it fails.
+def construct_second_level(i, l, start, data):
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    Ai = data['Ai (set of arcs related to the second-level routes inside cluster i)']
+    dihk = data['dihk (Distance between second-level nodes h and k of cluster i)']
+    tihk = data['tihk (Travel time between second-level nodes h and k of cluster i)']
+    sh = data['sh (Service time of customer h in cluster i)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+    end = len(Ni[i]) + 1
+    arcs = set(Ai[i])
+
+    # A route is [last node, start of service at the last node, distance, arcs]
+    routes = []
+    for k in sorted(Ni[i], key=lambda k: (bh[i][k], ah[i][k])):
+        best = None
+        for route in routes + ([[0, start, 0, []]] if len(routes) < l else []):
+            h, time = route[0], route[1]
+            if (h, k) not in arcs:
+                continue
+            arrival = max(ah[i][k], time + sh[i][h] + tihk[i][(h, k)])
+            if arrival > bh[i][k] + EPSILON:
+                continue
+            if best is None or dihk[i][(h, k)] < best[0]:
+                best = (dihk[i][(h, k)], route, arrival)
+        if best is None:
+            return None
+        distance, route, arrival = best
+        if not route[3]:
+            routes.append(route)  # A new deliveryman
+        route[3].append((route[0], k))
+        route[0], route[1], route[2] = k, arrival, route[2] + distance
+
+    finish = max(start + data['eil'][i][l], ah[i][end])
+    distance = 0
+    cluster_arcs = []
+    for h, time, route_distance, route_arcs in routes:
+        if (h, end) not in arcs:
+            return None
+        finish = max(finish, time + sh[i][h] + tihk[i][(h, end)])
+        distance += route_distance + dihk[i][(h, end)]
+        cluster_arcs += [(i, arc) for arc in route_arcs + [(h, end)]]
+    if not routes or finish > bh[i][end] + EPSILON:
+        return None
+    return finish, cd * distance, cluster_arcs
+
+# Classify the route with l deliverymen as INFEASIBLE, FEASIBLE or UNKNOWN. Returns (verdict, upper bound
+# on the second-level cost, arcs (i, (h, k)) of a feasible SP solution); the last two only when FEASIBLE.
+def screen_route(clusters, l, data):
+    if not relaxed_route_feasible(clusters, l, data):
+        return INFEASIBLE, None, None
+
+    tij = data['tij (Travel time between first-level nodes i and j)']
+    ah = data['ah (Start of time window of customer h in cluster i)']
+    bh = data['bh (End of time window of customer h in cluster i)']
+
+    cost, arcs = 0, []
+    finish, previous = None, None
+    for i in clusters:
+        start = ah[i][0] if previous is None else max(ah[i][0], finish + tij[(previous, i)])
+        if start > bh[i][0] + EPSILON:
+            return UNKNOWN, None, None
+        construction = construct_second_level(i, l, start, data)
+        if construction is None:
+            return UNKNOWN, None, None
+        finish, cluster_cost, cluster_arcs = construction
+        cost += cluster_cost
+        arcs += cluster_arcs
+        previous = i
+    return FEASIBLE, cost, arcs
@@ -4,21 +4,143 @@ import os
 from BBCoptimize import run_BBCoptimize
 from CFoptimize import run_CFoptimize
 from CFVIsoptimize import run_CFVIsoptimize
-from data_processing import read_and_process_instances
+from ALNSoptimize import run_ALNSoptimize
+from CGoptimize import run_CGoptimize
+from decomposition import run_decomposition
+from cut_pool import CUT_POOL_DIR
+from data_processing import read_instance, read_and_process_instances
+from formulation import formulation_name
+from granular import granular_instance, readmit_arcs
+from parameter_profiles import DEFAULT_PROFILE, get_profile
+from portfolio import run_portfolio, ALGORITHMS, PORTFOLIO_ALGORITHMS
+from memory_usage import memory_ceiling, reset_peak_rss, peak_rss_mb, deep_size_mb
+from isolation import run_isolated, TIMEOUT_GRACE
+from logging_config import configure_logging, get_logger, set_gurobi_threads
+from solution import SOLUTIONS_DIR, export_solution_json
+from trajectory import TRAJECTORY_DIR, trajectory_recorder, trajectory_metrics, write_trajectory
+
+logger = get_logger(__name__)
 
 instances_dir = "./scalability_istances"
 
+# Reuse the BBC cuts generated by previous runs on the same instance (cut_pools directory)
+use_cut_pool = False
+
+# Export the routes of every run to JSON files (solutions directory)
+export_solutions = False
+
+# Run every algorithm with both the disaggregated (x_ijl) and the aggregated (x_ij, z_il) first level
+compare_formulations = False
+
+# Gurobi parameter profile of every algorithm (gurobi_profiles.json)
+profile = DEFAULT_PROFILE
+
+# Race CF, CF+VIs and BBC in parallel on each instance and keep only the best answer (portfolio.py)
+use_portfolio = False
+
+# Repair the LP solutions of the nodes into incumbents in CF, CF+VI's and BBC (primal_heuristic.py)
+use_primal_heuristic = False
+
+# Solve the granular instances (granular.py) keeping the arcs to the granular_neighbours nearest compatible
+# neighbours of every node (None for the complete graphs). With granular_verification, the pruned arcs of
+# small reduced cost are re-admitted, from an LP on the complete graphs (costly on large instances).
+granular_neighbours = None
+granular_verification = False
+
+# Also run the ALNS heuristic (ALNSoptimize.py) on each instance, for the instances beyond the reach of the exact algorithms
+use_alns = False
+
+# Also run the route-based column generation (CGoptimize.py, price-and-branch) on each instance
+use_cg = False
+
+# Also run the geographic decomposition (decomposition.py) on each instance: regions solved in parallel
+# with decomposition_algorithm, merged and repaired with the ALNS
+use_decomposition = False
+decomposition_algorithm = "BBC"
+
+# Record the incumbent and bound trajectory of every run (trajectories directory) and its anytime metrics
+record_trajectories = False
+
+# Soft memory ceiling of every run in MB (None for no ceiling): a run is terminated cleanly when the
+# RSS of the process goes over the ceiling, and recorded with status MemoryLimit
+memory_limit = None
+
+# Run every algorithm in a disposable worker subprocess (isolation.py), killed after run_timeout seconds
+# (None for the TimeLimit of the profile plus a grace period) or when its RSS exceeds hard_memory_limit MB
+# (None for no limit). Such runs are recorded with status Timeout or OOM and the sweep continues.
+isolate_runs = True
+run_timeout = None
+hard_memory_limit = None
+
 def split_instance_name(instance_name):
     parts = instance_name.split('_', 1) 
     instance = parts[0]
     size = parts[1] if len(parts) > 1 else ''
     return instance, size
 
-def run_algorithm(algorithm, instance_name, instance_data):
+# Name of each algorithm function in the results
+ALGORITHM_NAMES = {**{function: name for name, function in ALGORITHMS.items()}, run_portfolio: "Portfolio", run_ALNSoptimize: "ALNS", run_CGoptimize: "CG", run_decomposition: "Decomposition"}
+
+# Result of a run stopped before it found a solution
+def aborted_result(algorithm, instance_name, status, options):
+    return {
+        "instance_name": instance_name,
+        "algorithm": ALGORITHM_NAMES.get(algorithm, algorithm.__name__),
+        "formulation": formulation_name(options.get('aggregated', False)),
+        "profile": options.get('profile', DEFAULT_PROFILE) if not isinstance(options.get('profile'), dict) else "custom",
+        "status": status,
+        "vehicles_used": None,
+        "delivery_men_used": None,
+        "first_level_distance": None,
+        "second_level_distance": None,
+        "objective_value": None,
+        "best_bound": None,
+        "gap": None,
+    }
+
+# Hard timeout of a run: the TimeLimit of its profile plus TIMEOUT_GRACE, for the callbacks running past the time limit
+def hard_timeout(algorithm, profile):
+    if run_timeout:
+        return run_timeout
+    algorithms = PORTFOLIO_ALGORITHMS if algorithm == "Portfolio" else (algorithm,)
+    time_limits = [(profile if isinstance(profile, dict) else get_profile(name, profile)).get('TimeLimit') for name in algorithms]
+    return max(time_limits) + TIMEOUT_GRACE if None not in time_limits else None
+
+# With trajectory_dir, the incumbent and bound of the run are recorded over time, written to a
+# trajectory file and summarized by the anytime metrics of trajectory.py. profile_name replaces
+# the profile recorded in the result when the profile is given as a dictionary of parameters.
+# With memory_limit (MB), the run is terminated when the RSS of the process exceeds the limit.
+# With threads, every Gurobi model of the run (SPs of BBC, ALNS and CG included) uses at most threads threads.
+def run_algorithm(algorithm, instance_name, instance_data, trajectory_dir=None, profile_name=None, memory_limit=None, threads=None, **options):
+    if threads:
+        set_gurobi_threads(threads)
+    samples = []
+    if trajectory_dir:
+        options['callbacks'] = tuple(options.get('callbacks', ())) + (trajectory_recorder(samples),)
+    memory_state = {'exceeded': False}
+    if memory_limit:
+        options['callbacks'] = tuple(options.get('callbacks', ())) + (memory_ceiling(memory_limit, memory_state),)
+
+    instance_memory = deep_size_mb(instance_data)
+    reset_peak_rss()
     start_time = time.time()
-    result = algorithm(instance_name, instance_data)
+    result = algorithm(instance_name, instance_data, **options)
     end_time = time.time()
     result['computation_time'] = round(end_time - start_time, 2)
+    result['peak_rss'] = round(peak_rss_mb(), 1)
+    result['instance_memory'] = round(instance_memory, 1)
+    if memory_state['exceeded']:
+        logger.warning(f"{result['algorithm']} on {instance_name} stopped at the memory ceiling: RSS {memory_state['rss']} MB > {memory_limit} MB")
+        result['status'] = "MemoryLimit"
+    if profile_name:
+        result['profile'] = profile_name
+
+    # The ALNS has no Gurobi callbacks: its trajectory is the history of its best solution, with the iterations as nodes
+    if trajectory_dir and result.get('best_history'):
+        samples[:] = [(elapsed, cost, result['best_bound'], iteration) for elapsed, iteration, cost in result['best_history']]
+    if trajectory_dir and result['objective_value'] is not None:
+        result.update(trajectory_metrics(samples, result))
+        write_trajectory(samples, result, trajectory_dir)
 
     instance, size = split_instance_name(result['instance_name'])
     result['instance'] = instance
@@ -26,26 +148,68 @@ def run_algorithm(algorithm, instance_name, instance_data):
     
     return result
 
+# run_algorithm in a worker subprocess with a hard timeout (s) and RSS limit (MB). A run killed at
+# one of the limits, or failing with an error, gives a result with status Timeout, OOM or Error.
+def run_isolated_algorithm(algorithm, instance_name, instance_data, timeout=None, rss_limit=None, **options):
+    status, value, elapsed, peak_rss = run_isolated(run_algorithm, (algorithm, instance_name, instance_data), options, timeout, rss_limit)
+    if status == "OK":
+        return value
+
+    result = aborted_result(algorithm, instance_name, status, options)
+    if options.get('profile_name'):
+        result['profile'] = options['profile_name']
+    result['computation_time'] = elapsed
+    result['peak_rss'] = peak_rss
+    result['instance'], result['size'] = split_instance_name(instance_name)
+    return result
+
+CSV_HEADER = ["Instance", "Size", "Algorithm", "Status", "Objective Value", "UB",
+              "Gap (%)", "Vehicles used", "Delivery men used",
+              "First level distance", "Second level distance", "Time(s)",
+              "Build time(s)", "Runtime(s)", "Work", "Nodes", "Iterations",
+              "Root bound", "First incumbent(s)", "Callback time(s)", "Formulation", "Profile",
+              "Primal integral", "Primal-dual integral", "Time to 1% gap(s)",
+              "Peak RSS (MB)", "Gurobi memory (MB)", "Instance memory (MB)"]
+
+# Rewrite a results file written with an older header, leaving the new columns empty in the old rows
+def upgrade_csv_header(filename):
+    with open(filename, mode='r', newline='') as file:
+        rows = list(csv.reader(file, delimiter=';'))
+
+    if not rows or rows[0] == CSV_HEADER:
+        return
+
+    with open(filename, mode='w', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(CSV_HEADER)
+        for row in rows[1:]:
+            writer.writerow(row + [''] * (len(CSV_HEADER) - len(row)))
+
 def save_results_to_csv(results_list, filename):
     file_exists = os.path.isfile(filename)
+    if file_exists:
+        upgrade_csv_header(filename)
     
     with open(filename, mode='a', newline='') as file:
         writer = csv.writer(file, delimiter=';')
         
         if not file_exists:
-            writer.writerow(["Instance", "Size", "Algorithm", "Status", "Objective Value", "UB",
-                             "Gap (%)", "Vehicles used", "Delivery men used",
-                             "First level distance", "Second level distance", "Time(s)",])
+            writer.writerow(CSV_HEADER)
                    
         for result in results_list:
             writer.writerow([result['instance'],result['size'], result['algorithm'],result['status'], result['objective_value'], 
                              result['best_bound'], result['gap'], result['vehicles_used'], result['delivery_men_used'], 
-                             result['first_level_distance'], result['second_level_distance'], result['computation_time'],])
+                             result['first_level_distance'], result['second_level_distance'], result['computation_time'],
+                             result.get('build_time'), result.get('runtime'), result.get('work'), result.get('node_count'),
+                             result.get('iter_count'), result.get('root_bound'), result.get('first_incumbent_time'),
+                             result.get('callback_time'), result.get('formulation'), result.get('profile'),
+                             result.get('primal_integral'), result.get('primal_dual_integral'), result.get('time_to_1pct_gap'),
+                             result.get('peak_rss'), result.get('gurobi_memory'), result.get('instance_memory')])
 
 def print_results(results_list):
     for result in results_list:
         print(f"Instance: {result['instance_name']}")
-        print(f"Algorithm: {result['algorithm']}")
+        print(f"Algorithm: {result['algorithm']} ({result.get('formulation')} first level, profile {result.get('profile')})")
         
         print(f"Objective Value: {result['objective_value']}")
         print(f"Status: {result['status']}")
@@ -56,43 +220,115 @@ def print_results(results_list):
         print(f"First level distance: {result['first_level_distance']}")
         print(f"Second level distance: {result['second_level_distance']}")
         print(f"Computation time: {result['computation_time']} seconds")
+        print(f"Build time: {result.get('build_time')} seconds, Gurobi runtime: {result.get('runtime')} seconds, Work: {result.get('work')}")
+        print(f"Nodes: {result.get('node_count')}, Iterations: {result.get('iter_count')}, Root bound: {result.get('root_bound')}")
+        print(f"First incumbent: {result.get('first_incumbent_time')} seconds, Callback time: {result.get('callback_time')} seconds")
+        if result.get('primal_dual_integral') is not None:
+            print(f"Primal integral: {result.get('primal_integral')}, Primal-dual integral: {result.get('primal_dual_integral')}, "
+                  f"Time to 1% gap: {result.get('time_to_1pct_gap')} seconds")
+        print(f"Peak RSS: {result.get('peak_rss')} MB, Gurobi memory: {result.get('gurobi_memory')} MB, Instance memory: {result.get('instance_memory')} MB")
         print("-" * 50)
 
-def run_all_algorithms_on_instances(instances):
+# Algorithms run on every instance: (algorithm name in the results, function, options, formulation)
+def planned_runs():
+    if use_portfolio:
+        return [("Portfolio", run_portfolio, {"profile": profile}, formulation_name(False))]
+
+    formulations = (False, True) if compare_formulations else (False,)
+    trajectory_dir = TRAJECTORY_DIR if record_trajectories else None
+    runs = []
+    for aggregated in formulations:
+        options = {"aggregated": aggregated, "profile": profile, "trajectory_dir": trajectory_dir, "memory_limit": memory_limit, "heuristic": use_primal_heuristic}
+        runs.append(("CF", run_CFoptimize, options, formulation_name(aggregated)))
+        runs.append(("CF+VI's", run_CFVIsoptimize, options, formulation_name(aggregated)))
+        runs.append(("BBC", run_BBCoptimize, {**options, "cut_pool_dir": CUT_POOL_DIR if use_cut_pool else None}, formulation_name(aggregated)))
+    if use_alns:
+        runs.append(("ALNS", run_ALNSoptimize, {"profile": profile, "trajectory_dir": trajectory_dir, "memory_limit": memory_limit}, formulation_name(False)))
+    if use_cg:
+        runs.append(("CG", run_CGoptimize, {"profile": profile, "trajectory_dir": trajectory_dir, "memory_limit": memory_limit}, formulation_name(False)))
+    if use_decomposition:
+        runs.append(("Decomposition", run_decomposition, {"algorithm": decomposition_algorithm, "profile": profile, "trajectory_dir": trajectory_dir, "memory_limit": memory_limit}, formulation_name(False)))
+    return runs
+
+# Key identifying a run in the results file. The portfolio is recorded as Portfolio[<winning algorithm>]
+# and the decomposition as Decomposition[<algorithm of the regions>].
+def run_key(instance, size, algorithm, formulation, profile):
+    for prefix in ("Portfolio", "Decomposition"):
+        if algorithm.startswith(f"{prefix}["):
+            algorithm = prefix
+    return (instance, size, algorithm, formulation, profile)
+
+# Runs already recorded in a results file. Rows written before the Formulation and Profile
+# columns existed used the disaggregated formulation and the default profile. Runs that failed with
+# an error are not completed: they are run again on resume (Timeout and OOM runs hit a limit and are kept).
+def completed_runs(filename):
+    if not os.path.isfile(filename):
+        return set()
+    upgrade_csv_header(filename)
+
+    with open(filename, mode='r', newline='') as file:
+        rows = list(csv.DictReader(file, delimiter=';'))
+    return {run_key(row['Instance'], row['Size'], row['Algorithm'], row['Formulation'] or formulation_name(False), row['Profile'] or DEFAULT_PROFILE)
+            for row in rows if row['Status'] != "Error"}
+
+# Whether all the planned runs of an instance are already recorded
+def instance_completed(instance_name, completed):
+    instance, size = split_instance_name(instance_name)
+    return all(run_key(instance, size, algorithm, formulation, profile) in completed for algorithm, _, _, formulation in planned_runs())
+
+# Run the planned algorithms on every instance. With results_file, each result is appended to the file
+# as soon as it is available and the runs already recorded in the file are skipped.
+def run_all_algorithms_on_instances(instances, results_file=None):
     all_results = []
+    completed = completed_runs(results_file) if results_file else set()
     
     for instance_name, instance_data in instances:
         print(f"\nRunning all algorithms on instance: {instance_name}\n")
-        
-        # CF Algorithm
-        print(f"Running CF Algorithm on {instance_name}...")
-        cf_results = run_algorithm(run_CFoptimize, instance_name, instance_data)
-        all_results.append(cf_results)
-
-        # CF + VIs Algorithm
-        print(f"Running CF+VIs Algorithm on {instance_name}...")
-        cf_vis_results = run_algorithm(run_CFVIsoptimize, instance_name, instance_data) 
-        all_results.append(cf_vis_results)
-
-        # BBC Algorithm
-        print(f"Running BBC Algorithm on {instance_name}...")
-        bbc_results = run_algorithm(run_BBCoptimize, instance_name, instance_data)
-        all_results.append(bbc_results)
+        instance, size = split_instance_name(instance_name)
+
+        for algorithm, function, options, formulation in planned_runs():
+            if run_key(instance, size, algorithm, formulation, profile) in completed:
+                print(f"Skipping {algorithm} on {instance_name} ({formulation}): already in {results_file}")
+                continue
+
+            print(f"Running {algorithm} on {instance_name} ({formulation})...")
+            if isolate_runs:
+                timeout = hard_timeout(algorithm, profile)
+                result = run_isolated_algorithm(function, instance_name, instance_data, timeout, hard_memory_limit, **options)
+            else:
+                result = run_algorithm(function, instance_name, instance_data, **options)
+            all_results.append(result)
+            if results_file:
+                save_results_to_csv([result], results_file)
     
     return all_results
 
-# Load and preprocess instances
-instances = read_and_process_instances(instances_dir)
+if __name__ == "__main__":
+    results_file = "scalability_results.csv"
+
+    # Load and preprocess the instances that still have runs to do
+    configure_logging()
+    completed = completed_runs(results_file)
+    instance_files = [f for f in os.listdir(instances_dir) if f.endswith('.txt')
+                      if not instance_completed(read_instance(os.path.join(instances_dir, f))[0], completed)]
+    instances = read_and_process_instances(instances_dir, instance_files)
+    if granular_neighbours is not None:
+        instances = [(instance_name, granular_instance(instance_data, granular_neighbours)) for instance_name, instance_data in instances]
+        if granular_verification:
+            instances = [(instance_name, readmit_arcs(instance_data)) for instance_name, instance_data in instances]
 
-# Execute all 3 models on each instance
-all_results = run_all_algorithms_on_instances(instances)
+    # Execute the algorithms on each instance, saving every result as soon as it is available
+    all_results = run_all_algorithms_on_instances(instances, results_file)
 
-print("\n")
-print("=" * 50)
-print("SCALABILITY ANALYSIS RESULTS")
-print("=" * 50)
+    print("\n")
+    print("=" * 50)
+    print("SCALABILITY ANALYSIS RESULTS")
+    print("=" * 50)
 
-print_results(all_results)
+    print_results(all_results)
+    print(f"Results saved to {results_file}")
 
-save_results_to_csv(all_results, "scalability_results.csv")
-print("Results saved to scalability_results.csv")
+    if export_solutions:
+        for result in all_results:
+            export_solution_json(result, SOLUTIONS_DIR)
+        print(f"Solutions saved to {SOLUTIONS_DIR}")
@@ -0,0 +1,109 @@
+import csv
+import os
+from instance_generator import generate_instance, write_instance, GENERATED_INSTANCES_DIR
+from data_processing import read_and_process_instances
+from scalability import run_algorithm, save_results_to_csv, completed_runs, run_key, split_instance_name
+from formulation import formulation_name
+from portfolio import ALGORITHMS
+from parameter_profiles import DEFAULT_PROFILE
+from logging_config import configure_logging
+
+# =====================================================
+# Title: Scaling Study of CF, CF+VI's and BBC on Generated Instances
+# Description: This script sweeps the knobs of the instance generator one at
+#              a time around a base setting (number of clusters, customers
+#              per cluster, spatial distribution, time window width, demand),
+#              runs the algorithms on the generated instances and writes the
+#              scaling curves: mean build time, solve time and gap of each
+#              algorithm for every value of every knob. The runs are appended
+#              to scaling_results.csv as they finish and skipped on restart.
+# =====================================================
+
+results_file = "scaling_results.csv"
+curves_file = "scaling_curves.csv"
+profile = DEFAULT_PROFILE
+seeds = [0, 1, 2]
+
+BASE_SETTING = {
+    "num_clusters": 10,
+    "customers_per_cluster": 4,
+    "distribution": "RC",
+    "window_width": None,
+    "demand": (1, 10),
+}
+
+SWEEP = {
+    "num_clusters": [5, 10, 15, 20, 25],
+    "customers_per_cluster": [3, 4, 5, 6],
+    "distribution": ["R", "C", "RC"],
+    "window_width": [None, 60, 30, 15],
+    "demand": [(1, 5), (1, 10), (5, 20)],
+}
+
+CURVES_HEADER = ["Knob", "Value", "Algorithm", "Runs", "Optimal", "Build time(s)", "Runtime(s)", "Gap (%)"]
+
+# Settings of the sweep: every knob varied alone, the others at their base value
+def sweep_settings(base=BASE_SETTING, sweep=SWEEP):
+    settings = []
+    for knob, values in sweep.items():
+        for value in values:
+            settings.append((knob, value, {**base, knob: value}))
+    return settings
+
+# Generate the instances of the sweep and return the knob settings of each instance name
+def generate_sweep_instances(instances_dir=GENERATED_INSTANCES_DIR, seeds=seeds):
+    instances = {}
+    for knob, value, setting in sweep_settings():
+        for seed in seeds:
+            name, lines = generate_instance(seed=seed, **setting)
+            if not os.path.isfile(os.path.join(instances_dir, f"{name}.txt")):
+                write_instance(name, lines, instances_dir)
+            instances.setdefault(name, []).append((knob, value))
+    return instances
+
+# Runs stopped without a solution count with a 100% gap
+def scaling_curves(results, instance_knobs):
+    groups = {}
+    for result in results:
+        for knob, value in instance_knobs.get(result['instance_name'], []):
+            groups.setdefault((knob, str(value), result['algorithm']), []).append(result)
+
+    rows = []
+    for (knob, value, algorithm), runs in groups.items():
+        rows.append([knob, value, algorithm, len(runs), sum(1 for run in runs if run['status'] == "Optimal"),
+                     round(sum(float(run['build_time'] or 0) for run in runs) / len(runs), 2),
+                     round(sum(float(run['runtime'] or 0) for run in runs) / len(runs), 2),
+                     round(sum(float(run['gap'] or 100) for run in runs) / len(runs), 2)])
+    return rows
+
+# Results of the study read back from the results file, so that the curves include the runs of previous sessions
+def read_results(filename):
+    with open(filename, mode='r', newline='') as file:
+        return [{'instance_name': f"{row['Instance']}_{row['Size']}", 'algorithm': row['Algorithm'], 'status': row['Status'],
+                 'build_time': row['Build time(s)'], 'runtime': row['Runtime(s)'], 'gap': row['Gap (%)']}
+                for row in csv.DictReader(file, delimiter=';') if row['Profile'] in ('', profile)]
+
+if __name__ == "__main__":
+    configure_logging()
+    instance_knobs = generate_sweep_instances()
+
+    # Run the algorithms on the instances that still have runs to do, smallest first
+    completed = completed_runs(results_file)
+    pending = [name for name in instance_knobs
+               if any(run_key(*split_instance_name(name), algorithm, formulation_name(False), profile) not in completed for algorithm in ALGORITHMS)]
+    instances = read_and_process_instances(GENERATED_INSTANCES_DIR, [f"{name}.txt" for name in pending])
+    instances.sort(key=lambda instance: len(instance[1]['N (set of cluster indices)']))
+
+    for instance_name, data in instances:
+        instance, size = split_instance_name(instance_name)
+        for algorithm, function in ALGORITHMS.items():
+            if run_key(instance, size, algorithm, formulation_name(False), profile) in completed:
+                continue
+            print(f"Running {algorithm} on {instance_name}...")
+            save_results_to_csv([run_algorithm(function, instance_name, data, profile=profile)], results_file)
+
+    with open(curves_file, mode='w', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(CURVES_HEADER)
+        writer.writerows(scaling_curves(read_results(results_file), instance_knobs))
+    print(f"Scaling curves saved to {curves_file}")
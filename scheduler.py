@@ -0,0 +1,117 @@
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import scalability
+from scalability import run_algorithm, run_isolated_algorithm, hard_timeout, save_results_to_csv, print_results, split_instance_name, run_key, completed_runs, instance_completed, planned_runs
+from data_processing import read_instance, read_and_process_instances
+from parameter_profiles import get_profile
+from logging_config import configure_logging, get_logger, set_gurobi_threads
+
+# =====================================================
+# Title: Parallel Experiment Scheduler for the Scalability Analysis
+# Description: This script runs the instance x algorithm grid of
+#              scalability.py as independent jobs in a process pool under a
+#              total core budget. Every job gets a fixed number of Gurobi
+#              Threads, for its main model as well as its SPs and the
+#              preprocessing of its instance. The jobs of the largest
+#              instances are started first to avoid a long tail, and each
+#              result is appended to the CSV file as soon as its job
+#              finishes. The runs already in the CSV file are skipped, so an
+#              interrupted sweep can be resumed. The options of the sweep
+#              (instances, formulations, profile, cut pool, memory ceiling,
+#              isolation, and the extra algorithms: ALNS, CG, decomposition,
+#              portfolio, primal heuristic) are the ones set in scalability.py
+#              and the jobs are its planned runs.
+# =====================================================
+
+logger = get_logger(__name__)
+
+core_budget = os.cpu_count()  # Total number of cores used by the jobs
+threads_per_job = 1           # Gurobi Threads of every job
+results_file = "scalability_results.csv"
+
+# Number of customers of a processed instance, used to schedule the largest instances first
+def instance_size(data):
+    Ni = data['Ni (set of customer nodes in cluster i)']
+    return sum(len(Ni[i]) for i in data['N (set of cluster indices)'])
+
+def process_instance_file(instances_dir, instance_file):
+    return read_and_process_instances(instances_dir, [instance_file])[0]
+
+# Options of a planned run (scalability.planned_runs) with the Gurobi Threads of a job: in the profile of the
+# algorithm, or as the total thread budget of the portfolio and the decomposition (split between their
+# processes), and for all the other models of the run. The name of the profile is recorded in the results.
+def job_options(algorithm, options, threads):
+    options = {**options, "threads": threads, "profile_name": options['profile']}
+    if algorithm in ("Portfolio", "Decomposition"):
+        options["total_threads"] = threads
+    else:
+        options["profile"] = {**get_profile(algorithm, options['profile']), "Threads": threads}
+    return options
+
+# Jobs (algorithm, function, instance name, instance data, options, formulation) of the runs planned by
+# scalability.py, largest instances first. The runs in completed (see scalability.completed_runs) are left out.
+def scalability_jobs(instances, threads, completed=()):
+    jobs = []
+    for instance_name, data in sorted(instances, key=lambda instance: instance_size(instance[1]), reverse=True):
+        instance, size = split_instance_name(instance_name)
+        for algorithm, function, options, formulation in planned_runs():
+            if run_key(instance, size, algorithm, formulation, scalability.profile) in completed:
+                continue
+            jobs.append((algorithm, function, instance_name, data, job_options(algorithm, options, threads), formulation))
+    return jobs
+
+# With scalability.isolate_runs, every job runs in its own worker subprocess under the hard timeout and RSS limit
+def run_job(job, isolate_runs=False, hard_memory_limit=None):
+    algorithm, function, instance_name, data, options, _ = job
+    if isolate_runs:
+        return run_isolated_algorithm(function, instance_name, data, hard_timeout(algorithm, options['profile']), hard_memory_limit, **options)
+    return run_algorithm(function, instance_name, data, **options)
+
+# Run the jobs in a process pool and append each result to the CSV file as soon as it is available
+def run_jobs(jobs, core_budget=core_budget, threads_per_job=threads_per_job, results_file=results_file, isolate_runs=False, hard_memory_limit=None):
+    workers = max(1, core_budget // threads_per_job)
+    results = []
+
+    # Gurobi environments cannot be shared with forked processes
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"), initializer=set_gurobi_threads, initargs=(threads_per_job,)) as executor:
+        futures = {executor.submit(run_job, job, isolate_runs, hard_memory_limit): job for job in jobs}
+        for future in as_completed(futures):
+            algorithm, _, instance_name, _, _, formulation = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning(f"Job {algorithm} on {instance_name} failed: {e}")
+                continue
+
+            save_results_to_csv([result], results_file)
+            results.append(result)
+            print(f"Finished {algorithm} ({formulation}) on {instance_name} "
+                  f"in {result['computation_time']} s, {len(results)}/{len(jobs)} jobs done")
+
+    return results
+
+if __name__ == "__main__":
+    configure_logging()
+    start_time = time.time()
+    workers = max(1, core_budget // threads_per_job)
+
+    # Preprocess in parallel the instances that still have runs to do, each worker within threads_per_job threads
+    completed = completed_runs(results_file)
+    instance_files = [f for f in os.listdir(scalability.instances_dir) if f.endswith('.txt')
+                      if not instance_completed(read_instance(os.path.join(scalability.instances_dir, f))[0], completed)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"), initializer=set_gurobi_threads, initargs=(threads_per_job,)) as executor:
+        instances = list(executor.map(process_instance_file, [scalability.instances_dir] * len(instance_files), instance_files))
+
+    jobs = scalability_jobs(instances, threads_per_job, completed)
+    print(f"Running {len(jobs)} jobs on {workers} worker(s) with {threads_per_job} thread(s) each")
+    all_results = run_jobs(jobs, core_budget, threads_per_job, results_file, scalability.isolate_runs, scalability.hard_memory_limit)
+
+    print("\n")
+    print("=" * 50)
+    print("SCALABILITY ANALYSIS RESULTS")
+    print("=" * 50)
+
+    print_results(all_results)
+    print(f"Results saved to {results_file} ({round(time.time() - start_time, 2)} s)")
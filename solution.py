@@ -0,0 +1,88 @@
+import json
+import os
+
+# =====================================================
+# Title: Compact Solution Extraction for VRPTWMD2R
+# Description: This script turns the values of the first-level (x) and
+#              second-level (y) variables into compact route lists:
+#              vehicle routes with their number of deliverymen l, and the
+#              deliveryman routes inside each cluster. The routes can be
+#              exported to JSON.
+# =====================================================
+
+SOLUTIONS_DIR = "./solutions"
+
+# Reconstruct the complete first-level routes (lists of arcs) from the values of the x variables, grouped by l
+def reconstruct_routes(x_values, N):
+    routes = {}
+    for ((i, j), l), value in x_values.items():
+        if value > 0.5:
+            if l not in routes:
+                routes[l] = []
+            routes[l].append((i, j))
+
+    complete_routes = {}
+    for l, arcs in routes.items():
+        complete_routes[l] = []
+        for arc in arcs:
+            if arc[0] == 0:  # Start from depot
+                current_route = [arc]
+                next_node = arc[1]
+                while next_node != len(N) + 1:  # Until reaching the end depot
+                    found_next_arc = False
+                    for next_arc in arcs:
+                        if next_arc[0] == next_node:
+                            current_route.append(next_arc)
+                            next_node = next_arc[1]
+                            found_next_arc = True
+                            break
+
+                    if not found_next_arc:
+                        break
+                complete_routes[l].append(current_route)
+
+    return complete_routes
+
+# First-level vehicle routes as {"l": number of deliverymen, "clusters": visited clusters in order}
+def first_level_routes(x_values, N):
+    routes = []
+    for l, route_list in reconstruct_routes(x_values, N).items():
+        for route in route_list:
+            routes.append({"l": l, "clusters": [j for (i, j) in route if j != len(N) + 1]})
+    return routes
+
+# Second-level deliveryman routes of each cluster as lists of customers, from the values of the y variables
+def second_level_routes(y_values, data):
+    Ni = data['Ni (set of customer nodes in cluster i)']
+
+    successors = {}
+    for (i, (h, k)), value in y_values.items():
+        if value > 0.5:
+            successors.setdefault(i, {}).setdefault(h, []).append(k)
+
+    routes = {}
+    for i, cluster_successors in successors.items():
+        end = len(Ni[i]) + 1
+        routes[i] = []
+        for k in cluster_successors.get(0, []):
+            route = []
+            while k != end and k not in route:
+                route.append(k)
+                k = cluster_successors.get(k, [end])[0]
+            routes[i].append(route)
+
+    return routes
+
+def export_solution_json(result, solutions_dir=SOLUTIONS_DIR):
+    os.makedirs(solutions_dir, exist_ok=True)
+    algorithm = result['algorithm'].replace("'", "").replace("+", "_")
+    path = os.path.join(solutions_dir, f"{result['instance_name']}_{algorithm}.json")
+
+    summary = {key: value for key, value in result.items() if key != 'routes'}
+    routes = result.get('routes') or {"first_level": [], "second_level": {}}
+    summary['first_level_routes'] = routes['first_level']
+    summary['second_level_routes'] = {str(i): cluster_routes for i, cluster_routes in routes['second_level'].items()}
+
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    return path
@@ -0,0 +1,76 @@
+import gurobipy as gp
+from gurobipy import GRB
+
+# =====================================================
+# Title: Solver Statistics for the VRPTWMD2R Algorithms
+# Description: This script collects the statistics reported by every
+#              algorithm next to its solution: model build time, Gurobi
+#              runtime and work units, node and simplex iteration counts,
+#              root bound, time to the first incumbent, the time spent
+#              in the BBC callbacks and the peak memory used by Gurobi.
+# =====================================================
+
+def init_stats(model):
+    model._root_bound = None
+    model._first_incumbent_time = None
+    model._callback_time = 0.0
+
+# Callback recording the root bound and the time to the first incumbent, called by every algorithm's callback
+def stats_callback(model, where):
+    if where == GRB.Callback.MIP:
+        if model.cbGet(GRB.Callback.MIP_NODCNT) == 0:
+            model._root_bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+        if model._first_incumbent_time is None and model.cbGet(GRB.Callback.MIP_SOLCNT) > 0:
+            model._first_incumbent_time = model.cbGet(GRB.Callback.RUNTIME)
+    elif where == GRB.Callback.MIPNODE:
+        if model.cbGet(GRB.Callback.MIPNODE_NODCNT) == 0:
+            model._root_bound = model.cbGet(GRB.Callback.MIPNODE_OBJBND)
+
+def model_attribute(model, name):
+    try:
+        return model.getAttr(name)
+    except (gp.GurobiError, AttributeError):
+        return None
+
+def solver_statistics(model, build_time):
+    root_bound = model._root_bound
+    if root_bound is None:
+        root_bound = model_attribute(model, 'ObjBound')
+
+    work = model_attribute(model, 'Work')
+    max_memory = model_attribute(model, 'MaxMemUsed')  # GB
+    first_incumbent_time = model._first_incumbent_time
+
+    return {
+        "build_time": round(build_time, 2),
+        "runtime": round(model.Runtime, 2),
+        "work": round(work, 3) if work is not None else None,
+        "node_count": model_attribute(model, 'NodeCount'),
+        "iter_count": model_attribute(model, 'IterCount'),
+        "root_bound": root_bound,
+        "first_incumbent_time": round(first_incumbent_time, 2) if first_incumbent_time is not None else None,
+        "callback_time": round(model._callback_time, 2),
+        "gurobi_memory": round(max_memory * 1024, 1) if max_memory is not None else None,
+    }
+
+# Result of a run stopped without a solution (infeasible, or stopped by a limit before the first incumbent)
+def no_solution_result(instance_name, algorithm, formulation, profile_name, model, build_time):
+    status = "Infeasible" if model.status == GRB.INFEASIBLE else "NoSolution"
+    best_bound = model_attribute(model, 'ObjBound')
+
+    return {
+        "instance_name": instance_name,
+        "algorithm": algorithm,
+        "formulation": formulation,
+        "profile": profile_name,
+        "status": status,
+        "vehicles_used": None,
+        "delivery_men_used": None,
+        "first_level_distance": None,
+        "second_level_distance": None,
+        "objective_value": None,
+        "best_bound": best_bound if best_bound is not None and abs(best_bound) < GRB.INFINITY else None,
+        "gap": None,
+        "routes": None,
+        **solver_statistics(model, build_time),
+    }
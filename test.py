@@ -2,40 +2,56 @@ from BBCoptimize import run_BBCoptimize
 from CFoptimize import run_CFoptimize
 from CFVIsoptimize import run_CFVIsoptimize
 from data_processing import read_and_process_instances 
+from isolation import run_isolated, TIMEOUT_GRACE
+from parameter_profiles import get_profile
 
 instances_dir = "./test_istances"
 
-instances = read_and_process_instances(instances_dir)
+# Every algorithm runs in a worker subprocess, killed after timeout seconds (None for the TimeLimit of its
+# profile plus a grace period) or when its RSS exceeds rss_limit MB (None for no limit); such runs are
+# reported as Timeout or OOM
+timeout = None
+rss_limit = None
 
-results = []
+def run_with_limits(algorithm, function, instance_name, instance_data):
+    limit = timeout or get_profile(algorithm)['TimeLimit'] + TIMEOUT_GRACE
+    status, result, elapsed, peak_rss = run_isolated(function, (instance_name, instance_data), timeout=limit, rss_limit=rss_limit)
+    if status != "OK":
+        result = {"instance_name": instance_name, "algorithm": algorithm, "status": status, "vehicles_used": None,
+                  "delivery_men_used": None, "first_level_distance": None, "second_level_distance": None}
+    return result
 
 def run_all_algorithms_on_instance(instance_name, instance_data):
     instance_results = []
     
     print(f"\nRunning CFoptimize on {instance_name}...")
-    cf_results = run_CFoptimize(instance_name, instance_data)
+    cf_results = run_with_limits("CF", run_CFoptimize, instance_name, instance_data)
     instance_results.append(cf_results)
     
     print(f"Running CFVIsoptimize on {instance_name}...")
-    cf_vc_results = run_CFVIsoptimize(instance_name, instance_data)
+    cf_vc_results = run_with_limits("CF+VI's", run_CFVIsoptimize, instance_name, instance_data)
     instance_results.append(cf_vc_results)
     
     print(f"Running BBC Algorithm on {instance_name}...")
-    bbc_results = run_BBCoptimize(instance_name, instance_data)
+    bbc_results = run_with_limits("BBC", run_BBCoptimize, instance_name, instance_data)
     instance_results.append(bbc_results)
     
     return instance_results
 
-for instance_name, instance_data in instances:
-    results.extend(run_all_algorithms_on_instance(instance_name, instance_data))
+if __name__ == "__main__":
+    instances = read_and_process_instances(instances_dir)
 
-print("\n=== FINAL RESULTS ===")
-for result in results:
-    print(f"Instance: {result['instance_name']}")
-    print(f"Algorithm: {result['algorithm']}")
-    print(f"Status: {result['status']}")
-    print(f"Vehicles used: {result['vehicles_used']}")
-    print(f"Delivery men used: {result['delivery_men_used']}")
-    print(f"First level distance: {result['first_level_distance']}")
-    print(f"Second level distance: {result['second_level_distance']}")
-    print("-" * 50)
+    results = []
+    for instance_name, instance_data in instances:
+        results.extend(run_all_algorithms_on_instance(instance_name, instance_data))
+
+    print("\n=== FINAL RESULTS ===")
+    for result in results:
+        print(f"Instance: {result['instance_name']}")
+        print(f"Algorithm: {result['algorithm']}")
+        print(f"Status: {result['status']}")
+        print(f"Vehicles used: {result['vehicles_used']}")
+        print(f"Delivery men used: {result['delivery_men_used']}")
+        print(f"First level distance: {result['first_level_distance']}")
+        print(f"Second level distance: {result['second_level_distance']}")
+        print("-" * 50)
@@ -0,0 +1,119 @@
+import csv
+import math
+import os
+from gurobipy import GRB
+
+# =====================================================
+# Title: Primal/Dual Bound Trajectories of the VRPTWMD2R Algorithms
+# Description: This script records the incumbent, best bound and node count
+#              of a run over time with an opt-in callback, writes the
+#              trajectory to a compact per-run CSV file and computes the
+#              anytime metrics of the run: primal integral, primal-dual
+#              integral and time to reach a 1% gap.
+# =====================================================
+
+TRAJECTORY_DIR = "./trajectories"
+SAMPLE_INTERVAL = 1.0    # Maximum time between two samples when the incumbent and bound do not change (s)
+BOUND_TOLERANCE = 1e-4   # Relative change of the bound that triggers a sample
+GAP_TARGET = 0.01
+NO_INCUMBENT = GRB.INFINITY
+
+# Callback appending (time, incumbent, bound, nodes) samples to the given list, to be passed in
+# the callbacks of run_CFoptimize, run_CFVIsoptimize and run_BBCoptimize. A sample is taken when
+# the incumbent or the bound (by more than BOUND_TOLERANCE) changes, and at least every SAMPLE_INTERVAL seconds.
+def trajectory_recorder(samples):
+    def trajectory_callback(model, where):
+        if where != GRB.Callback.MIP:
+            return
+        time = model.cbGet(GRB.Callback.RUNTIME)
+        incumbent = model.cbGet(GRB.Callback.MIP_OBJBST)
+        bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+        if samples:
+            last_time, last_incumbent, last_bound, _ = samples[-1]
+            bound_changed = abs(bound - last_bound) > BOUND_TOLERANCE * max(1.0, abs(bound))
+            if incumbent == last_incumbent and not bound_changed and time - last_time < SAMPLE_INTERVAL:
+                return
+        samples.append((time, incumbent, bound, model.cbGet(GRB.Callback.MIP_NODCNT)))
+    return trajectory_callback
+
+def has_incumbent(incumbent):
+    return incumbent is not None and abs(incumbent) < NO_INCUMBENT
+
+def relative_gap(incumbent, bound):
+    if not has_incumbent(incumbent):
+        return 1.0
+    if incumbent == bound:
+        return 0.0
+    return min(1.0, abs(incumbent - bound) / max(abs(incumbent), abs(bound)))
+
+# Integral over [0, end_time] of a step function given by (time, value) points, 1 before the first point
+def step_integral(points, end_time):
+    integral, previous_time, previous_value = 0.0, 0.0, 1.0
+    for time, value in points:
+        time = min(time, end_time)
+        integral += (time - previous_time) * previous_value
+        previous_time, previous_value = time, value
+    return integral + (end_time - previous_time) * previous_value
+
+# Primal integral: integral of the primal gap of the incumbent to the reference objective (by default
+# the final incumbent of the run), 1 while there is no incumbent
+def primal_integral(samples, end_time, reference):
+    if not has_incumbent(reference):
+        return None
+    return step_integral([(time, relative_gap(incumbent, reference)) for time, incumbent, _, _ in samples], end_time)
+
+# Primal-dual integral: integral of the gap between the incumbent and the bound of the run
+def primal_dual_integral(samples, end_time):
+    return step_integral([(time, relative_gap(incumbent, bound)) for time, incumbent, bound, _ in samples], end_time)
+
+def time_to_gap(samples, gap=GAP_TARGET):
+    for time, incumbent, bound, _ in samples:
+        if has_incumbent(incumbent) and relative_gap(incumbent, bound) <= gap:
+            return time
+    return None
+
+def time_to_first_incumbent(samples):
+    for time, incumbent, _, _ in samples:
+        if has_incumbent(incumbent):
+            return time
+    return None
+
+# Close the trajectory with the final state of the run and compute its anytime metrics
+def trajectory_metrics(samples, result, reference=None):
+    end_time = result.get('runtime') or (samples[-1][0] if samples else 0.0)
+    if result.get('objective_value') is not None:
+        samples.append((end_time, result['objective_value'], result['best_bound'], result.get('node_count') or 0))
+    if reference is None:
+        reference = result.get('objective_value')
+
+    integral = primal_integral(samples, end_time, reference)
+    time_to_1 = time_to_gap(samples)
+    first_incumbent = time_to_first_incumbent(samples)
+    return {
+        "primal_integral": round(integral, 2) if integral is not None else None,
+        "primal_dual_integral": round(primal_dual_integral(samples, end_time), 2),
+        "time_to_1pct_gap": round(time_to_1, 2) if time_to_1 is not None else None,
+        "first_incumbent_time": round(first_incumbent, 2) if first_incumbent is not None else result.get('first_incumbent_time'),
+    }
+
+def trajectory_path(result, trajectory_dir=TRAJECTORY_DIR):
+    algorithm = result['algorithm'].replace("'", "").replace("+", "_")
+    return os.path.join(trajectory_dir, f"{result['instance_name']}_{algorithm}_{result.get('formulation')}_{result.get('profile')}.csv")
+
+def write_trajectory(samples, result, trajectory_dir=TRAJECTORY_DIR):
+    os.makedirs(trajectory_dir, exist_ok=True)
+    path = trajectory_path(result, trajectory_dir)
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(["Time(s)", "Incumbent", "Bound", "Nodes"])
+        for time, incumbent, bound, nodes in samples:
+            writer.writerow([round(time, 3), incumbent if has_incumbent(incumbent) else "", round(bound, 6), int(nodes)])
+    return path
+
+def read_trajectory(path):
+    samples = []
+    with open(path, mode='r', newline='') as file:
+        for row in csv.DictReader(file, delimiter=';'):
+            incumbent = float(row['Incumbent']) if row['Incumbent'] else math.inf
+            samples.append((float(row['Time(s)']), incumbent, float(row['Bound']), int(row['Nodes'])))
+    return samples
@@ -0,0 +1,139 @@
+import itertools
+import os
+import random
+import tempfile
+from CFoptimize import run_CFoptimize
+from CFVIsoptimize import run_CFVIsoptimize
+from BBCoptimize import run_BBCoptimize
+from formulation import build_model, CF_FAMILIES, VALID_INEQUALITIES
+from parameter_profiles import get_profile, save_profile, DEFAULT_PROFILE
+from data_processing import read_and_process_instances
+from logging_config import configure_logging, apply_gurobi_output
+
+# =====================================================
+# Title: Tuning Harness for the Gurobi Parameter Profiles
+# Description: This script searches the Gurobi parameters of one algorithm
+#              over a subset of the scalability instances and writes the best
+#              parameters back to gurobi_profiles.json as a named profile.
+#              The candidates come from a grid search, a random search over
+#              the same grid, or Gurobi's tuning tool (CF and CF+VI's only,
+#              since the tuning tool does not run the BBC callback). Every
+#              candidate is then evaluated with the real algorithm on all the
+#              chosen instances: most instances solved to optimality first,
+#              then smallest mean gap, then smallest mean Gurobi work.
+# =====================================================
+
+instances_dir = "./scalability_istances"
+instance_files = None  # Subset of the instance files to tune on (None = all)
+algorithm = "CF"       # "CF", "CF+VI's" or "BBC"
+method = "random"      # "grid", "random" or "tune"
+trials = 10            # Number of candidates of the random search
+trial_time_limit = 60  # Time limit of every evaluation run (s)
+tune_time_limit = 600  # Time limit of the Gurobi tuning tool per instance (s)
+tuned_profile = "tuned"
+
+ALGORITHMS = {
+    "CF": run_CFoptimize,
+    "CF+VI's": run_CFVIsoptimize,
+    "BBC": run_BBCoptimize,
+}
+
+# Models given to the Gurobi tuning tool
+TUNABLE_MODELS = {
+    "CF": lambda instance_name, data: build_model(instance_name, data, CF_FAMILIES)[0],
+    "CF+VI's": lambda instance_name, data: build_model(instance_name, data, CF_FAMILIES, VALID_INEQUALITIES)[0],
+}
+
+PARAMETER_GRID = {
+    "MIPFocus": [0, 1, 2, 3],
+    "Cuts": [-1, 0, 1, 2],
+    "Presolve": [-1, 1, 2],
+    "Threads": [0, 1, 4],
+}
+
+# Parameters left out of the tuned profiles: the time limit comes from the default profile
+IGNORED_PARAMETERS = {"TimeLimit", "TuneTimeLimit", "OutputFlag", "LogToConsole", "LogFile"}
+
+def grid_candidates(grid=PARAMETER_GRID):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def random_candidates(n, grid=PARAMETER_GRID, seed=0):
+    candidates = grid_candidates(grid)
+    random.Random(seed).shuffle(candidates)
+    return [{}] + candidates[:n]
+
+# Read the parameters changed from their defaults in a Gurobi .prm file
+def read_prm(path):
+    parameters = {}
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 2 or line.startswith('#') or fields[0] in IGNORED_PARAMETERS:
+                continue
+            value = fields[1]
+            try:
+                parameters[fields[0]] = int(value)
+            except ValueError:
+                parameters[fields[0]] = float(value)
+    return parameters
+
+# Candidates from the Gurobi tuning tool: the best parameter set found on every instance
+def tuning_tool_candidates(algorithm, instances, trial_time_limit, tune_time_limit):
+    if algorithm not in TUNABLE_MODELS:
+        raise ValueError(f"The Gurobi tuning tool cannot be used for {algorithm}, use the grid or random search")
+
+    candidates = [{}]
+    for instance_name, data in instances:
+        model = TUNABLE_MODELS[algorithm](instance_name, data)
+        apply_gurobi_output(model)
+        model.setParam('TimeLimit', trial_time_limit)  # Time limit of every tuning trial
+        model.setParam('TuneTimeLimit', tune_time_limit)
+        model.tune()
+        if model.TuneResultCount > 0:
+            model.getTuneResult(0)
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "tuned.prm")
+                model.write(path)
+                parameters = read_prm(path)
+            if parameters not in candidates:
+                candidates.append(parameters)
+    return candidates
+
+def evaluate(algorithm, instances, parameters, time_limit):
+    results = [ALGORITHMS[algorithm](instance_name, data, profile={**parameters, "TimeLimit": time_limit}) for instance_name, data in instances]
+    solved = sum(1 for result in results if result['status'] == "Optimal")
+    mean_gap = sum(result['gap'] for result in results) / len(results)
+    mean_work = sum(result['work'] or 0 for result in results) / len(results)
+    return (-solved, mean_gap, mean_work)
+
+def tune_profile(algorithm, instances, method="random", trials=10, trial_time_limit=60, tune_time_limit=600, profile=None):
+    if method == "grid":
+        candidates = [{}] + grid_candidates()
+    elif method == "random":
+        candidates = random_candidates(trials)
+    elif method == "tune":
+        candidates = tuning_tool_candidates(algorithm, instances, trial_time_limit, tune_time_limit)
+    else:
+        raise ValueError(f"Unknown tuning method: {method}")
+
+    best_parameters, best_score = None, None
+    for n, parameters in enumerate(candidates):
+        score = evaluate(algorithm, instances, parameters, trial_time_limit)
+        print(f"Candidate {n + 1}/{len(candidates)} {parameters}: solved {-score[0]}, mean gap {score[1]:.2f}%, mean work {score[2]:.3f}")
+        if best_score is None or score < best_score:
+            best_parameters, best_score = parameters, score
+
+    # Keep the time limit of the default profile next to the tuned parameters
+    tuned = {**get_profile(algorithm, DEFAULT_PROFILE), **best_parameters}
+    if profile:
+        save_profile(algorithm, profile, tuned)
+    return tuned, best_score
+
+if __name__ == "__main__":
+    configure_logging()
+    instances = read_and_process_instances(instances_dir, instance_files)
+
+    tuned, score = tune_profile(algorithm, instances, method, trials, trial_time_limit, tune_time_limit, tuned_profile)
+    print(f"Best parameters for {algorithm}: {tuned} (solved {-score[0]}, mean gap {score[1]:.2f}%, mean work {score[2]:.3f})")
+    print(f"Saved as profile '{tuned_profile}' in gurobi_profiles.json")